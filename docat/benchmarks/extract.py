@@ -0,0 +1,45 @@
+"""
+Benchmark of the zip extraction throughput by number of worker threads.
+
+Usage: uv run python benchmarks/extract.py [--members 20000] [--member-size 4096]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from docat.utils import extract_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--member-size", type=int, default=4096)
+    args = parser.parse_args()
+    members = args.members
+    member_size = args.member_size
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        archive_path = Path(temp_dir) / "docs.zip"
+        with ZipFile(archive_path, "w", compression=ZIP_DEFLATED) as zipf:
+            for i in range(members):
+                zipf.writestr(f"package{i % 100}/page{i}.html", os.urandom(member_size // 2).hex())
+
+        print(f"{members} members of {member_size} bytes, archive {archive_path.stat().st_size >> 20} MB")
+        for workers in [1, 2, 4, 8, 16]:
+            destination = Path(temp_dir) / f"docs-{workers}"
+            destination.mkdir()
+            with archive_path.open("rb") as archive:
+                start = time.perf_counter()
+                extract_archive(archive, archive_path.name, destination, workers=workers)
+                elapsed = time.perf_counter() - start
+            shutil.rmtree(destination)
+            print(f"{workers:>2} workers: {elapsed:6.2f} s, {members / elapsed:8.0f} files/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of serving documentation without nginx, StaticFiles against DocsFiles with and without the file cache.
+Requests are sent straight to the ASGI apps, so only the work of the file server is measured.
+
+Usage: uv run python benchmarks/serve.py [--requests 5000] [--file-size 65536]
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from starlette.staticfiles import StaticFiles
+
+from docat.files import DocsFiles, FileCache
+from docat.generation import SharedGeneration
+from docat.utils import create_symlink
+
+
+async def request(app, path: str, headers: list[tuple[bytes, bytes]]) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "server": ("localhost", 80),
+    }
+    sent = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal sent
+        sent += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return sent
+
+
+async def measure(name: str, app, path: str, headers: list[tuple[bytes, bytes]], requests: int) -> None:
+    await request(app, path, headers)
+    start = time.perf_counter()
+    sent = 0
+    for _ in range(requests):
+        sent += await request(app, path, headers)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {requests / elapsed:8.0f} requests/s, {sent / requests / 1024:6.1f} KB per response")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--file-size", type=int, default=65536)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        upload_folder = Path(temp_dir) / "doc"
+        version_folder = upload_folder / "project" / "1.0.0"
+        version_folder.mkdir(parents=True)
+        content = os.urandom(args.file_size // 2).hex().encode()
+        (version_folder / "index.html").write_bytes(content)
+        (version_folder / "index.html.gz").write_bytes(gzip.compress(content))
+        create_symlink(version_folder, upload_folder / "project" / "latest")
+
+        static_files = StaticFiles(directory=upload_folder, html=True)
+        generation = SharedGeneration(Path(temp_dir) / "catalog.generation")
+        docs_files = DocsFiles(upload_folder, generation)
+        cached_docs_files = DocsFiles(upload_folder, generation, file_cache=FileCache(64 << 20, 256 << 10))
+        identity = [(b"accept-encoding", b"identity")]
+        gzip_headers = [(b"accept-encoding", b"gzip")]
+
+        async def run():
+            for path in ["/project/1.0.0/index.html", "/project/latest/"]:
+                print(path)
+                await measure("StaticFiles", static_files, path, identity, args.requests)
+                await measure("DocsFiles", docs_files, path, identity, args.requests)
+                await measure("DocsFiles (gzip)", docs_files, path, gzip_headers, args.requests)
+                await measure("DocsFiles (cached)", cached_docs_files, path, identity, args.requests)
+                await measure("DocsFiles (cached, gzip)", cached_docs_files, path, gzip_headers, args.requests)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 import os
+import sys
 
 import uvicorn
 
-from docat.app import app
+from docat.app import DOCAT_UPLOAD_FOLDER, app, get_catalog, update_search_index
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["rebuild-catalog"]:
+        # recover the catalog from the upload folder
+        get_catalog().rebuild()
+        sys.exit(0)
+
+    if sys.argv[1:] == ["rebuild-search-index"]:
+        # index the documentation uploaded before the search index was enabled
+        catalog = get_catalog()
+        for project, entry in catalog.read()["projects"].items():
+            for version in entry["versions"]:
+                update_search_index(project, catalog, DOCAT_UPLOAD_FOLDER / project / version)
+        sys.exit(0)
+
     try:
         port = int(os.environ.get("PORT", "5000"))
     except ValueError:
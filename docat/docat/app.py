@@ -8,51 +8,231 @@ Host your docs. Simple. Versioned. Fancy.
 :license: MIT, see LICENSE for more details.
 """
 
+import dataclasses
+import functools
+import json
 import logging
 import os
 import secrets
 import shutil
+import sqlite3
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from pathlib import Path
 
+import anyio
 import magic
-from fastapi import APIRouter, Depends, FastAPI, File, Header, Response, UploadFile, status
-from fastapi.staticfiles import StaticFiles
+from fastapi import APIRouter, Depends, FastAPI, File, Form, Header, Query, Request, Response, UploadFile, status
 from starlette.responses import JSONResponse
-from tinydb import Query, TinyDB
 
-from docat.models import ApiResponse, ClaimResponse, ProjectDetail, Projects, Stats, TokenStatus
+from docat.blobs import BLOBS_FOLDER, BlobStore, hash_file
+from docat.bulk import BulkError, read_bulk_manifest, upload_path
+from docat.catalog import CATALOG_PATH, Catalog
+from docat.claims import CLAIMS_DB_PATH, ClaimStore, TokenCache, open_claim_store
+from docat.delta import DeltaError, assemble_version, find_missing, hash_version, validate_manifest, write_version_manifest
+from docat.files import DocsFiles, FileCache
+from docat.locations import Reloader, write_locations
+from docat.models import (
+    ApiResponse,
+    BulkUpload,
+    BulkUploadResult,
+    BulkUploadResults,
+    Claim,
+    ClaimResponse,
+    Manifest,
+    Metrics,
+    MissingFiles,
+    ProjectDetail,
+    Projects,
+    SearchResults,
+    Stats,
+    TokenStatus,
+    UploadOffset,
+    UploadSession,
+    UploadSessionRequest,
+    VersionSize,
+)
+from docat.precompress import precompress_tree
+from docat.search import SEARCH_DB_PATH, SearchIndex, open_search_index
+from docat.sessions import SESSIONS_FOLDER, OffsetMismatchError, SessionError, UploadSessions, parse_content_range
+from docat.trash import TRASH_FOLDER, Reaper, Trash
 from docat.utils import (
     DB_PATH,
+    NGINX_CONFIG_PATH,
+    STAGING_FOLDER,
     UPLOAD_FOLDER,
+    VersionExistsError,
     calculate_token,
     create_symlink,
     extract_archive,
-    get_all_projects,
-    get_dir_size,
-    get_project_details,
-    get_system_stats,
     is_forbidden_project_name,
+    measure_dir,
+    publish_version,
     remove_docs,
+    remove_metadata,
+    write_version_size,
 )
+from docat.watcher import Watcher
+from docat.workers import PoolSaturatedError, WorkerPool
 
 DOCAT_STORAGE_PATH = Path(os.getenv("DOCAT_STORAGE_PATH", Path("/var/docat")))
 DOCAT_DB_PATH = DOCAT_STORAGE_PATH / DB_PATH
+DOCAT_CLAIMS_DB_PATH = DOCAT_STORAGE_PATH / CLAIMS_DB_PATH
+DOCAT_CLAIMS_BACKEND = os.getenv("DOCAT_CLAIMS_BACKEND", "sqlite")
+DOCAT_TOKEN_CACHE_SIZE = int(os.getenv("DOCAT_TOKEN_CACHE_SIZE", "1024"))
+DOCAT_TOKEN_CACHE_TTL = int(os.getenv("DOCAT_TOKEN_CACHE_TTL", "300"))
+DOCAT_CATALOG_PATH = DOCAT_STORAGE_PATH / CATALOG_PATH
 DOCAT_UPLOAD_FOLDER = DOCAT_STORAGE_PATH / UPLOAD_FOLDER
+DOCAT_STAGING_FOLDER = DOCAT_STORAGE_PATH / STAGING_FOLDER
+DOCAT_STAGING_TTL = int(os.getenv("DOCAT_STAGING_TTL", "86400"))
+DOCAT_TRASH_FOLDER = DOCAT_STORAGE_PATH / TRASH_FOLDER
+DOCAT_BLOBS_FOLDER = DOCAT_STORAGE_PATH / BLOBS_FOLDER
+DOCAT_SESSIONS_FOLDER = DOCAT_STORAGE_PATH / SESSIONS_FOLDER
+DOCAT_UPLOAD_SESSION_TTL = int(os.getenv("DOCAT_UPLOAD_SESSION_TTL", "86400"))
+DOCAT_UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("DOCAT_UPLOAD_MAX_CHUNK_SIZE", "67108864"))
+DOCAT_DEDUPLICATE = bool(os.getenv("DOCAT_DEDUPLICATE"))
+DOCAT_SEARCH_DB_PATH = DOCAT_STORAGE_PATH / SEARCH_DB_PATH
+DOCAT_SEARCH_INDEX = bool(os.getenv("DOCAT_SEARCH_INDEX"))
+DOCAT_PRECOMPRESS = bool(os.getenv("DOCAT_PRECOMPRESS"))
+DOCAT_PRECOMPRESS_MIN_SIZE = int(os.getenv("DOCAT_PRECOMPRESS_MIN_SIZE", "1024"))
+DOCAT_PRECOMPRESS_WORKERS = int(os.getenv("DOCAT_PRECOMPRESS_WORKERS", "4"))
+DOCAT_TRASH_RATE = int(os.getenv("DOCAT_TRASH_RATE", "1000"))
+DOCAT_EXTRACT_WORKERS = int(os.getenv("DOCAT_EXTRACT_WORKERS", "1"))
+DOCAT_BULK_WORKERS = int(os.getenv("DOCAT_BULK_WORKERS", "4"))
+DOCAT_WORKERS = int(os.getenv("DOCAT_WORKERS", "4"))
+DOCAT_WORKER_QUEUE_SIZE = int(os.getenv("DOCAT_WORKER_QUEUE_SIZE", "64"))
+DOCAT_FILE_CACHE_SIZE = int(os.getenv("DOCAT_FILE_CACHE_SIZE", "67108864"))
+DOCAT_FILE_CACHE_MAX_FILE_SIZE = int(os.getenv("DOCAT_FILE_CACHE_MAX_FILE_SIZE", "262144"))
+DOCAT_IMMUTABLE_VERSIONS = bool(os.getenv("DOCAT_IMMUTABLE_VERSIONS"))
+DOCAT_NGINX_CONFIG_PATH = NGINX_CONFIG_PATH
+DOCAT_NGINX_LOCATIONS = bool(os.getenv("DOCAT_NGINX_LOCATIONS"))
+DOCAT_NGINX_RELOAD_DELAY = float(os.getenv("DOCAT_NGINX_RELOAD_DELAY", "2"))
+DOCAT_WATCH = bool(os.getenv("DOCAT_WATCH"))
+DOCAT_WATCH_INTERVAL = float(os.getenv("DOCAT_WATCH_INTERVAL", "5"))
 
 logger = logging.getLogger(__name__)
 
+#: Tokens which were verified recently
+token_cache = TokenCache(DOCAT_TOKEN_CACHE_SIZE, DOCAT_TOKEN_CACHE_TTL)
+
+#: Content of small files which were served recently
+file_cache = FileCache(DOCAT_FILE_CACHE_SIZE, DOCAT_FILE_CACHE_MAX_FILE_SIZE)
+
+#: Reloads nginx after the locations of projects changed
+nginx_reloader = Reloader(DOCAT_NGINX_RELOAD_DELAY)
+
+#: Runs the endpoints doing blocking work, isolated from the read-only endpoints
+worker_pool = WorkerPool(DOCAT_WORKERS, DOCAT_WORKER_QUEUE_SIZE)
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     # Create the folders if they don't exist
     DOCAT_UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+    DOCAT_STAGING_FOLDER.mkdir(parents=True, exist_ok=True)
+
+    # empty the trash and remove abandoned upload sessions and staging folders in the background
+    reaper = Reaper(
+        get_trash(),
+        DOCAT_TRASH_RATE,
+        blob_store=get_blob_store() if DOCAT_DEDUPLICATE else None,
+        sessions=get_upload_sessions(),
+        staging_path=DOCAT_STAGING_FOLDER,
+        staging_ttl=DOCAT_STAGING_TTL,
+    )
+    reaper.start()
+
+    # pick up documentation which is changed by hand
+    watcher = Watcher(get_catalog(), DOCAT_WATCH_INTERVAL) if DOCAT_WATCH else None
+    if watcher is not None:
+        watcher.start()
+
+    # write the locations of projects uploaded before they were enabled
+    if DOCAT_NGINX_LOCATIONS:
+        nginx_reloader.start()
+        catalog = get_catalog()
+        for project in catalog.read()["projects"]:
+            update_nginx_locations(project, catalog)
     yield
+    if DOCAT_NGINX_LOCATIONS:
+        nginx_reloader.stop()
+    if watcher is not None:
+        watcher.stop()
+    reaper.stop()
+
+
+def get_db() -> ClaimStore:
+    """Return the shared claim store."""
+    return open_claim_store(DOCAT_CLAIMS_BACKEND, DOCAT_CLAIMS_DB_PATH, DOCAT_DB_PATH)
+
+
+def get_catalog() -> Catalog:
+    """Return the catalog of the upload folder."""
+    return Catalog(DOCAT_CATALOG_PATH, DOCAT_UPLOAD_FOLDER)
+
+
+def get_trash() -> Trash:
+    """Return the trash for removed documentation."""
+    return Trash(DOCAT_TRASH_FOLDER)
+
+
+def get_blob_store() -> BlobStore:
+    """Return the store of deduplicated files."""
+    return BlobStore(DOCAT_BLOBS_FOLDER)
+
+
+def get_upload_sessions() -> UploadSessions:
+    """Return the sessions of chunked uploads."""
+    return UploadSessions(DOCAT_SESSIONS_FOLDER, DOCAT_UPLOAD_SESSION_TTL)
+
+
+def get_search_index() -> SearchIndex:
+    """Return the shared full text search index."""
+    return open_search_index(DOCAT_SEARCH_DB_PATH)
+
+
+def change_search_index(project: str, change: Callable[[SearchIndex], None]) -> None:
+    """
+    Applies a change of a project to the search index, if it is enabled.
+    The documentation is already changed on disk, so a failure is only logged.
+    """
+    if not DOCAT_SEARCH_INDEX:
+        return
+
+    try:
+        change(get_search_index())
+    except (OSError, sqlite3.Error):
+        logger.exception(f"Failed to update the search index of {project}")
+
+
+def update_search_index(project: str, catalog: Catalog, version_folder: Path | None = None) -> None:
+    """
+    Indexes an uploaded version and updates which version of the project is searched.
+    """
+
+    def change(search_index: SearchIndex) -> None:
+        if version_folder is not None:
+            search_index.index_version(project, version_folder.name, version_folder)
+        search_index.set_latest(project, catalog.latest_version(project))
 
+    change_search_index(project, change)
 
-def get_db() -> TinyDB:
-    """Return the cached TinyDB instance."""
-    return TinyDB(DOCAT_DB_PATH)
+
+def update_nginx_locations(project: str, catalog: Catalog) -> None:
+    """
+    Writes the nginx location of a project and reloads nginx if it changed.
+    nginx keeps serving the project from the generic location, so a failure is only logged.
+    """
+    if not DOCAT_NGINX_LOCATIONS:
+        return
+
+    try:
+        entry = catalog.read()["projects"].get(project)
+        if write_locations(DOCAT_NGINX_CONFIG_PATH, project, entry, DOCAT_STORAGE_PATH, DOCAT_IMMUTABLE_VERSIONS):
+            nginx_reloader.request()
+    except OSError:
+        logger.exception(f"Failed to write the nginx location of {project}")
 
 
 #: Holds the FastAPI application
@@ -67,18 +247,102 @@ app = FastAPI(
 router = APIRouter()
 
 
+@app.exception_handler(PoolSaturatedError)
+async def worker_pool_saturated(_: Request, __: PoolSaturatedError):
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"message": "Too many requests, please try again later."},
+        headers={"Retry-After": "1"},
+    )
+
+
+def offload(func):
+    """
+    Runs a blocking endpoint in the worker pool instead of the default threadpool.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await worker_pool.run(func, *args, **kwargs)
+
+    return wrapper
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Returns True if an If-None-Match header matches the ETag, using the weak comparison.
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Sets the ETag of a response, returns a 304 response if the client already has it.
+    Clients have to revalidate every time, which is cheap as the ETag is derived from the catalog.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
+
+
 @router.get("/api/stats", response_model=Stats, status_code=status.HTTP_200_OK)
-def get_stats():
+def get_stats(
+    request: Request, response: Response, catalog: Catalog = Depends(get_catalog), blob_store: BlobStore = Depends(get_blob_store)
+):
     if not DOCAT_UPLOAD_FOLDER.exists():
         return Projects(projects=[])
-    return get_system_stats(DOCAT_UPLOAD_FOLDER)
 
-
-@router.get("/api/projects", response_model=Projects, status_code=status.HTTP_200_OK)
-def get_projects(include_hidden: bool = False):
+    # unused blobs are collected without a change of the catalog
+    blob_size = blob_store.size()
+    if cached := not_modified(request, response, f'"{catalog.generation()}-{blob_size}"'):
+        return cached
+    return catalog.get_stats(blob_size)
+
+
+@router.get("/api/metrics", response_model=Metrics, status_code=status.HTTP_200_OK)
+def get_metrics(trash: Trash = Depends(get_trash)):
+    return Metrics(
+        trash_queue_depth=trash.depth(),
+        worker_queue_depth=worker_pool.pending,
+        token_cache_hits=token_cache.hits,
+        token_cache_misses=token_cache.misses,
+        file_cache_hits=file_cache.hits,
+        file_cache_misses=file_cache.misses,
+        file_cache_size=file_cache.size,
+    )
+
+
+@router.get("/api/projects", response_model=Projects, response_model_exclude_none=True, status_code=status.HTTP_200_OK)
+def get_projects(
+    request: Request,
+    response: Response,
+    include_hidden: bool = False,
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    prefix: str | None = None,
+    search: str | None = None,
+    versions: int | None = Query(None, ge=0),
+    catalog: Catalog = Depends(get_catalog),
+):
+    """
+    Lists all projects ordered by name. With a `limit`, the response contains a
+    `next_cursor` as long as there are more projects, pass it as `cursor` to get the next page.
+    `prefix` and `search` filter the project names, `versions` limits
+    the versions of each project to the latest ones (0 omits them).
+    """
     if not DOCAT_UPLOAD_FOLDER.exists():
         return Projects(projects=[])
-    return get_all_projects(DOCAT_UPLOAD_FOLDER, include_hidden)
+
+    if cached := not_modified(request, response, f'"{catalog.generation()}"'):
+        return cached
+    return catalog.get_all_projects(include_hidden, limit=limit, cursor=cursor, prefix=prefix, search=search, versions=versions)
 
 
 @router.get(
@@ -87,22 +351,43 @@ def get_projects(include_hidden: bool = False):
     status_code=status.HTTP_200_OK,
     responses={status.HTTP_404_NOT_FOUND: {"model": ApiResponse}},
 )
-def get_project(project, include_hidden: bool = False):
-    details = get_project_details(DOCAT_UPLOAD_FOLDER, project, include_hidden)
+def get_project(project, request: Request, response: Response, include_hidden: bool = False, catalog: Catalog = Depends(get_catalog)):
+    not_found = JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": f"Project {project} does not exist"})
+
+    # an unchanged catalog still holds the project the client got before, but only if it exists
+    etag = f'"{catalog.generation()}"'
+    if not catalog.has_project(project):
+        return not_found
+    if cached := not_modified(request, response, etag):
+        return cached
 
+    details = catalog.get_project_details(project, include_hidden)
     if not details:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": f"Project {project} does not exist"})
+        return not_found
 
     return details
 
 
+@router.get("/api/search", response_model=SearchResults, response_model_exclude_none=True, status_code=status.HTTP_200_OK)
+def search(q: str, limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    Searches the text of the html pages in the latest version of all projects.
+    Pass `next_offset` as `offset` to get the next page of results.
+    """
+    if not DOCAT_SEARCH_INDEX:
+        return SearchResults(results=[])
+    return get_search_index().search(q, limit, offset)
+
+
 @router.post("/api/{project}/icon", response_model=ApiResponse, status_code=status.HTTP_200_OK)
+@offload
 def upload_icon(
     project: str,
     response: Response,
     file: UploadFile = File(...),
     docat_api_key: str | None = Header(None),
-    db: TinyDB = Depends(get_db),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
 ):
     project_base_path = DOCAT_UPLOAD_FOLDER / project
     icon_path = project_base_path / "logo"
@@ -133,20 +418,20 @@ def upload_icon(
     with icon_path.open("wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
-    # force cache revalidation
-    get_system_stats.cache_clear()
-    get_dir_size.cache_clear()
+    catalog.set_logo(project)
 
     return ApiResponse(message="Icon successfully uploaded")
 
 
 @router.post("/api/{project}/{version}/hide", response_model=ApiResponse, status_code=status.HTTP_200_OK)
+@offload
 def hide_version(
     project: str,
     version: str,
     response: Response,
     docat_api_key: str | None = Header(None),
-    db: TinyDB = Depends(get_db),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
 ):
     project_base_path = DOCAT_UPLOAD_FOLDER / project
     version_path = project_base_path / version
@@ -171,17 +456,21 @@ def hide_version(
 
     with open(hidden_file, "w") as f:
         f.close()
+    catalog.set_hidden(project, version, True)
+    update_search_index(project, catalog)
 
     return ApiResponse(message=f"Version {version} is now hidden")
 
 
 @router.post("/api/{project}/{version}/show", response_model=ApiResponse, status_code=status.HTTP_200_OK)
+@offload
 def show_version(
     project: str,
     version: str,
     response: Response,
     docat_api_key: str | None = Header(None),
-    db: TinyDB = Depends(get_db),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
 ):
     project_base_path = DOCAT_UPLOAD_FOLDER / project
     version_path = project_base_path / version
@@ -205,18 +494,24 @@ def show_version(
         return ApiResponse(message=token_status.reason)
 
     os.remove(hidden_file)
+    catalog.set_hidden(project, version, False)
+    update_search_index(project, catalog)
 
     return ApiResponse(message=f"Version {version} is now shown")
 
 
 @router.post("/api/{project}/{version}", response_model=ApiResponse, status_code=status.HTTP_201_CREATED)
+@offload
 def upload(
     project: str,
     version: str,
     response: Response,
     file: UploadFile = File(...),
     docat_api_key: str | None = Header(None),
-    db: TinyDB = Depends(get_db),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    trash: Trash = Depends(get_trash),
+    blob_store: BlobStore = Depends(get_blob_store),
 ):
     if is_forbidden_project_name(project):
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -228,7 +523,6 @@ def upload(
 
     project_base_path = DOCAT_UPLOAD_FOLDER / project
     base_path = project_base_path / version
-    target_file = base_path / Path(file.filename).name
 
     if base_path.is_symlink():
         # disallow overwriting of tags (symlinks) with new uploads
@@ -241,35 +535,564 @@ def upload(
             response.status_code = status.HTTP_401_UNAUTHORIZED
             return ApiResponse(message=token_status.reason)
 
-        remove_docs(project, version, DOCAT_UPLOAD_FOLDER)
+    # extract the uploaded documentation next to the upload folder,
+    # so readers never see a partially extracted version
+    staging_path = DOCAT_STAGING_FOLDER / secrets.token_hex(16)
+    staging_path.mkdir(parents=True)
+
+    version_size = extract_upload(file, staging_path, trash)
+    if version_size is None:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiResponse(message="Cannot extract zip file.")
+
+    # files of docat in the archive would be mistaken for the ones it stores
+    remove_metadata(staging_path)
 
-    # ensure directory for the uploaded doc exists
-    base_path.mkdir(parents=True, exist_ok=True)
+    try:
+        store_version(project, version, staging_path, version_size, catalog, trash, blob_store)
+    except VersionExistsError:
+        response.status_code = status.HTTP_409_CONFLICT
+        return ApiResponse(message="Version was uploaded by another request at the same time.")
+
+    if not (base_path / "index.html").exists():
+        return ApiResponse(message="Documentation uploaded successfully, but no index.html found at root of archive.")
+
+    return ApiResponse(message="Documentation uploaded successfully")
+
+
+@router.post(
+    "/api/{project}/{version}/manifest",
+    response_model=MissingFiles,
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_400_BAD_REQUEST: {"model": ApiResponse}, status.HTTP_404_NOT_FOUND: {"model": ApiResponse}},
+)
+@offload
+def upload_manifest(
+    project: str,
+    version: str,
+    manifest: Manifest,
+    docat_api_key: str | None = Header(None),
+    db: ClaimStore = Depends(get_db),
+):
+    """
+    First phase of a delta upload: returns the files of the
+    manifest which need to be uploaded to /api/{project}/{version}/delta.
+    """
+    try:
+        files = validate_manifest(manifest)
+    except DeltaError as e:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": str(e)})
+
+    base_path = DOCAT_UPLOAD_FOLDER / project / version
+    base_version_path = DOCAT_UPLOAD_FOLDER / project / manifest.base if manifest.base else None
+
+    if base_version_path is not None and not base_version_path.is_dir():
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": f"Version {manifest.base} not found"})
+
+    token_status = check_delta_token(db, docat_api_key, project, base_path)
+    if token_status is not None and not token_status.valid:
+        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"message": token_status.reason})
+
+    return MissingFiles(missing=find_missing(files, base_version_path))
 
-    # save the uploaded documentation
-    file.file.seek(0)
-    with target_file.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+
+@router.post("/api/{project}/{version}/delta", response_model=ApiResponse, status_code=status.HTTP_201_CREATED)
+@offload
+def upload_delta(
+    project: str,
+    version: str,
+    response: Response,
+    manifest: str = Form(...),
+    file: UploadFile | None = File(None),
+    docat_api_key: str | None = Header(None),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    trash: Trash = Depends(get_trash),
+    blob_store: BlobStore = Depends(get_blob_store),
+):
+    """
+    Second phase of a delta upload: takes the manifest and an archive
+    of the missing files, all other files are taken from the base version.
+    """
+    if is_forbidden_project_name(project):
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiResponse(message=f'Project name "{project}" is forbidden, as it conflicts with pages in docat web.')
 
     try:
-        extract_archive(target_file, base_path)
+        parsed_manifest = Manifest.model_validate_json(manifest)
+        files = validate_manifest(parsed_manifest)
+    except ValueError as e:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiResponse(message=f"Invalid manifest: {e}")
+
+    project_base_path = DOCAT_UPLOAD_FOLDER / project
+    base_path = project_base_path / version
+    base_version_path = project_base_path / parsed_manifest.base if parsed_manifest.base else None
+
+    if base_path.is_symlink():
+        # disallow overwriting of tags (symlinks) with new uploads
+        response.status_code = status.HTTP_409_CONFLICT
+        return ApiResponse(message="Cannot overwrite existing tag with new version.")
+
+    if base_version_path is not None and not base_version_path.is_dir():
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return ApiResponse(message=f"Version {parsed_manifest.base} not found")
+
+    token_status = check_delta_token(db, docat_api_key, project, base_path)
+    if token_status is not None and not token_status.valid:
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+        return ApiResponse(message=token_status.reason)
+
+    staging_path = DOCAT_STAGING_FOLDER / secrets.token_hex(16)
+    staging_path.mkdir(parents=True)
+
+    # the archive only holds the missing files and is left out if there are none
+    if file is not None and file.filename and extract_upload(file, staging_path, trash) is None:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiResponse(message="Cannot extract zip file.")
+
+    try:
+        version_size = assemble_version(files, staging_path, base_version_path, blob_store if DOCAT_DEDUPLICATE else None)
+    except DeltaError as e:
+        trash.put(staging_path)
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiResponse(message=str(e))
+
+    digests = {path: entry.sha256 for path, entry in files.items()}
+    try:
+        store_version(project, version, staging_path, version_size, catalog, trash, blob_store, digests)
+    except VersionExistsError:
+        response.status_code = status.HTTP_409_CONFLICT
+        return ApiResponse(message="Version was uploaded by another request at the same time.")
+
+    if "index.html" not in files:
+        return ApiResponse(message="Documentation uploaded successfully, but no index.html found at root of manifest.")
+    return ApiResponse(message="Documentation uploaded successfully")
+
+
+@router.post(
+    "/api/bulk",
+    response_model=BulkUploadResults,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_207_MULTI_STATUS: {"model": BulkUploadResults}, status.HTTP_400_BAD_REQUEST: {"model": ApiResponse}},
+)
+@offload
+def bulk_upload(
+    response: Response,
+    file: UploadFile = File(...),
+    tokens: str | None = Form(None),
+    docat_api_key: str | None = Header(None),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    trash: Trash = Depends(get_trash),
+    blob_store: BlobStore = Depends(get_blob_store),
+):
+    try:
+        project_tokens = json.loads(tokens) if tokens else {}
+        if not isinstance(project_tokens, dict):
+            raise ValueError
+    except ValueError:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content={"message": "Tokens have to be a JSON object of tokens by project."}
+        )
+
+    bulk_path = DOCAT_STAGING_FOLDER / secrets.token_hex(16)
+    bulk_path.mkdir(parents=True)
+    if extract_upload(file, bulk_path, trash) is None:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": "Cannot extract archive."})
+
+    try:
+        manifest = read_bulk_manifest(bulk_path)
+    except BulkError as e:
+        trash.put(bulk_path)
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": str(e)})
+
+    results, staged = stage_bulk_uploads(manifest.uploads, bulk_path, db, project_tokens, docat_api_key)
+    trash.put(bulk_path)
+
+    # the versions are stored in parallel and added to the catalog in a single write
+    with ThreadPoolExecutor(max_workers=max(1, DOCAT_BULK_WORKERS), thread_name_prefix="docat-bulk") as executor:
+        stored = list(executor.map(lambda item: publish_bulk_upload(item[1], item[2], trash, blob_store), staged))
+    for (index, _, _), result in zip(staged, stored, strict=True):
+        results[index] = result
+
+    published = [
+        (upload.project, upload.version)
+        for (_, upload, _), result in zip(staged, stored, strict=True)
+        if result.status == status.HTTP_201_CREATED
+    ]
+    catalog.update_versions(published)
+    for project, version in published:
+        update_search_index(project, catalog, DOCAT_UPLOAD_FOLDER / project / version)
+    for project in sorted({project for project, _ in published}):
+        update_nginx_locations(project, catalog)
+
+    bulk_results = [result for result in results if result is not None]
+    if any(result.status != status.HTTP_201_CREATED for result in bulk_results):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return BulkUploadResults(results=bulk_results)
+
+
+def bulk_result(upload: BulkUpload, status_code: int, message: str) -> BulkUploadResult:
+    return BulkUploadResult(project=upload.project, version=upload.version, status=status_code, message=message)
+
+
+def stage_bulk_uploads(
+    uploads: list[BulkUpload], bulk_path: Path, db: ClaimStore, project_tokens: dict, docat_api_key: str | None
+) -> tuple[list[BulkUploadResult | None], list[tuple[int, BulkUpload, Path]]]:
+    """
+    Stages all versions of a bulk upload.
+
+    Returns:
+        tuple: the results of the versions which cannot be uploaded (None for the others),
+            and the index, upload and staging folder of every staged version
+    """
+    # every project's token is verified at most once
+    token_statuses: dict[str, TokenStatus] = {}
+    results: list[BulkUploadResult | None] = []
+    staged: list[tuple[int, BulkUpload, Path]] = []
+    for upload in uploads:
+        if any(upload.project == other.project and upload.version == other.version for _, other, _ in staged):
+            results.append(bulk_result(upload, status.HTTP_409_CONFLICT, "Version is listed twice."))
+            continue
+
+        token = project_tokens.get(upload.project, docat_api_key)
+        staging_path = stage_bulk_upload(upload, bulk_path, db, token if isinstance(token, str) else None, token_statuses)
+        if isinstance(staging_path, BulkUploadResult):
+            results.append(staging_path)
+        else:
+            staged.append((len(results), upload, staging_path))
+            results.append(None)
+    return results, staged
+
+
+def stage_bulk_upload(
+    upload: BulkUpload, bulk_path: Path, db: ClaimStore, token: str | None, token_statuses: dict[str, TokenStatus]
+) -> Path | BulkUploadResult:
+    """
+    Moves the folder of a version out of an extracted bulk upload into its own staging folder.
+    Returns the result instead, if the version cannot be uploaded.
+    """
+    if is_forbidden_project_name(upload.project):
+        return bulk_result(upload, status.HTTP_400_BAD_REQUEST, f'Project name "{upload.project}" is forbidden.')
+
+    try:
+        version_path = upload_path(bulk_path, upload)
+    except BulkError as e:
+        return bulk_result(upload, status.HTTP_400_BAD_REQUEST, str(e))
+
+    base_path = DOCAT_UPLOAD_FOLDER / upload.project / upload.version
+    if base_path.is_symlink():
+        return bulk_result(upload, status.HTTP_409_CONFLICT, "Cannot overwrite existing tag with new version.")
+
+    if base_path.exists():
+        token_status = token_statuses.get(upload.project)
+        if token_status is None:
+            token_status = token_statuses[upload.project] = check_token_for_project(db, token, upload.project)
+        if not token_status.valid:
+            return bulk_result(upload, status.HTTP_401_UNAUTHORIZED, token_status.reason)
+
+    staging_path = DOCAT_STAGING_FOLDER / secrets.token_hex(16)
+    try:
+        os.rename(version_path, staging_path)
+    except FileNotFoundError:
+        # nested in the folder of another version, which was moved already
+        return bulk_result(upload, status.HTTP_400_BAD_REQUEST, f"Folder of {upload.project}/{upload.version} not found in the archive")
+
+    # files of docat in the archive would be mistaken for the ones it stores
+    remove_metadata(staging_path)
+    return staging_path
+
+
+def publish_bulk_upload(upload: BulkUpload, staging_path: Path, trash: Trash, blob_store: BlobStore) -> BulkUploadResult:
+    try:
+        publish_staged_version(upload.project, upload.version, staging_path, measure_dir(staging_path), trash, blob_store)
+    except VersionExistsError:
+        return bulk_result(upload, status.HTTP_409_CONFLICT, "Version was uploaded by another request at the same time.")
     except Exception:
-        logger.exception("Failed to unzip {target_file=}")
+        logger.exception(f"Failed to store {upload.project}/{upload.version}")
+        if staging_path.exists():
+            trash.put(staging_path)
+        return bulk_result(upload, status.HTTP_500_INTERNAL_SERVER_ERROR, "Failed to store the documentation.")
+
+    if not (DOCAT_UPLOAD_FOLDER / upload.project / upload.version / "index.html").exists():
+        return bulk_result(
+            upload, status.HTTP_201_CREATED, "Documentation uploaded successfully, but no index.html found at root of folder."
+        )
+    return bulk_result(upload, status.HTTP_201_CREATED, "Documentation uploaded successfully")
+
+
+@router.post(
+    "/api/{project}/{version}/uploads",
+    response_model=UploadSession,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_400_BAD_REQUEST: {"model": ApiResponse}, status.HTTP_401_UNAUTHORIZED: {"model": ApiResponse}},
+)
+@offload
+def create_upload_session(
+    project: str,
+    version: str,
+    session_request: UploadSessionRequest,
+    docat_api_key: str | None = Header(None),
+    db: ClaimStore = Depends(get_db),
+    sessions: UploadSessions = Depends(get_upload_sessions),
+):
+    """
+    Starts a chunked upload of an archive, which is sent in
+    byte ranges to /api/uploads/{id} and then finalized.
+    """
+    error = check_version_upload(project, version, docat_api_key, db)
+    if error is not None:
+        return error
+
+    if session_request.size <= 0 or not session_request.filename:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": "Filename and size of the archive are required."})
+
+    return sessions.create(project, version, session_request.filename, session_request.size, session_request.sha256)
+
+
+@router.get(
+    "/api/uploads/{session_id}",
+    response_model=UploadSession,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_404_NOT_FOUND: {"model": ApiResponse}},
+)
+def get_upload_session(session_id: str, sessions: UploadSessions = Depends(get_upload_sessions)):
+    """
+    Returns the session with the number of received bytes, where an interrupted upload continues.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Upload session not found"})
+    return session
+
+
+@router.put(
+    "/api/uploads/{session_id}",
+    response_model=UploadOffset,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_404_NOT_FOUND: {"model": ApiResponse},
+        status.HTTP_409_CONFLICT: {"model": UploadOffset},
+        status.HTTP_413_CONTENT_TOO_LARGE: {"model": ApiResponse},
+    },
+)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    content_range: str = Header(...),
+    docat_chunk_sha256: str | None = Header(None),
+    sessions: UploadSessions = Depends(get_upload_sessions),
+):
+    """
+    Writes a chunk of the archive, given as the byte range of the Content-Range header.
+    Chunks have to be sent in order, a chunk not starting at the received offset is
+    refused with 409 and the offset to continue at.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Upload session not found"})
+
+    try:
+        # the body is checked against the range before it is read, and never read beyond it
+        start, end, total = parse_content_range(content_range)
+        length = end - start + 1
+        if total != session.size:
+            raise SessionError(f"Content-Range {content_range} does not match the size of {session.size} bytes")
+        if length > DOCAT_UPLOAD_MAX_CHUNK_SIZE:
+            return JSONResponse(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                content={"message": f"Chunks are limited to {DOCAT_UPLOAD_MAX_CHUNK_SIZE} bytes"},
+            )
+        offset = await write_chunk(request, sessions, session, start, length, docat_chunk_sha256)
+    except OffsetMismatchError as e:
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"offset": e.offset})
+    except SessionError as e:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": str(e)})
+
+    return UploadOffset(offset=offset)
+
+
+async def write_chunk(
+    request: Request, sessions: UploadSessions, session: UploadSession, start: int, length: int, sha256: str | None
+) -> int:
+    """
+    Streams a request body of exactly `length` bytes into the received data of a session,
+    the part which was written is removed again if the body does not match the chunk.
+
+    Returns:
+        int: the number of received bytes of the session
+
+    Raises:
+        SessionError: if the body has a different length or does not match its checksum
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length != str(length):
+        raise SessionError(f"Content-Length {content_length} does not match the chunk of {length} bytes")
+
+    with sessions.open_chunk(session, start, length) as writer:
+        async for part in request.stream():
+            await anyio.to_thread.run_sync(writer.write, part)
+        return await worker_pool.run(writer.finish, sha256)
+
+
+@router.post("/api/uploads/{session_id}/finalize", response_model=ApiResponse, status_code=status.HTTP_201_CREATED)
+@offload
+def finalize_upload(
+    session_id: str,
+    response: Response,
+    docat_api_key: str | None = Header(None),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    trash: Trash = Depends(get_trash),
+    blob_store: BlobStore = Depends(get_blob_store),
+    sessions: UploadSessions = Depends(get_upload_sessions),
+):
+    """
+    Extracts and publishes the archive of a complete upload session.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        response.status_code = status.HTTP_404_NOT_FOUND
+        return ApiResponse(message="Upload session not found")
+
+    if session.offset != session.size:
+        response.status_code = status.HTTP_409_CONFLICT
+        return ApiResponse(message=f"Upload is incomplete, received {session.offset} of {session.size} bytes")
+
+    data_path = sessions.data_path(session_id)
+    if session.sha256 is not None and hash_file(data_path) != session.sha256.lower():
+        sessions.remove(session_id, trash)
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return ApiResponse(message="Archive does not match its checksum, the upload session is removed")
+
+    # the version might have been uploaded since the session started
+    error = check_version_upload(session.project, session.version, docat_api_key, db)
+    if error is not None:
+        return error
+
+    staging_path = DOCAT_STAGING_FOLDER / secrets.token_hex(16)
+    staging_path.mkdir(parents=True)
+    with data_path.open("rb") as f:
+        version_size = extract_upload(UploadFile(f, filename=session.filename), staging_path, trash)
+    sessions.remove(session_id, trash)
+    if version_size is None:
         response.status_code = status.HTTP_400_BAD_REQUEST
         return ApiResponse(message="Cannot extract zip file.")
 
-    # force cache revalidation
-    get_system_stats.cache_clear()
-    get_dir_size.cache_clear()
+    remove_metadata(staging_path)
+    try:
+        store_version(session.project, session.version, staging_path, version_size, catalog, trash, blob_store)
+    except VersionExistsError:
+        response.status_code = status.HTTP_409_CONFLICT
+        return ApiResponse(message="Version was uploaded by another request at the same time.")
 
-    if not (base_path / "index.html").exists():
+    if not (DOCAT_UPLOAD_FOLDER / session.project / session.version / "index.html").exists():
         return ApiResponse(message="Documentation uploaded successfully, but no index.html found at root of archive.")
 
     return ApiResponse(message="Documentation uploaded successfully")
 
 
+def check_version_upload(project: str, version: str, docat_api_key: str | None, db: ClaimStore) -> JSONResponse | None:
+    """
+    Returns an error response if the version cannot be uploaded by the caller.
+    """
+    if is_forbidden_project_name(project):
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={"message": f'Project name "{project}" is forbidden, as it conflicts with pages in docat web.'},
+        )
+
+    base_path = DOCAT_UPLOAD_FOLDER / project / version
+    if base_path.is_symlink():
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"message": "Cannot overwrite existing tag with new version."})
+
+    if base_path.exists():
+        token_status = check_token_for_project(db, docat_api_key, project)
+        if not token_status.valid:
+            return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"message": token_status.reason})
+    return None
+
+
+def extract_upload(file: UploadFile, staging_path: Path, trash: Trash) -> VersionSize | None:
+    """
+    Extracts an uploaded archive into the staging folder.
+    Returns None and trashes the staging folder if it cannot be extracted.
+    """
+    file.file.seek(0)
+    try:
+        return extract_archive(file.file, file.filename or "", staging_path, DOCAT_EXTRACT_WORKERS)
+    except Exception:
+        logger.exception(f"Failed to unzip {file.filename=}")
+        trash.put(staging_path)
+        return None
+
+
+def store_version(
+    project: str,
+    version: str,
+    staging_path: Path,
+    version_size: VersionSize,
+    catalog: Catalog,
+    trash: Trash,
+    blob_store: BlobStore,
+    digests: dict[str, str] | None = None,
+) -> None:
+    """
+    Publishes a complete version from the staging folder,
+    replacing the previous upload of the version.
+
+    Raises:
+        VersionExistsError: if a concurrent upload published the version first, the staging folder is trashed
+    """
+    publish_staged_version(project, version, staging_path, version_size, trash, blob_store, digests)
+    catalog.update_version(project, version)
+    update_search_index(project, catalog, DOCAT_UPLOAD_FOLDER / project / version)
+    update_nginx_locations(project, catalog)
+
+
+def publish_staged_version(
+    project: str,
+    version: str,
+    staging_path: Path,
+    version_size: VersionSize,
+    trash: Trash,
+    blob_store: BlobStore,
+    digests: dict[str, str] | None = None,
+) -> None:
+    """
+    Moves a complete version from the staging folder into the upload folder,
+    without adding it to the catalog. Versions without the `digests` of a
+    delta upload are hashed, so every version is stored with a manifest.
+    """
+    if digests is None:
+        files = hash_version(staging_path)
+        write_version_manifest(staging_path, files)
+        digests = {path: digest for path, (digest, _) in files.items()}
+
+    if DOCAT_PRECOMPRESS:
+        sidecars = precompress_tree(staging_path, DOCAT_PRECOMPRESS_MIN_SIZE, DOCAT_PRECOMPRESS_WORKERS)
+        version_size = dataclasses.replace(version_size, sidecars=sidecars)
+
+    if DOCAT_DEDUPLICATE:
+        version_size = blob_store.link_tree(staging_path, version_size, digests)
+
+    # the size is stored with the version, so it never needs to be walked
+    write_version_size(staging_path, version_size)
+    try:
+        replaced_path = publish_version(staging_path, DOCAT_UPLOAD_FOLDER / project / version)
+    except VersionExistsError:
+        trash.put(staging_path)
+        raise
+    if replaced_path is not None:
+        trash.put(replaced_path)
+    logger.debug(f"Wrote {version_size.size} bytes in {version_size.files} files for {project}/{version}")
+
+
 @router.put("/api/{project}/{version}/tags/{new_tag}", response_model=ApiResponse, status_code=status.HTTP_201_CREATED)
-def tag(project: str, version: str, new_tag: str, response: Response):
+def tag(project: str, version: str, new_tag: str, response: Response, catalog: Catalog = Depends(get_catalog)):
     destination = DOCAT_UPLOAD_FOLDER / project / new_tag
     source = DOCAT_UPLOAD_FOLDER / project / version
 
@@ -280,6 +1103,9 @@ def tag(project: str, version: str, new_tag: str, response: Response):
     if not create_symlink(version, destination):
         response.status_code = status.HTTP_409_CONFLICT
         return ApiResponse(message=f"Tag {new_tag} would overwrite an existing version!")
+    catalog.set_tag(project, version, new_tag)
+    update_search_index(project, catalog)
+    update_nginx_locations(project, catalog)
 
     return ApiResponse(message=f"Tag {new_tag} -> {version} successfully created")
 
@@ -290,28 +1116,31 @@ def tag(project: str, version: str, new_tag: str, response: Response):
     status_code=status.HTTP_201_CREATED,
     responses={status.HTTP_409_CONFLICT: {"model": ApiResponse}},
 )
-def claim(project: str, db: TinyDB = Depends(get_db)):
-    Project = Query()
-    table = db.table("claims")
-    result = table.search(Project.name == project)
-    if result:
+@offload
+def claim(project: str, db: ClaimStore = Depends(get_db)):
+    if db.get(project) is not None:
         return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"message": f"Project {project} is already claimed!"})
 
     token = secrets.token_hex(16)
     salt = os.urandom(32)
     token_hash = calculate_token(token, salt)
-    table.insert({"name": project, "token": token_hash, "salt": salt.hex()})
+    if not db.add(Claim(name=project, token=token_hash, salt=salt.hex())):
+        # claimed by a concurrent request
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"message": f"Project {project} is already claimed!"})
+    token_cache.invalidate(project)
 
     return ClaimResponse(message=f"Project {project} successfully claimed", token=token)
 
 
 @router.put("/api/{project}/rename/{new_project_name}", response_model=ApiResponse, status_code=status.HTTP_200_OK)
+@offload
 def rename(
     project: str,
     new_project_name: str,
     response: Response,
     docat_api_key: str = Header(None),
-    db: TinyDB = Depends(get_db),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
 ):
     if is_forbidden_project_name(new_project_name):
         response.status_code = status.HTTP_400_BAD_REQUEST
@@ -334,49 +1163,71 @@ def rename(
         return ApiResponse(message=token_status.reason)
 
     # update the claim to the new project name
-    Project = Query()
-    claims_table = db.table("claims")
-    claims_table.update({"name": new_project_name}, Project.name == project)
+    if not db.rename(project, new_project_name):
+        response.status_code = status.HTTP_409_CONFLICT
+        return ApiResponse(message=f"New project name {new_project_name} is already claimed")
+    token_cache.invalidate(project)
+    token_cache.invalidate(new_project_name)
 
     os.rename(project_base_path, new_project_base_path)
+    catalog.rename_project(project, new_project_name)
+    change_search_index(project, lambda search_index: search_index.rename_project(project, new_project_name))
+    update_nginx_locations(project, catalog)
+    update_nginx_locations(new_project_name, catalog)
 
     response.status_code = status.HTTP_200_OK
     return ApiResponse(message=f"Successfully renamed project {project} to {new_project_name}")
 
 
 @router.delete("/api/{project}/{version}", response_model=ApiResponse, status_code=status.HTTP_200_OK)
+@offload
 def delete(
     project: str,
     version: str,
     response: Response,
     docat_api_key: str = Header(None),
-    db: TinyDB = Depends(get_db),
+    db: ClaimStore = Depends(get_db),
+    catalog: Catalog = Depends(get_catalog),
+    trash: Trash = Depends(get_trash),
 ):
     token_status = check_token_for_project(db, docat_api_key, project)
     if not token_status.valid:
         response.status_code = status.HTTP_401_UNAUTHORIZED
         return ApiResponse(message=token_status.reason)
 
-    message = remove_docs(project, version, DOCAT_UPLOAD_FOLDER)
+    message = remove_docs(project, version, DOCAT_UPLOAD_FOLDER, trash)
     if message:
         response.status_code = status.HTTP_404_NOT_FOUND
         return ApiResponse(message=message)
 
-    # force cache revalidation
-    get_system_stats.cache_clear()
-    get_dir_size.cache_clear()
+    catalog.remove(project, version)
+    change_search_index(project, lambda search_index: search_index.remove(project, version))
+    update_search_index(project, catalog)
+    update_nginx_locations(project, catalog)
 
     return ApiResponse(message=f"Successfully deleted version '{version}'")
 
 
-def check_token_for_project(db, token, project) -> TokenStatus:
-    Project = Query()
-    table = db.table("claims")
-    result = table.search(Project.name == project)
+def check_delta_token(db: ClaimStore, token: str | None, project: str, version_path: Path) -> TokenStatus | None:
+    """
+    Delta uploads read the files of other versions, so they need the token of a claimed project,
+    for new versions as well. Returns None if no token is needed.
+    """
+    if db.get(project) is None and not version_path.exists():
+        return None
+    return check_token_for_project(db, token, project)
+
+
+def check_token_for_project(db: ClaimStore, token, project) -> TokenStatus:
+    result = db.get(project)
 
     if result and token:
-        token_hash = calculate_token(token, bytes.fromhex(result[0]["salt"]))
-        if result[0]["token"] == token_hash:
+        if token_cache.contains(result, token):
+            return TokenStatus(True, "Docat-Api-Key token is valid")
+
+        token_hash = calculate_token(token, bytes.fromhex(result.salt))
+        if result.token == token_hash:
+            token_cache.add(result, token)
             return TokenStatus(True, "Docat-Api-Key token is valid")
         else:
             return TokenStatus(False, f"Docat-Api-Key token is not valid for {project}")
@@ -387,6 +1238,10 @@ def check_token_for_project(db, token, project) -> TokenStatus:
 # serve_local_docs for local testing without a nginx
 if os.environ.get("DOCAT_SERVE_FILES"):
     DOCAT_UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
-    app.mount("/doc", StaticFiles(directory=DOCAT_UPLOAD_FOLDER, html=True), name="docs")
+    app.mount(
+        "/doc",
+        DocsFiles(DOCAT_UPLOAD_FOLDER, get_catalog().shared_generation, file_cache=file_cache, immutable_versions=DOCAT_IMMUTABLE_VERSIONS),
+        name="docs",
+    )
 
 app.include_router(router)
@@ -0,0 +1,170 @@
+"""
+docat blobs
+
+Content-addressed store of documentation files. Extracted files
+are hashed and hard-linked to a single copy per content, so files
+shared between versions are only stored once.
+"""
+
+import dataclasses
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from docat.models import VersionSize
+from docat.utils import METADATA_FILES
+
+BLOBS_FOLDER = "blobs"
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(path: Path | str) -> str:
+    """
+    Returns the hex encoded sha256 of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """
+    Folder of files named by the sha256 of their content.
+
+    Every blob is hard-linked into the versions containing it, a blob
+    with a single link is no longer used. The store keeps track of
+    the bytes it holds, which are the physical bytes of all linked files.
+    It has to be on the same filesystem as the upload folder.
+    """
+
+    def __init__(self, blobs_path: Path):
+        self.blobs_path = blobs_path
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_path / digest[:2] / digest
+
+    @contextmanager
+    def _locked_size(self) -> Iterator[dict]:
+        self.blobs_path.mkdir(parents=True, exist_ok=True)
+        with (self.blobs_path / ".lock").open("a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            size_path = self.blobs_path / ".size"
+            data = json.loads(size_path.read_text()) if size_path.exists() else {"size": 0}
+            yield data
+            tmp_path = size_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data))
+            os.replace(tmp_path, size_path)
+
+    def size(self) -> int:
+        """
+        Returns the number of bytes in the store.
+        """
+        try:
+            return json.loads((self.blobs_path / ".size").read_text())["size"]
+        except (OSError, ValueError, KeyError):
+            return 0
+
+    def link_file(self, path: Path | str, digest: str | None = None) -> tuple[bool, int]:
+        """
+        Replaces a file with a hard link to its blob, adding
+        the file to the store if its content is new.
+
+        Args:
+            path (pathlib.Path | str): the file to link
+            digest (str | None): the sha256 of the file, if it is already known
+
+        Returns:
+            tuple[bool, int]: whether the file is linked and the number of bytes added to the store
+        """
+        blob = self.blob_path(digest or hash_file(path))
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.docat-link"
+
+        while True:
+            try:
+                os.link(path, blob)
+                return True, os.stat(blob).st_size
+            except FileExistsError:
+                pass
+
+            try:
+                os.link(blob, tmp_path)
+            except FileNotFoundError:
+                # the unused blob was just collected, store this file instead
+                continue
+            except OSError as e:
+                if e.errno == errno.EMLINK:
+                    # the blob reached the link limit of the filesystem, keep the copy
+                    return False, 0
+                raise
+
+            os.replace(tmp_path, path)
+            return True, 0
+
+    def link_tree(self, path: Path, version_size: VersionSize, digests: dict[str, str] | None = None) -> VersionSize:
+        """
+        Deduplicates all regular files of an extracted version, except for the files
+        docat stores in it, which are not counted in its size either.
+
+        Args:
+            path (pathlib.Path): the extracted version
+            version_size (VersionSize): the size of the extracted version
+            digests (dict[str, str] | None): known sha256 of files by their relative path
+
+        Returns:
+            VersionSize: the size of the version including the bytes which are linked to blobs
+        """
+        linked = 0
+        added = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                file_path = os.path.join(root, name)
+                if name in METADATA_FILES or os.path.islink(file_path) or os.path.getsize(file_path) == 0:
+                    continue
+
+                digest = digests.get(os.path.relpath(file_path, path)) if digests else None
+                is_linked, new_bytes = self.link_file(file_path, digest)
+                if is_linked:
+                    linked += os.path.getsize(file_path)
+                added += new_bytes
+
+        if added:
+            with self._locked_size() as data:
+                data["size"] += added
+
+        return dataclasses.replace(version_size, linked=linked)
+
+    def collect(self) -> int:
+        """
+        Removes blobs which are no longer linked to any version.
+
+        Returns:
+            int: the number of bytes freed
+        """
+        if not self.blobs_path.exists():
+            return 0
+
+        freed = 0
+        with self._locked_size() as data:
+            for prefix in self.blobs_path.iterdir():
+                if not prefix.is_dir():
+                    continue
+                for blob in prefix.iterdir():
+                    stat = blob.stat()
+                    if stat.st_nlink == 1:
+                        blob.unlink()
+                        freed += stat.st_size
+            data["size"] = max(0, data["size"] - freed)
+
+        if freed:
+            logger.info(f"Removed {freed} bytes of unused blobs")
+        return freed
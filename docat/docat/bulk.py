@@ -0,0 +1,62 @@
+"""
+docat bulk uploads
+
+Many versions, of one or more projects, are uploaded in a single archive.
+The archive contains the folder of every version and a manifest listing
+the uploads, the versions are published together once all are stored.
+"""
+
+import json
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from docat.delta import DeltaError, manifest_path
+from docat.models import BulkManifest, BulkUpload
+
+BULK_MANIFEST = "docat.json"
+
+
+class BulkError(ValueError):
+    """
+    Raised when the manifest or an upload of a bulk upload is invalid.
+    """
+
+
+def read_bulk_manifest(staging_path: Path) -> BulkManifest:
+    """
+    Returns the manifest of an extracted bulk upload.
+
+    Raises:
+        BulkError: if the manifest is missing or invalid
+    """
+    try:
+        with (staging_path / BULK_MANIFEST).open() as f:
+            return BulkManifest.model_validate(json.load(f))
+    except FileNotFoundError:
+        raise BulkError(f"{BULK_MANIFEST} is missing") from None
+    except (ValueError, ValidationError):
+        raise BulkError(f"{BULK_MANIFEST} is invalid") from None
+
+
+def is_valid_name(name: str) -> bool:
+    return name not in ("", ".", "..") and "/" not in name and "\\" not in name
+
+
+def upload_path(staging_path: Path, upload: BulkUpload) -> Path:
+    """
+    Returns the extracted folder of an upload.
+
+    Raises:
+        BulkError: if the names or the path are invalid or the folder does not exist
+    """
+    if not is_valid_name(upload.project) or not is_valid_name(upload.version):
+        raise BulkError(f"Invalid project or version {upload.project}/{upload.version}")
+
+    try:
+        path = staging_path / manifest_path(upload.path or f"{upload.project}/{upload.version}")
+    except DeltaError as e:
+        raise BulkError(str(e)) from None
+    if not path.resolve().is_relative_to(staging_path.resolve()) or path.is_symlink() or not path.is_dir():
+        raise BulkError(f"Folder {path.relative_to(staging_path)} not found in the archive")
+    return path
@@ -0,0 +1,442 @@
+"""
+docat catalog
+
+Persistent index of all projects and their versions, tags,
+visibility, timestamps, sizes and logos. Listing projects only
+reads the catalog instead of walking the upload folder.
+"""
+
+import bisect
+import fcntl
+import json
+import os
+import secrets
+import tempfile
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from docat.generation import SharedGeneration, open_generation
+from docat.models import Project, ProjectDetail, Projects, ProjectVersion, Stats
+from docat.utils import readable_size, resolve_tag, scan_project, scan_version
+
+CATALOG_PATH = "catalog.json"
+# catalogs written with a different layout are rebuilt from the filesystem
+CATALOG_VERSION = 6
+
+# parsed catalogs by path together with the shared generation they were read at
+_documents: dict[Path, tuple[int, dict]] = {}
+# sorted project names by path together with the generation they belong to
+_names: dict[Path, tuple[str, list[str]]] = {}
+_lock = threading.Lock()
+
+
+class Catalog:
+    """
+    On-disk catalog of all projects.
+
+    The catalog is a single JSON document which is replaced atomically
+    on every change. Changes are serialized with a file lock, so multiple
+    workers can share the same catalog. Every write increments a counter
+    in shared memory, readers keep the parsed document in memory until
+    the counter changes, so no worker serves a stale catalog.
+
+    Every change increments the generation of the catalog, a rebuilt
+    catalog gets a new id, so both together identify its content.
+    """
+
+    def __init__(self, catalog_path: Path, upload_folder_path: Path):
+        self.catalog_path = catalog_path
+        self.upload_folder_path = upload_folder_path
+
+    @property
+    def shared_generation(self) -> SharedGeneration:
+        return open_generation(self.catalog_path.with_suffix(".generation"))
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        lock_path = self.catalog_path.with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with _lock, lock_path.open("a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> dict | None:
+        # read before the file, a write in between only causes another read
+        generation = self.shared_generation.value()
+        cached = _documents.get(self.catalog_path)
+        if cached and cached[0] == generation:
+            return cached[1]
+
+        try:
+            with self.catalog_path.open() as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        if data.get("version") != CATALOG_VERSION:
+            return None
+        _documents[self.catalog_path] = (generation, data)
+        return data
+
+    def _store(self, data: dict) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.catalog_path.parent, prefix=".catalog-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.catalog_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        _documents[self.catalog_path] = (self.shared_generation.increment(), data)
+
+    def _scan(self, measure: bool = False) -> dict:
+        data: dict = {
+            "version": CATALOG_VERSION,
+            "id": secrets.token_hex(8),
+            "generation": 0,
+            "projects": {},
+            "n_versions": 0,
+            "size": 0,
+            "linked": 0,
+            "sidecars": 0,
+        }
+        if self.upload_folder_path.exists():
+            for project in self.upload_folder_path.iterdir():
+                entry = scan_project(self.upload_folder_path, project.name, measure)
+                if entry is not None:
+                    _add_project(data, project.name, entry)
+        return data
+
+    def read(self) -> dict:
+        """
+        Returns the catalog, building it from the filesystem
+        if it does not exist yet.
+        """
+        data = self._load()
+        if data is None:
+            with self._file_lock():
+                data = self._load()
+                if data is None:
+                    data = self._scan()
+                    self._store(data)
+        return data
+
+    def rebuild(self) -> None:
+        """
+        Rebuilds the whole catalog from the upload folder, measuring every version.
+        """
+        with self._file_lock():
+            self._store(self._scan(measure=True))
+
+    @contextmanager
+    def transaction(self) -> Iterator[dict]:
+        """
+        Yields a copy of the catalog which is written back
+        atomically when the block exits without an error.
+        """
+        with self._file_lock():
+            data = self._load()
+            if data is None:
+                data = self._scan()
+            # deep copy, so a failed transaction leaves the cached document untouched
+            data = json.loads(json.dumps(data))
+            yield data
+            data["generation"] += 1
+            self._store(data)
+
+    def refresh_project(self, project: str) -> bool:
+        """
+        Rescans a project which was changed on disk outside of the api, measuring
+        the versions which changed since their size was stored.
+        The catalog is only written if the project differs from its entry.
+
+        Returns:
+            bool: True if the entry of the project changed
+        """
+        with self._file_lock():
+            data = self._load()
+            if data is None:
+                # the catalog is scanned completely on the next read
+                return False
+
+            entry = scan_project(self.upload_folder_path, project)
+            if not _project_changed(data["projects"].get(project), entry):
+                return False
+
+            data = json.loads(json.dumps(data))
+            _remove_project(data, project)
+            if entry is not None:
+                _add_project(data, project, entry)
+            data["generation"] += 1
+            self._store(data)
+            return True
+
+    def generation(self) -> str:
+        """
+        Returns an identifier of the current content of the catalog,
+        which changes with every change.
+        """
+        data = self.read()
+        return f"{data['id']}-{data['generation']}"
+
+    def _project(self, data: dict, project: str) -> dict:
+        """
+        Returns the entry of a project, picking up projects
+        which were added to the upload folder by hand.
+        """
+        entry = data["projects"].get(project)
+        if entry is None:
+            entry = scan_project(self.upload_folder_path, project) or {"logo": False, "logo_size": 0, "versions": {}, "tags": {}}
+            _add_project(data, project, entry)
+        return entry
+
+    def update_version(self, project: str, version: str) -> None:
+        """
+        Adds or replaces a version from its folder on disk.
+        """
+        self.update_versions([(project, version)])
+
+    def update_versions(self, versions: list[tuple[str, str]]) -> None:
+        """
+        Adds or replaces versions of any projects with a single write.
+        The versions were just published, so their stored size is used as it is.
+        """
+        with self.transaction() as data:
+            for project, version in versions:
+                entry = self._project(data, project)
+                _set_version(data, entry, version, scan_version(self.upload_folder_path / project / version, verify=False))
+
+    def set_hidden(self, project: str, version: str, hidden: bool) -> None:
+        with self.transaction() as data:
+            entry = self._project(data, project)
+            if version in entry["tags"]:
+                version = resolve_tag(entry["tags"], version)
+            if version in entry["versions"]:
+                entry["versions"][version]["hidden"] = hidden
+            else:
+                _set_version(data, entry, version, scan_version(self.upload_folder_path / project / version))
+
+    def set_tag(self, project: str, version: str, tag: str) -> None:
+        with self.transaction() as data:
+            self._project(data, project)["tags"][tag] = version
+
+    def set_logo(self, project: str) -> None:
+        with self.transaction() as data:
+            entry = self._project(data, project)
+            logo_size = (self.upload_folder_path / project / "logo").stat().st_size
+            entry["logo"] = True
+            entry["size"] += logo_size - entry["logo_size"]
+            entry["logo_size"] = logo_size
+
+    def rename_project(self, project: str, new_project_name: str) -> None:
+        with self.transaction() as data:
+            entry = data["projects"].pop(project, None)
+            if entry is not None:
+                data["projects"][new_project_name] = entry
+            else:
+                self._project(data, new_project_name)
+
+    def remove(self, project: str, version: str) -> None:
+        """
+        Removes a version or tag, all tags pointing to it and
+        the project itself when it has no versions left.
+        """
+        with self.transaction() as data:
+            entry = data["projects"].get(project)
+            if entry is None:
+                return
+
+            if entry["tags"].pop(version, None) is None:
+                _set_version(data, entry, version, None)
+
+            # drop tags which do no longer point to a version
+            tags = entry["tags"]
+            for tag in list(tags):
+                if resolve_tag(tags, tag) not in entry["versions"]:
+                    del tags[tag]
+
+            if not entry["versions"]:
+                del data["projects"][project]
+
+    def has_project(self, project_name: str) -> bool:
+        return project_name in self.read()["projects"]
+
+    def get_project_details(self, project_name: str, include_hidden: bool) -> ProjectDetail | None:
+        """
+        Returns all versions and tags for a project.
+        """
+        entry = self.read()["projects"].get(project_name)
+        if entry is None:
+            return None
+
+        return _project_detail(project_name, entry, include_hidden)
+
+    def _sorted_names(self, data: dict) -> list[str]:
+        generation = f"{data['id']}-{data['generation']}"
+        cached = _names.get(self.catalog_path)
+        if cached is None or cached[0] != generation:
+            cached = (generation, sorted(data["projects"]))
+            _names[self.catalog_path] = cached
+        return cached[1]
+
+    def latest_version(self, project_name: str) -> str | None:
+        """
+        Returns the version the "latest" tag points to, or the first
+        version in the version list, ignoring hidden versions.
+        """
+        entry = self.read()["projects"].get(project_name)
+        if entry is None:
+            return None
+
+        visible = [name for name, version in entry["versions"].items() if not version["hidden"]]
+        if "latest" in entry["tags"] and resolve_tag(entry["tags"], "latest") in visible:
+            return resolve_tag(entry["tags"], "latest")
+        return visible[0] if visible else None
+
+    def get_all_projects(
+        self,
+        include_hidden: bool,
+        *,
+        limit: int | None = None,
+        cursor: str | None = None,
+        prefix: str | None = None,
+        search: str | None = None,
+        versions: int | None = None,
+    ) -> Projects:
+        """
+        Returns the projects with at least one (visible) version, ordered by name.
+
+        Args:
+            include_hidden (bool): include hidden versions
+            limit (int | None): return at most this many projects and a cursor to the next page
+            cursor (str | None): continue after the page which returned this cursor
+            prefix (str | None): only return projects whose name starts with it
+            search (str | None): only return projects whose name contains it, ignoring case
+            versions (int | None): only return the latest versions of each project, 0 to omit them
+        """
+        data = self.read()
+        names = self._sorted_names(data)
+
+        # the names are sorted, so the page starts right after the cursor or at the prefix
+        start = max(cursor or "", prefix or "")
+        index = bisect.bisect_right(names, start) if cursor and start == cursor else bisect.bisect_left(names, start)
+
+        projects: list[Project] = []
+        next_cursor = None
+        for name in names[index:]:
+            if prefix and not name.startswith(prefix):
+                break
+            if search and search.lower() not in name.lower():
+                continue
+
+            entry = data["projects"][name]
+            details = _project_detail(name, entry, include_hidden)
+            if len(details.versions) < 1:
+                continue
+
+            if limit is not None and len(projects) >= limit:
+                next_cursor = projects[-1].name
+                break
+            project_versions = details.versions if versions is None else details.versions[:versions]
+            projects.append(Project(name=name, logo=entry["logo"], versions=project_versions, storage=details.storage))
+
+        return Projects(projects=projects, next_cursor=next_cursor)
+
+    def get_stats(self, blob_size: int = 0) -> Stats:
+        """
+        Returns the totals, which are kept up to date on every change.
+
+        Args:
+            blob_size (int): bytes in the blob store, which hold the content of all linked files
+        """
+        data = self.read()
+        return Stats(
+            n_projects=len(data["projects"]),
+            n_versions=data["n_versions"],
+            storage=readable_size(data["size"]),
+            sidecar_storage=readable_size(data["sidecars"]),
+            physical_storage=readable_size(data["size"] + data["sidecars"] - data["linked"] + blob_size),
+        )
+
+
+def _add_project(data: dict, project: str, entry: dict) -> None:
+    entry["size"] = entry["logo_size"]
+    versions = entry["versions"]
+    entry["versions"] = {}
+    data["projects"][project] = entry
+    for version, info in versions.items():
+        _set_version(data, entry, version, info, ordered=False)
+    # sorted once for the whole project instead of after every version
+    _sort_versions(entry)
+
+
+def _remove_project(data: dict, project: str) -> None:
+    entry = data["projects"].pop(project, None)
+    if entry is not None:
+        for version in list(entry["versions"]):
+            _set_version(data, entry, version, None)
+
+
+def _project_changed(current: dict | None, scanned: dict | None) -> bool:
+    if current is None or scanned is None:
+        return current is not scanned
+    return any(current[key] != scanned[key] for key in ("logo", "logo_size", "versions", "tags"))
+
+
+def _sort_versions(entry: dict) -> None:
+    entry["versions"] = dict(sorted(entry["versions"].items(), key=lambda item: (item[1]["sort_key"], item[0]), reverse=True))
+
+
+def _set_version(data: dict, entry: dict, version: str, info: dict | None, ordered: bool = True) -> None:
+    """
+    Replaces or removes (None) a version and updates the totals.
+    Versions are kept ordered newest first by their stored sort key,
+    so listing them never needs to parse or sort version names.
+    Without `ordered`, the caller sorts the versions afterwards.
+    """
+    previous = entry["versions"].pop(version, None)
+    if previous is not None:
+        entry["size"] -= previous["size"]
+        data["size"] -= previous["size"]
+        data["linked"] -= previous["linked"]
+        data["sidecars"] -= previous["sidecars"]
+        data["n_versions"] -= 1
+
+    if info is not None:
+        entry["versions"][version] = info
+        if ordered:
+            _sort_versions(entry)
+        entry["size"] += info["size"]
+        data["size"] += info["size"]
+        data["linked"] += info["linked"]
+        data["sidecars"] += info["sidecars"]
+        data["n_versions"] += 1
+
+
+def _project_detail(project_name: str, entry: dict, include_hidden: bool) -> ProjectDetail:
+    tags_by_version: dict[str, list[str]] = {}
+    for tag in sorted(entry["tags"]):
+        tags_by_version.setdefault(resolve_tag(entry["tags"], tag), []).append(tag)
+
+    return ProjectDetail(
+        name=project_name,
+        storage=readable_size(entry["size"]),
+        versions=[
+            ProjectVersion(
+                name=name,
+                tags=tags_by_version.get(name, []),
+                timestamp=datetime.fromisoformat(version["timestamp"]),
+                hidden=version["hidden"],
+            )
+            for name, version in entry["versions"].items()
+            if include_hidden or not version["hidden"]
+        ],
+    )
@@ -0,0 +1,223 @@
+"""
+docat claims
+
+Storage of the tokens with which projects are claimed.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cache
+from pathlib import Path
+
+from tinydb import Query, TinyDB
+
+from docat.database import ConnectionPool
+from docat.models import Claim
+
+CLAIMS_DB_PATH = "claims.db"
+
+logger = logging.getLogger(__name__)
+
+
+class ClaimStore(ABC):
+    """
+    Storage of project claims, keyed by project name.
+    """
+
+    @abstractmethod
+    def get(self, project: str) -> Claim | None:
+        """
+        Returns the claim of a project, if it is claimed.
+        """
+
+    @abstractmethod
+    def add(self, claim: Claim) -> bool:
+        """
+        Stores a new claim, returns False if the project is already claimed.
+        """
+
+    @abstractmethod
+    def rename(self, project: str, new_project_name: str) -> bool:
+        """
+        Moves the claim of a project to its new name, returns False if the new name is already claimed.
+        """
+
+
+class TinyDBClaimStore(ClaimStore):
+    """
+    Claims stored in the "claims" table of a TinyDB json file.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db = TinyDB(db_path)
+        self._lock = threading.Lock()
+
+    def get(self, project: str) -> Claim | None:
+        Project = Query()
+        result = self.db.table("claims").search(Project.name == project)
+        if not result:
+            return None
+        return Claim(name=result[0]["name"], token=result[0]["token"], salt=result[0]["salt"])
+
+    def add(self, claim: Claim) -> bool:
+        with self._lock:
+            if self.get(claim.name) is not None:
+                return False
+            self.db.table("claims").insert({"name": claim.name, "token": claim.token, "salt": claim.salt})
+            return True
+
+    def rename(self, project: str, new_project_name: str) -> bool:
+        Project = Query()
+        with self._lock:
+            if self.get(new_project_name) is not None:
+                return False
+            self.db.table("claims").update({"name": new_project_name}, Project.name == project)
+            return True
+
+
+class SqliteClaimStore(ClaimStore):
+    """
+    Claims stored in an SQLite database, so multiple
+    workers can read and claim concurrently.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._pool = ConnectionPool(db_path)
+        with self._pool.connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS claims (name TEXT PRIMARY KEY, token TEXT NOT NULL, salt TEXT NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get(self, project: str) -> Claim | None:
+        with self._pool.connection() as connection:
+            row = connection.execute("SELECT name, token, salt FROM claims WHERE name = ?", (project,)).fetchone()
+        if row is None:
+            return None
+        return Claim(name=row[0], token=row[1], salt=row[2])
+
+    def add(self, claim: Claim) -> bool:
+        try:
+            with self._pool.connection() as connection:
+                connection.execute("INSERT INTO claims (name, token, salt) VALUES (?, ?, ?)", (claim.name, claim.token, claim.salt))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def rename(self, project: str, new_project_name: str) -> bool:
+        with self._pool.connection() as connection:
+            if connection.execute("SELECT 1 FROM claims WHERE name = ?", (new_project_name,)).fetchone() is not None:
+                return False
+            try:
+                connection.execute("UPDATE claims SET name = ? WHERE name = ?", (new_project_name, project))
+            except sqlite3.IntegrityError:
+                # claimed concurrently
+                return False
+        return True
+
+    def migrate(self, tinydb_path: Path) -> None:
+        """
+        Imports the claims of a TinyDB json file once.
+        """
+        if not tinydb_path.exists():
+            return
+
+        with self._pool.connection() as connection:
+            if connection.execute("SELECT 1 FROM meta WHERE key = 'migrated_from'").fetchone():
+                return
+
+            claims = TinyDB(tinydb_path).table("claims").all()
+            connection.executemany(
+                "INSERT OR IGNORE INTO claims (name, token, salt) VALUES (?, ?, ?)",
+                [(c["name"], c["token"], c["salt"]) for c in claims],
+            )
+            connection.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('migrated_from', ?)", (str(tinydb_path),))
+
+        logger.info(f"Migrated {len(claims)} claims from {tinydb_path}")
+
+
+class TokenCache:
+    """
+    Bounded cache of successfully verified tokens, so repeated
+    calls with the same token skip the key derivation.
+
+    Entries are keyed by the stored token hash as well, so a changed
+    claim never matches an old entry, and expire after `ttl` seconds.
+    Only a digest of the token is kept in memory.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str, bytes], float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(claim: Claim, token: str) -> tuple[str, str, bytes]:
+        return (claim.name, claim.token, hashlib.sha256(token.encode("utf-8")).digest())
+
+    def contains(self, claim: Claim, token: str) -> bool:
+        """
+        Returns True if the token was verified for this claim before.
+        """
+        key = self._key(claim, token)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None or expires < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return False
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def add(self, claim: Claim, token: str) -> None:
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[self._key(claim, token)] = time.monotonic() + self.ttl
+            self._entries.move_to_end(self._key(claim, token))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, project: str) -> None:
+        """
+        Drops all verified tokens of a project.
+        """
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == project]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+@cache
+def open_claim_store(backend: str, db_path: Path, tinydb_path: Path) -> ClaimStore:
+    """
+    Returns the shared claim store of the configured backend.
+
+    Args:
+        backend (str): "sqlite" or "tinydb"
+        db_path (pathlib.Path): path of the SQLite database
+        tinydb_path (pathlib.Path): path of the TinyDB json file
+    """
+    if backend == "tinydb":
+        return TinyDBClaimStore(tinydb_path)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown claims backend {backend}")
+
+    store = SqliteClaimStore(db_path)
+    store.migrate(tinydb_path)
+    return store
@@ -0,0 +1,47 @@
+"""
+docat database
+
+Connections to the SQLite databases of docat, in WAL mode, so multiple
+workers can read and write concurrently. Connections are shared between
+requests through a pool.
+"""
+
+import queue
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class ConnectionPool:
+    """
+    Pool of connections to an SQLite database, a new connection
+    is opened whenever all connections are in use.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connections: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Returns a connection of the pool in a transaction, which is committed when the block succeeds.
+        """
+        try:
+            connection = self._connections.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            self._connections.put(connection)
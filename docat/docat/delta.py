@@ -0,0 +1,209 @@
+"""
+docat delta uploads
+
+A version is described by a manifest of all its files. Files with
+content which is already stored in a base version are taken from there,
+so only new content needs to be uploaded.
+"""
+
+import errno
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+
+from docat.blobs import BlobStore, hash_file
+from docat.models import Manifest, ManifestFile, VersionSize
+from docat.utils import MANIFEST_FILE, METADATA_FILES
+
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# manifests of versions which were uploaded without one, by the folder of the
+# version with its inode and mtime, so both phases of a delta upload hash it once
+MAX_HASHED_VERSIONS = 16
+_hashed_versions: OrderedDict[tuple[str, int, int], dict[str, tuple[str, int]]] = OrderedDict()
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class DeltaError(ValueError):
+    """
+    Raised when a manifest or the uploaded files are invalid.
+    """
+
+
+def manifest_path(path: str) -> str:
+    """
+    Returns the normalized relative path of a manifest entry.
+
+    Raises:
+        DeltaError: if the path would leave the version folder or overwrite docat files
+    """
+    parts = PurePosixPath(path).parts
+    if not parts or PurePosixPath(path).is_absolute() or "\\" in path:
+        raise DeltaError(f"Invalid path {path}")
+    if any(part in (".", "..") for part in parts) or parts[-1] in METADATA_FILES or parts == (".hidden",):
+        raise DeltaError(f"Invalid path {path}")
+    return "/".join(parts)
+
+
+def validate_manifest(manifest: Manifest) -> dict[str, ManifestFile]:
+    """
+    Returns the files of a manifest by their normalized path.
+
+    Raises:
+        DeltaError: if the base, a path or hash is invalid or a path is listed twice
+    """
+    if manifest.base is not None and (manifest.base in ("", ".", "..") or "/" in manifest.base):
+        raise DeltaError(f"Invalid base version {manifest.base}")
+
+    files: dict[str, ManifestFile] = {}
+    for entry in manifest.files:
+        path = manifest_path(entry.path)
+        if not SHA256_PATTERN.fullmatch(entry.sha256) or entry.size < 0:
+            raise DeltaError(f"Invalid hash or size of {path}")
+        if path in files:
+            raise DeltaError(f"{path} is listed twice")
+        files[path] = entry
+    return files
+
+
+def hash_version(version_folder: Path) -> dict[str, tuple[str, int]]:
+    """
+    Returns the sha256 and size of all regular files of a version
+    by their relative path, without following symlinks.
+    """
+    files = {}
+    for root, _, names in os.walk(version_folder):
+        for name in names:
+            file_path = os.path.join(root, name)
+            if os.path.islink(file_path) or name in METADATA_FILES:
+                continue
+
+            path = Path(file_path).relative_to(version_folder).as_posix()
+            if path == ".hidden":
+                continue
+            files[path] = (hash_file(file_path), os.path.getsize(file_path))
+    return files
+
+
+def write_version_manifest(version_folder: Path, files: dict[str, tuple[str, int]]) -> None:
+    with (version_folder / MANIFEST_FILE).open("w") as f:
+        json.dump(files, f)
+
+
+def read_version_manifest(version_folder: Path) -> dict[str, tuple[str, int]]:
+    """
+    Returns the manifest of a version, which is stored with every upload.
+    Published versions are never written to, so versions uploaded before
+    are hashed instead, at most once as long as they are not replaced.
+    """
+    try:
+        with (version_folder / MANIFEST_FILE).open() as f:
+            return {path: (digest, size) for path, (digest, size) in json.load(f).items()}
+    except (OSError, ValueError, TypeError):
+        pass
+
+    stat = version_folder.stat()
+    key = (str(version_folder), stat.st_ino, stat.st_mtime_ns)
+    with _lock:
+        files = _hashed_versions.get(key)
+        if files is not None:
+            _hashed_versions.move_to_end(key)
+            return files
+
+    files = hash_version(version_folder)
+    with _lock:
+        _hashed_versions[key] = files
+        while len(_hashed_versions) > MAX_HASHED_VERSIONS:
+            _hashed_versions.popitem(last=False)
+    return files
+
+
+def find_missing(files: dict[str, ManifestFile], base_folder: Path | None) -> list[str]:
+    """
+    Returns the paths of all files whose content is not in the base version.
+    """
+    known = {digest for digest, _ in read_version_manifest(base_folder).values()} if base_folder else set()
+    return [path for path, entry in files.items() if entry.sha256 not in known]
+
+
+def assemble_version(
+    files: dict[str, ManifestFile], staging_path: Path, base_folder: Path | None, blob_store: BlobStore | None
+) -> VersionSize:
+    """
+    Completes the uploaded files in the staging folder with the
+    files of the manifest which were not uploaded and stores the manifest.
+
+    Args:
+        files (dict[str, ManifestFile]): the validated manifest
+        staging_path (pathlib.Path): the extracted upload
+        base_folder (pathlib.Path | None): the version providing files which were not uploaded
+        blob_store (BlobStore | None): the blob store, files of the base are linked from it instead of copied
+
+    Raises:
+        DeltaError: if an uploaded file does not match the manifest or content is missing
+    """
+    for root, _, names in os.walk(staging_path):
+        if any(os.path.islink(os.path.join(root, name)) for name in names):
+            raise DeltaError("Symlinks are not supported in delta uploads")
+
+    sizes = {}
+    for path, (digest, size) in hash_version(staging_path).items():
+        entry = files.get(path)
+        if entry is None:
+            raise DeltaError(f"{path} is not in the manifest")
+        if entry.sha256 != digest or entry.size != size:
+            raise DeltaError(f"{path} does not match the manifest")
+        sizes[path] = size
+
+    # the manifest of the base is read again, it might have been replaced since the missing files were requested
+    base_files = {digest: path for path, (digest, _) in read_version_manifest(base_folder).items()} if base_folder else {}
+    for path, entry in files.items():
+        if path in sizes:
+            continue
+
+        try:
+            sizes[path] = _restore_file(entry, staging_path / path, base_folder, base_files.get(entry.sha256), blob_store)
+        except (FileExistsError, NotADirectoryError, IsADirectoryError):
+            raise DeltaError(f"Invalid path {path}") from None
+
+    write_version_manifest(staging_path, {path: (entry.sha256, sizes[path]) for path, entry in files.items()})
+    return VersionSize(size=sum(sizes.values()), files=len(files))
+
+
+def _restore_file(entry: ManifestFile, target: Path, base_folder: Path | None, base_path: str | None, blob_store: BlobStore | None) -> int:
+    """
+    Links or copies a file of the base version, returns its size on disk.
+    """
+    if base_folder is None or base_path is None:
+        raise DeltaError(f"{entry.path} is missing")
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    linked = False
+    if blob_store is not None:
+        try:
+            os.link(blob_store.blob_path(entry.sha256), target)
+            linked = True
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            if e.errno != errno.EMLINK:
+                raise
+
+    if not linked:
+        try:
+            shutil.copyfile(base_folder / base_path, target)
+        except FileNotFoundError:
+            raise DeltaError(f"{entry.path} is missing") from None
+
+    # the size is taken from the restored file, not from the manifest sent by the client
+    size = target.stat().st_size
+    if size != entry.size:
+        raise DeltaError(f"{entry.path} does not match the manifest")
+    return size
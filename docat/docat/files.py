@@ -0,0 +1,278 @@
+"""
+docat file server
+
+Serves the upload folder when docat runs without nginx (DOCAT_SERVE_FILES).
+Compared to a plain StaticFiles mount, it serves the precompressed siblings
+of files, answers with strong ETags, so browsers revalidate files cheaply,
+and caches resolved paths, so tags are not resolved on every request.
+Versions can be uploaded again, so they are only cached forever when
+versions are declared immutable. Small, frequently requested files are
+served from memory.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from mimetypes import guess_type
+from pathlib import Path
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from docat.generation import SharedGeneration
+from docat.precompress import COMPRESSIBLE_SUFFIXES
+from docat.versions import LATEST
+
+# content codings of the precompressed siblings, by preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """
+    Returns the content codings of an Accept-Encoding header which are not refused with q=0.
+    """
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+def strong_etag(stat_result: os.stat_result, encoding: str | None) -> str:
+    """
+    Returns an ETag which changes with every upload, versions are published
+    by renaming a new folder, so their files always get a new inode.
+    """
+    etag = f"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+    return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+
+# resolved path, inode, mtime and size of a file
+FileKey = tuple[str, int, int, int]
+
+
+class FileCache:
+    """
+    LRU cache of the content of small files, limited to `max_bytes`.
+
+    Entries are keyed by the stat of the file as well, so a replaced
+    file never matches an old entry. Changes of the documentation
+    clear the cache, so replaced versions do not hold on to memory.
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int):
+        self.max_bytes = max_bytes
+        self.max_file_size = min(max_file_size, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries: OrderedDict[FileKey, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: FileKey) -> bytes | None:
+        with self._lock:
+            content = self._entries.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def put(self, key: FileKey, content: bytes) -> None:
+        if len(content) > self.max_file_size:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = content
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def load(self, key: FileKey) -> bytes:
+        """
+        Reads a file and caches its content, if the file still matches the key.
+        """
+        with open(key[0], "rb") as f:
+            stat_result = os.fstat(f.fileno())
+            content = f.read()
+        if (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size) == key[1:] and len(content) == stat_result.st_size:
+            self.put(key, content)
+        return content
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DocsFiles(StaticFiles):
+    """
+    StaticFiles serving the upload folder. Resolved paths, the precompressed
+    siblings of files and which folders are versions are cached until the
+    shared generation of the catalog changes, files are still stat'ed on
+    every request. Ranges, and zero-copy sending on servers supporting the
+    pathsend extension, are handled by FileResponse. Small files are sent
+    from the `file_cache`, if there is one. With `immutable_versions`,
+    files of versions other than "latest" are cached by browsers for a year.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        generation: SharedGeneration,
+        max_entries: int = 4096,
+        file_cache: FileCache | None = None,
+        immutable_versions: bool = False,
+    ):
+        super().__init__(directory=directory, html=True)
+        self.generation = generation
+        self.max_entries = max_entries
+        self.file_cache = file_cache
+        self.immutable_versions = immutable_versions
+        self._lock = threading.Lock()
+        self._generation = -1
+        self._paths: dict[str, str] = {}
+        self._encodings: dict[str, tuple[tuple[str, str], ...]] = {}
+        self._versions: dict[tuple[str, str], bool] = {}
+
+    def _check_generation(self) -> None:
+        generation = self.generation.value()
+        if generation != self._generation:
+            with self._lock:
+                self._generation = generation
+                self._paths = {}
+                self._encodings = {}
+                self._versions = {}
+                if self.file_cache is not None:
+                    self.file_cache.clear()
+
+    def _remember(self, cache: dict, key, value) -> None:
+        if len(cache) < self.max_entries:
+            cache[key] = value
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        self._check_generation()
+        full_path = self._paths.get(path)
+        if full_path is not None:
+            try:
+                return full_path, os.stat(full_path)
+            except (FileNotFoundError, NotADirectoryError):
+                self._paths.pop(path, None)
+
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None:
+            self._remember(self._paths, path, full_path)
+        return full_path, stat_result
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if (
+            self.file_cache is None
+            or not isinstance(response, FileResponse)
+            or response.stat_result is None
+            or response.stat_result.st_size > self.file_cache.max_file_size
+            or scope["method"] != "GET"
+            or "range" in Headers(scope=scope)
+        ):
+            return response
+
+        stat_result = response.stat_result
+        key = (os.fspath(response.path), stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size)
+        content = self.file_cache.get(key)
+        if content is None:
+            content = await anyio.to_thread.run_sync(self.file_cache.load, key)
+
+        # the length is set from the content, the file might have changed since it was stat'ed
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+        return Response(content, status_code=response.status_code, headers=headers)
+
+    def encodings(self, full_path: str) -> tuple[tuple[str, str], ...]:
+        """
+        Returns the content codings and suffixes of the precompressed siblings of a file.
+        """
+        encodings = self._encodings.get(full_path)
+        if encodings is None:
+            compressible = os.path.splitext(full_path)[1].lower() in COMPRESSIBLE_SUFFIXES
+            encodings = tuple((coding, suffix) for coding, suffix in ENCODINGS if compressible and os.path.isfile(full_path + suffix))
+            self._remember(self._encodings, full_path, encodings)
+        return encodings
+
+    def is_version(self, project: str, version: str) -> bool:
+        """
+        Returns True if a folder of a project is a version and not a tag or a file.
+        """
+        key = (project, version)
+        is_version = self._versions.get(key)
+        if is_version is None:
+            version_path = os.path.join(self.directory or "", project, version)
+            is_version = os.path.isdir(version_path) and not os.path.islink(version_path)
+            self._remember(self._versions, key, is_version)
+        return is_version
+
+    def cache_control(self, path: str) -> str:
+        if not self.immutable_versions:
+            return REVALIDATE
+
+        project, _, rest = path.partition(os.sep)
+        version = rest.split(os.sep, 1)[0]
+        if project not in ("", ".", "..") and version not in ("", LATEST) and self.is_version(project, version):
+            return IMMUTABLE
+        return REVALIDATE
+
+    def file_response(
+        self,
+        full_path: os.PathLike | str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        full_path = os.fspath(full_path)
+        request_headers = Headers(scope=scope)
+        headers = {"Cache-Control": self.cache_control(self.get_path(scope))}
+
+        served_path, encoding = full_path, None
+        encodings = self.encodings(full_path)
+        if encodings:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for coding, suffix in encodings:
+                if coding not in accepted:
+                    continue
+                try:
+                    stat_result = os.stat(full_path + suffix)
+                except FileNotFoundError:
+                    continue
+                served_path, encoding = full_path + suffix, coding
+                headers["Content-Encoding"] = coding
+                break
+
+        headers["ETag"] = strong_etag(stat_result, encoding)
+        response = FileResponse(
+            served_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=guess_type(full_path)[0] or "application/octet-stream",
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,62 @@
+"""
+docat generation
+
+Counter in a small memory mapped file, shared by all workers on a host.
+Every change of the documentation increments it, so in-memory caches
+of any worker notice the change by reading eight bytes of shared memory,
+without a system call per request.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+from functools import cache
+from pathlib import Path
+
+COUNTER = struct.Struct("<Q")
+
+
+class SharedGeneration:
+    """
+    Shared counter of changes. Reading it is only a memory access,
+    increments are serialized between workers with a file lock.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < COUNTER.size:
+                os.ftruncate(self._fd, COUNTER.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, COUNTER.size)
+
+    def value(self) -> int:
+        return COUNTER.unpack_from(self._map)[0]
+
+    def increment(self) -> int:
+        """
+        Increments the counter for all workers.
+
+        Returns:
+            int: the new value
+        """
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            value = self.value() + 1
+            COUNTER.pack_into(self._map, 0, value)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return value
+
+
+@cache
+def open_generation(path: Path) -> SharedGeneration:
+    """
+    Returns the counter stored at `path`, mapped once per worker.
+    """
+    return SharedGeneration(path)
@@ -0,0 +1,150 @@
+"""
+docat nginx locations
+
+Every project gets its own nginx location, which lets browsers cache
+tags only briefly, as tags move to new versions. Versions can be uploaded
+again, so they are only cached for a long time when versions are declared
+immutable. The shipped nginx config includes the locations, nginx is
+reloaded after they changed, once for a burst of uploads.
+"""
+
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from docat.versions import LATEST
+
+# names with other characters would need quoting in the config,
+# they are served by the generic /doc location instead
+SAFE_NAME = re.compile(r"[\w.+-]+")
+
+VERSION_EXPIRES = "max"
+TAG_EXPIRES = "1m"
+
+RELOAD_COMMAND = ("nginx", "-s", "reload")
+
+logger = logging.getLogger(__name__)
+
+
+def locations_file(locations_path: Path, project: str) -> Path:
+    return locations_path / f"{project}-doc.conf"
+
+
+def is_safe_name(name: str) -> bool:
+    return SAFE_NAME.fullmatch(name) is not None and name not in (".", "..")
+
+
+def render_locations(project: str, entry: dict, storage_path: Path, immutable_versions: bool = False) -> str:
+    """
+    Returns the nginx location of a project with nested locations for its versions and tags.
+
+    Args:
+        project (str): name of the project, has to be a safe name
+        entry (dict): the catalog entry of the project
+        storage_path (pathlib.Path): the folder containing the upload folder
+        immutable_versions (bool): versions other than "latest" are never uploaded again
+    """
+    lines = [
+        "# generated by docat, changes are overwritten",
+        f"location /doc/{project}/ {{",
+        f"    root {storage_path};",
+        "    absolute_redirect off;",
+        "    gzip_static on;",
+        "    gzip_vary on;",
+        "    open_file_cache max=1000 inactive=60s;",
+        "    open_file_cache_valid 30s;",
+        f"    expires {TAG_EXPIRES};",
+    ]
+    for name in sorted([*entry["versions"], *entry["tags"]]):
+        if is_safe_name(name):
+            expires = VERSION_EXPIRES if immutable_versions and name in entry["versions"] and name != LATEST else TAG_EXPIRES
+            lines += ["", f"    location /doc/{project}/{name}/ {{", f"        expires {expires};", "    }"]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def write_locations(locations_path: Path, project: str, entry: dict | None, storage_path: Path, immutable_versions: bool = False) -> bool:
+    """
+    Writes the location of a project, or removes it if the project does not exist (None).
+
+    Returns:
+        bool: True if the location changed and nginx needs to be reloaded
+    """
+    path = locations_file(locations_path, project)
+    if entry is None or not is_safe_name(project):
+        if not path.exists():
+            return False
+        path.unlink(missing_ok=True)
+        return True
+
+    content = render_locations(project, entry, storage_path, immutable_versions)
+    try:
+        if path.read_text() == content:
+            return False
+    except FileNotFoundError:
+        pass
+
+    locations_path.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=locations_path, prefix=".docat-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return True
+
+
+class Reloader:
+    """
+    Background thread reloading nginx gracefully once no
+    reload was requested for `delay` seconds.
+    """
+
+    def __init__(self, delay: float, command: tuple[str, ...] = RELOAD_COMMAND):
+        self.delay = delay
+        self.command = command
+        self._requested = 0.0
+        self._pending = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="docat-nginx-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pending.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def request(self) -> None:
+        self._requested = time.monotonic()
+        self._pending.set()
+
+    def _run(self) -> None:
+        while True:
+            self._pending.wait()
+            # wait for the end of the burst
+            while (remaining := self._requested + self.delay - time.monotonic()) > 0:
+                if self._stop.wait(remaining):
+                    return
+            if self._stop.is_set():
+                return
+
+            # locations written before this point are picked up by the reload
+            self._pending.clear()
+            try:
+                subprocess.run(self.command, check=True, capture_output=True, timeout=30)
+                logger.info("Reloaded nginx")
+            except (OSError, subprocess.SubprocessError):
+                logger.exception("Failed to reload nginx")
@@ -10,6 +10,23 @@ class TokenStatus:
     reason: str
 
 
+@dataclass(frozen=True)
+class Claim:
+    name: str
+    token: str
+    salt: str
+
+
+@dataclass(frozen=True)
+class VersionSize:
+    size: int
+    files: int
+    # bytes of files linked to the blob store
+    linked: int = 0
+    # bytes of the compressed siblings, which are not part of size and files
+    sidecars: int = 0
+
+
 class ApiResponse(BaseModel):
     message: str
 
@@ -34,12 +51,96 @@ class Project(BaseModel):
 
 class Projects(BaseModel):
     projects: list[Project]
+    next_cursor: str | None = None
 
 
 class Stats(BaseModel):
     n_projects: int
     n_versions: int
     storage: str
+    sidecar_storage: str
+    physical_storage: str
+
+
+class Metrics(BaseModel):
+    trash_queue_depth: int
+    worker_queue_depth: int
+    token_cache_hits: int
+    token_cache_misses: int
+    file_cache_hits: int
+    file_cache_misses: int
+    file_cache_size: int
+
+
+class ManifestFile(BaseModel):
+    path: str
+    sha256: str
+    size: int
+
+
+class Manifest(BaseModel):
+    base: str | None = None
+    files: list[ManifestFile]
+
+
+class MissingFiles(BaseModel):
+    missing: list[str]
+
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    # sha256 of the whole archive, verified before it is extracted
+    sha256: str | None = None
+
+
+class UploadSession(BaseModel):
+    id: str
+    project: str
+    version: str
+    filename: str
+    size: int
+    offset: int
+    sha256: str | None = None
+
+
+class UploadOffset(BaseModel):
+    offset: int
+
+
+class BulkUpload(BaseModel):
+    project: str
+    version: str
+    # folder of the version in the archive, defaults to {project}/{version}
+    path: str | None = None
+
+
+class BulkManifest(BaseModel):
+    uploads: list[BulkUpload]
+
+
+class BulkUploadResult(BaseModel):
+    project: str
+    version: str
+    status: int
+    message: str
+
+
+class BulkUploadResults(BaseModel):
+    results: list[BulkUploadResult]
+
+
+class SearchResult(BaseModel):
+    project: str
+    version: str
+    path: str
+    title: str
+    snippet: str
+
+
+class SearchResults(BaseModel):
+    results: list[SearchResult]
+    next_offset: int | None = None
 
 
 class ProjectDetail(BaseModel):
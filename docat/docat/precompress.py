@@ -0,0 +1,106 @@
+"""
+docat precompression
+
+Compressible files get a gzip (and brotli, if it is installed)
+compressed sibling when they are uploaded, which nginx serves
+with gzip_static instead of compressing them on every request.
+The written siblings are listed in a file of the version, so they
+are told apart from compressed files which were part of the upload.
+"""
+
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import ModuleType
+
+# the siblings are named like the file with one of these suffixes
+SIDECAR_SUFFIXES = (".gz", ".br")
+
+# relative paths of the written siblings
+SIDECARS_FILE = ".sidecars"
+
+COMPRESSIBLE_SUFFIXES = frozenset({".css", ".csv", ".html", ".htm", ".js", ".json", ".map", ".md", ".mjs", ".svg", ".txt", ".xml"})
+
+logger = logging.getLogger(__name__)
+
+
+def read_sidecars(version_folder: Path | str) -> frozenset[str]:
+    """
+    Returns the relative paths of the siblings which were written when the version was uploaded.
+    """
+    try:
+        with open(os.path.join(version_folder, SIDECARS_FILE)) as f:
+            return frozenset(json.load(f))
+    except (OSError, ValueError, TypeError):
+        return frozenset()
+
+
+def _brotli() -> ModuleType | None:
+    try:
+        import brotli  # noqa: PLC0415
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_file(path: str, brotli: ModuleType | None) -> list[tuple[str, int]]:
+    """
+    Writes the compressed siblings of a file, if they are smaller than the file.
+    Siblings which were uploaded with the file are kept.
+
+    Returns:
+        list[tuple[str, int]]: the paths and sizes of the written siblings
+    """
+    compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append((".br", brotli.compress))
+    compressors = [(suffix, compress) for suffix, compress in compressors if not os.path.lexists(path + suffix)]
+    if not compressors:
+        return []
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    written = []
+    for suffix, compress in compressors:
+        content = compress(data)
+        if len(content) >= len(data):
+            continue
+        with open(path + suffix, "wb") as f:
+            f.write(content)
+        written.append((path + suffix, len(content)))
+    return written
+
+
+def precompress_tree(path: Path, min_size: int, workers: int = 1) -> int:
+    """
+    Compresses all compressible files of an extracted version which
+    have at least `min_size` bytes. zlib and brotli release the GIL,
+    so the files are compressed by `workers` threads in parallel.
+
+    Returns:
+        int: the number of bytes of the written siblings
+    """
+    candidates = []
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_SUFFIXES or os.path.islink(file_path):
+                continue
+            if os.path.getsize(file_path) >= min_size:
+                candidates.append(file_path)
+
+    brotli = _brotli()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="docat-compress") as executor:
+        written_siblings = executor.map(lambda file_path: compress_file(file_path, brotli), candidates)
+        siblings = [sibling for written in written_siblings for sibling in written]
+
+    with open(os.path.join(path, SIDECARS_FILE), "w") as f:
+        json.dump(sorted(Path(sibling).relative_to(path).as_posix() for sibling, _ in siblings), f)
+
+    written = sum(size for _, size in siblings)
+    logger.debug(f"Compressed {len(candidates)} files into {written} bytes")
+    return written
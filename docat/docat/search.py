@@ -0,0 +1,188 @@
+"""
+docat search
+
+Full text index of the uploaded html pages in an SQLite FTS5 table.
+Every version is indexed when it is uploaded, searches only match
+the latest version of each project.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+from functools import cache
+from html.parser import HTMLParser
+from pathlib import Path
+
+from docat.database import ConnectionPool
+from docat.models import SearchResult, SearchResults
+
+SEARCH_DB_PATH = "search.db"
+
+HTML_SUFFIXES = (".html", ".htm")
+
+# content of these elements is not part of the page text
+SKIPPED_TAGS = frozenset({"script", "style", "noscript", "template", "svg"})
+
+logger = logging.getLogger(__name__)
+
+
+class TextExtractor(HTMLParser):
+    """
+    Collects the title and the visible text of an html page.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: list[str] = []
+        self.text: list[str] = []
+        self._skipped = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, _attrs):
+        if tag in SKIPPED_TAGS:
+            self._skipped += 1
+        elif tag == "title":
+            self._in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skipped = max(0, self._skipped - 1)
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title.append(data)
+        elif not self._skipped:
+            self.text.append(data)
+
+
+def extract_text(html: str) -> tuple[str, str]:
+    """
+    Returns the title and the text of an html page, with collapsed whitespace.
+    """
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return " ".join("".join(parser.title).split()), " ".join(" ".join(parser.text).split())
+
+
+def match_query(query: str) -> str | None:
+    """
+    Turns user input into an FTS5 query matching all words, the last one as prefix.
+    Returns None if the input contains no words.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+class SearchIndex:
+    """
+    Search index in an SQLite database, so multiple
+    workers can search and index concurrently.
+
+    The text of the pages is in an FTS5 table, their project, version
+    and path in a regular table with the same rowid, so versions are
+    removed and projects renamed without scanning the full text index.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._pool = ConnectionPool(db_path)
+        with self._pool.connection() as connection:
+            connection.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(title, body, tokenize = 'porter unicode61')")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id INTEGER PRIMARY KEY, project TEXT NOT NULL, version TEXT NOT NULL, path TEXT NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS documents_version ON documents (project, version)")
+            connection.execute("CREATE TABLE IF NOT EXISTS latest (project TEXT PRIMARY KEY, version TEXT NOT NULL)")
+
+    def index_version(self, project: str, version: str, version_folder: Path) -> int:
+        """
+        Replaces the indexed pages of a version with the html pages in its folder.
+
+        Returns:
+            int: the number of indexed pages
+        """
+        rows = []
+        for root, _, files in os.walk(version_folder):
+            for name in files:
+                file_path = os.path.join(root, name)
+                if not name.lower().endswith(HTML_SUFFIXES) or os.path.islink(file_path):
+                    continue
+
+                with open(file_path, encoding="utf-8", errors="replace") as f:
+                    title, body = extract_text(f.read())
+                rows.append((Path(file_path).relative_to(version_folder).as_posix(), title, body))
+
+        with self._pool.connection() as connection:
+            self._remove(connection, project, version)
+            for path, title, body in rows:
+                cursor = connection.execute("INSERT INTO documents (project, version, path) VALUES (?, ?, ?)", (project, version, path))
+                connection.execute("INSERT INTO pages (rowid, title, body) VALUES (?, ?, ?)", (cursor.lastrowid, title, body))
+
+        logger.debug(f"Indexed {len(rows)} pages of {project}/{version}")
+        return len(rows)
+
+    def remove(self, project: str, version: str | None = None) -> None:
+        """
+        Removes the pages of a version, or of all versions of a project.
+        """
+        with self._pool.connection() as connection:
+            self._remove(connection, project, version)
+            if version is None:
+                connection.execute("DELETE FROM latest WHERE project = ?", (project,))
+
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, project: str, version: str | None) -> None:
+        condition, params = ("project = ?", (project,)) if version is None else ("project = ? AND version = ?", (project, version))
+        connection.execute(f"DELETE FROM pages WHERE rowid IN (SELECT id FROM documents WHERE {condition})", params)
+        connection.execute(f"DELETE FROM documents WHERE {condition}", params)
+
+    def rename_project(self, project: str, new_project_name: str) -> None:
+        with self._pool.connection() as connection:
+            connection.execute("UPDATE documents SET project = ? WHERE project = ?", (new_project_name, project))
+            connection.execute("UPDATE latest SET project = ? WHERE project = ?", (new_project_name, project))
+
+    def set_latest(self, project: str, version: str | None) -> None:
+        """
+        Sets the version of a project which is searched, None excludes the project.
+        """
+        with self._pool.connection() as connection:
+            if version is None:
+                connection.execute("DELETE FROM latest WHERE project = ?", (project,))
+            else:
+                connection.execute("INSERT OR REPLACE INTO latest (project, version) VALUES (?, ?)", (project, version))
+
+    def search(self, query: str, limit: int, offset: int = 0) -> SearchResults:
+        """
+        Returns the best matching pages of the latest versions, ranked by bm25
+        with matches in the title weighted higher than matches in the text.
+        """
+        match = match_query(query)
+        if match is None:
+            return SearchResults(results=[])
+
+        with self._pool.connection() as connection:
+            rows = connection.execute(
+                "SELECT documents.project, documents.version, documents.path, pages.title, snippet(pages, 1, '', '', '…', 16) "
+                "FROM pages JOIN documents ON documents.id = pages.rowid "
+                "JOIN latest ON latest.project = documents.project AND latest.version = documents.version "
+                "WHERE pages MATCH ? ORDER BY bm25(pages, 10.0, 1.0) LIMIT ? OFFSET ?",
+                (match, limit + 1, offset),
+            ).fetchall()
+
+        results = [SearchResult(project=row[0], version=row[1], path=row[2], title=row[3], snippet=row[4]) for row in rows[:limit]]
+        return SearchResults(results=results, next_offset=offset + limit if len(rows) > limit else None)
+
+
+@cache
+def open_search_index(db_path: Path) -> SearchIndex:
+    """
+    Returns the shared search index.
+    """
+    return SearchIndex(db_path)
@@ -0,0 +1,224 @@
+"""
+docat upload sessions
+
+Large archives are uploaded in chunks, each one in its own request,
+so an interrupted upload resumes at the last received byte instead
+of starting over. The chunks are streamed straight into a file in the sessions
+folder, which is extracted like a regular upload once it is complete.
+Sessions without a chunk for a while are removed by the reaper.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+
+from docat.models import UploadSession
+from docat.trash import Trash
+
+SESSIONS_FOLDER = "sessions"
+
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class SessionError(ValueError):
+    """
+    Raised when a chunk does not fit the upload session.
+    """
+
+
+class OffsetMismatchError(SessionError):
+    """
+    Raised when a chunk does not start at the end of the received data.
+    """
+
+    def __init__(self, offset: int):
+        super().__init__(f"Chunk has to start at byte {offset}")
+        self.offset = offset
+
+
+def parse_content_range(content_range: str) -> tuple[int, int, int]:
+    """
+    Returns the first and last byte and the total size of a Content-Range header.
+
+    Raises:
+        SessionError: if the header is invalid
+    """
+    match = CONTENT_RANGE_PATTERN.fullmatch(content_range.strip())
+    if match is None:
+        raise SessionError(f"Invalid Content-Range {content_range}")
+    start, end, total = (int(group) for group in match.groups())
+    if end < start or end >= total:
+        raise SessionError(f"Invalid Content-Range {content_range}")
+    return start, end, total
+
+
+class UploadSessions:
+    """
+    Upload sessions in a folder, the metadata of a session in `<id>.json`,
+    the received data in `<id>.part`. The size of the data is the offset
+    the upload continues at, so it survives restarts of docat. Chunks of
+    a session are written under a file lock, so workers never interleave.
+    """
+
+    def __init__(self, sessions_path: Path, ttl: float):
+        self.sessions_path = sessions_path
+        self.ttl = ttl
+
+    def _metadata_path(self, session_id: str) -> Path:
+        return self.sessions_path / f"{session_id}.json"
+
+    def data_path(self, session_id: str) -> Path:
+        return self.sessions_path / f"{session_id}.part"
+
+    def create(self, project: str, version: str, filename: str, size: int, sha256: str | None) -> UploadSession:
+        self.sessions_path.mkdir(parents=True, exist_ok=True)
+        session_id = secrets.token_hex(16)
+        self.data_path(session_id).touch()
+        metadata = {"project": project, "version": version, "filename": filename, "size": size, "sha256": sha256}
+        self._metadata_path(session_id).write_text(json.dumps(metadata))
+        return UploadSession(id=session_id, project=project, version=version, filename=filename, size=size, offset=0)
+
+    def get(self, session_id: str) -> UploadSession | None:
+        """
+        Returns a session with the number of received bytes, None if it does not exist.
+        """
+        if not SESSION_ID_PATTERN.fullmatch(session_id):
+            return None
+        try:
+            metadata = json.loads(self._metadata_path(session_id).read_text())
+            offset = self.data_path(session_id).stat().st_size
+        except (FileNotFoundError, ValueError):
+            return None
+        return UploadSession(
+            id=session_id,
+            project=metadata["project"],
+            version=metadata["version"],
+            filename=metadata["filename"],
+            size=metadata["size"],
+            offset=offset,
+            sha256=metadata["sha256"],
+        )
+
+    @contextmanager
+    def open_chunk(self, session: UploadSession, start: int, length: int) -> Iterator["ChunkWriter"]:
+        """
+        Locks the received data of a session to append a chunk to it. The
+        written part of the chunk is removed again if the block fails.
+
+        Args:
+            session (UploadSession): the session
+            start (int): the offset of the chunk in the archive
+            length (int): the number of bytes of the chunk
+
+        Raises:
+            SessionError: if the chunk exceeds the archive
+            OffsetMismatchError: if the chunk does not start at the end of the received data,
+                or another chunk of the session is being written
+        """
+        if start + length > session.size:
+            raise SessionError(f"Chunk exceeds the size of {session.size} bytes")
+
+        with self.data_path(session.id).open("r+b") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise OffsetMismatchError(os.fstat(f.fileno()).st_size) from None
+            offset = os.fstat(f.fileno()).st_size
+            if start != offset:
+                raise OffsetMismatchError(offset)
+
+            f.seek(offset)
+            writer = ChunkWriter(f, start, length)
+            try:
+                yield writer
+            except BaseException:
+                writer.abort()
+                raise
+
+    def remove(self, session_id: str, trash: Trash) -> None:
+        for path in (self._metadata_path(session_id), self.data_path(session_id)):
+            if path.exists():
+                trash.put(path)
+
+    def collect(self, trash: Trash) -> int:
+        """
+        Removes sessions which did not receive a chunk for `ttl` seconds.
+
+        Returns:
+            int: the number of removed sessions
+        """
+        if not self.sessions_path.exists():
+            return 0
+
+        removed = 0
+        expired = time.time() - self.ttl
+        for metadata_path in self.sessions_path.glob("*.json"):
+            session_id = metadata_path.stem
+            try:
+                last_activity = max(metadata_path.stat().st_mtime, self.data_path(session_id).stat().st_mtime)
+            except FileNotFoundError:
+                last_activity = 0
+            if last_activity < expired:
+                self.remove(session_id, trash)
+                removed += 1
+        return removed
+
+
+class ChunkWriter:
+    """
+    Writes a chunk to the end of the received data of a session and hashes it while it is written.
+    """
+
+    def __init__(self, file: BinaryIO, start: int, length: int):
+        self.file = file
+        self.start = start
+        self.length = length
+        self.received = 0
+        self._digest = hashlib.sha256()
+
+    def write(self, data: bytes) -> None:
+        """
+        Raises:
+            SessionError: if the data exceeds the chunk
+        """
+        if self.received + len(data) > self.length:
+            raise SessionError(f"Body exceeds the chunk of {self.length} bytes")
+        self.file.write(data)
+        self._digest.update(data)
+        self.received += len(data)
+
+    def finish(self, sha256: str | None) -> int:
+        """
+        Completes the chunk and writes it to disk.
+
+        Args:
+            sha256 (str | None): the sha256 of the chunk
+
+        Returns:
+            int: the number of received bytes of the session
+
+        Raises:
+            SessionError: if the chunk is incomplete or does not match its checksum
+        """
+        if self.received != self.length:
+            raise SessionError(f"Body of {self.received} bytes does not match the chunk of {self.length} bytes")
+        if sha256 is not None and self._digest.hexdigest() != sha256.lower():
+            raise SessionError("Chunk does not match its checksum")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.start + self.received
+
+    def abort(self) -> None:
+        """
+        Removes the written part of the chunk.
+        """
+        self.file.truncate(self.start)
@@ -0,0 +1,190 @@
+"""
+docat trash
+
+Removed documentation is moved into the trash folder, which is
+emptied by a background reaper, so requests never wait for large
+trees to be deleted. The reaper trashes staging folders which were
+left behind by uploads that never finished as well.
+"""
+
+import fcntl
+import logging
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from docat.blobs import BlobStore
+
+if TYPE_CHECKING:
+    from docat.sessions import UploadSessions
+
+TRASH_FOLDER = "trash"
+
+logger = logging.getLogger(__name__)
+
+
+class Trash:
+    """
+    Folder of trees waiting to be removed.
+    It has to be on the same filesystem as the trees put into it.
+    """
+
+    def __init__(self, trash_path: Path):
+        self.trash_path = trash_path
+
+    def put(self, path: Path) -> None:
+        """
+        Moves a tree into the trash with a single rename.
+        """
+        self.trash_path.mkdir(parents=True, exist_ok=True)
+        os.replace(path, self.trash_path / secrets.token_hex(16))
+
+    def collect(self, folder: Path, max_age: float) -> int:
+        """
+        Moves the entries of a folder which did not change for `max_age` seconds into the trash.
+
+        Returns:
+            int: the number of trashed entries
+        """
+        if not folder.exists():
+            return 0
+
+        collected = 0
+        expired = time.time() - max_age
+        with os.scandir(folder) as it:
+            entries = list(it)
+        for entry in entries:
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime >= expired:
+                    continue
+                self.put(Path(entry.path))
+            except FileNotFoundError:
+                # published or collected by another worker in the meantime
+                continue
+            collected += 1
+        return collected
+
+    def depth(self) -> int:
+        """
+        Returns the number of trees waiting to be removed.
+        """
+        if not self.trash_path.exists():
+            return 0
+
+        with os.scandir(self.trash_path) as it:
+            return sum(1 for entry in it if not entry.name.startswith("."))
+
+    def empty(self, rate: int, stop: threading.Event) -> int:
+        """
+        Removes all trees in the trash, removing at most `rate` files
+        per second (0 for no limit). Only one worker empties the trash
+        at a time, returns early when `stop` is set.
+
+        Returns:
+            int: the number of removed trees
+        """
+        if not self.trash_path.exists():
+            return 0
+
+        removed = 0
+        with (self.trash_path / ".lock").open("a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # another worker is already emptying the trash
+                return 0
+
+            for entry in sorted(self.trash_path.iterdir()):
+                if entry.name.startswith("."):
+                    continue
+                if not remove_tree(entry, rate, stop):
+                    break
+                removed += 1
+        return removed
+
+
+def remove_tree(path: Path, rate: int, stop: threading.Event) -> bool:
+    """
+    Removes a tree bottom up, throttled to `rate` files per second.
+
+    Returns False if the removal was stopped early.
+    """
+    if not path.is_dir() or path.is_symlink():
+        path.unlink(missing_ok=True)
+        return True
+
+    batch = max(1, rate // 10)
+    removed = 0
+    start = time.monotonic()
+    for root, dirs, files in os.walk(path, topdown=False):
+        for name in files:
+            os.unlink(os.path.join(root, name))
+            removed += 1
+            if rate and removed % batch == 0:
+                ahead = removed / rate - (time.monotonic() - start)
+                if ahead > 0 and stop.wait(ahead):
+                    return False
+        for name in dirs:
+            # symlinks to directories are listed as directories
+            dir_path = os.path.join(root, name)
+            if os.path.islink(dir_path):
+                os.unlink(dir_path)
+            else:
+                os.rmdir(dir_path)
+    os.rmdir(path)
+    return True
+
+
+class Reaper:
+    """
+    Background thread emptying the trash and collecting unused
+    blobs afterwards, as well as abandoned upload sessions and
+    staging folders older than `staging_ttl` seconds, starting
+    right away, so leftovers of a crash are removed on startup.
+    """
+
+    def __init__(
+        self,
+        trash: Trash,
+        rate: int,
+        interval: float = 1.0,
+        blob_store: BlobStore | None = None,
+        sessions: "UploadSessions | None" = None,
+        staging_path: Path | None = None,
+        staging_ttl: float = 86400,
+    ):
+        self.trash = trash
+        self.blob_store = blob_store
+        self.sessions = sessions
+        self.staging_path = staging_path
+        self.staging_ttl = staging_ttl
+        self.rate = rate
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="docat-reaper", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.staging_path is not None and (collected := self.trash.collect(self.staging_path, self.staging_ttl)):
+                    logger.info(f"Removed {collected} abandoned staging folders")
+                if self.sessions is not None:
+                    self.sessions.collect(self.trash)
+                if self.trash.empty(self.rate, self._stop) and self.blob_store is not None:
+                    # removed versions might have held the last link to a blob
+                    self.blob_store.collect()
+            except Exception:
+                logger.exception("Failed to empty the trash")
+
+            if self._stop.wait(self.interval):
+                return
@@ -2,20 +2,55 @@
 docat utilities
 """
 
+import ctypes
+import dataclasses
+import errno
 import hashlib
+import json
+import logging
 import os
 import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
 from zipfile import ZipFile, ZipInfo
 
-from docat.models import Project, ProjectDetail, Projects, ProjectVersion, Stats
+from docat.models import VersionSize
+from docat.precompress import SIDECARS_FILE, read_sidecars
+from docat.versions import version_key
+
+if TYPE_CHECKING:
+    from docat.trash import Trash
 
 NGINX_CONFIG_PATH = Path("/etc/nginx/locations.d")
 UPLOAD_FOLDER = "doc"
+STAGING_FOLDER = "staging"
+SIZE_FILE = ".size"
+MANIFEST_FILE = ".manifest"
 DB_PATH = "db.json"
 
+# files docat stores in a version, which are not part of the documentation
+METADATA_FILES = (SIZE_FILE, MANIFEST_FILE, SIDECARS_FILE)
+
+# compression of the supported tar archives by suffix
+TAR_COMPRESSIONS = {
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+    ".tar.zst": "zst",
+    ".tzst": "zst",
+}
+
+# archives with fewer members are always extracted by a single thread
+PARALLEL_EXTRACT_MIN_MEMBERS = 64
+
+logger = logging.getLogger(__name__)
+
 
 def is_dir(self):
     """Return True if this archive member is a directory."""
@@ -54,31 +89,283 @@ def create_symlink(source, destination):
         return False
 
 
-def extract_archive(target_file, destination):
+class PositionalReader:
+    """
+    Read-only file object on a shared file descriptor, reading with
+    pread, so every thread can have its own position in the file.
+    """
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.size = os.fstat(fd).st_size
+        self.position = 0
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0:
+            n = self.size - self.position
+        data = os.pread(self.fd, n, self.position)
+        self.position += len(data)
+        return data
+
+
+def member_path(member: ZipInfo, destination: Path) -> Path:
+    """
+    Returns the path a member is extracted to, sanitized
+    the same way as ZipFile.extract does.
+    """
+    arcname = member.filename.replace("/", os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [x for x in arcname.split(os.path.sep) if x not in ("", os.path.curdir, os.path.pardir)]
+    return destination.joinpath(*parts)
+
+
+def _extract_members(fd: int, members: list[ZipInfo], destination: Path) -> None:
+    with ZipFile(PositionalReader(fd), "r") as zipf:  # type: ignore[arg-type]
+        for member in members:
+            with zipf.open(member) as source, member_path(member, destination).open("wb") as target:
+                shutil.copyfileobj(source, target)
+
+
+def extract_zip_parallel(zipf: ZipFile, fd: int, destination: Path, workers: int) -> None:
+    """
+    Extracts the members of a zip file with multiple threads,
+    each reading the archive through its own ZipFile.
+
+    Args:
+        zipf (ZipFile): the opened archive
+        fd (int): file descriptor of the archive
+        destination (pathlib.Path): destination of the extracted archive
+        workers (int): number of threads
+    """
+    # a later member with the same path replaces an earlier one, like in ZipFile.extractall,
+    # so every path is written by a single thread
+    members: dict[Path, ZipInfo] = {}
+    directories = {destination}
+    for member in zipf.infolist():
+        target = member_path(member, destination)
+        if member.is_dir():
+            directories.add(target)
+        elif target != destination:
+            directories.add(target.parent)
+            members.pop(target, None)
+            members[target] = member
+    files = list(members.values())
+
+    # create all directories up front, so the threads never race on them
+    for directory in sorted(directories):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    # deal the largest members out first, to balance the work
+    files.sort(key=lambda m: m.file_size, reverse=True)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(_extract_members, fd, files[i::workers], destination) for i in range(workers)]:
+            future.result()
+
+
+def _fileno(archive: BinaryIO) -> int | None:
+    # fileno() writes an in-memory upload to disk, extracting it sequentially is cheaper
+    if isinstance(archive, tempfile.SpooledTemporaryFile) and not getattr(archive, "_rolled", True):
+        return None
+    try:
+        return archive.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def tar_compression(filename: str) -> str | None:
+    """
+    Returns the compression of a tar archive, or None
+    if the file is not a tar archive.
+    """
+    for suffix, compression in TAR_COMPRESSIONS.items():
+        if filename.lower().endswith(suffix):
+            return compression
+    return None
+
+
+def open_tar_stream(archive: BinaryIO, compression: str) -> tarfile.TarFile:
+    """
+    Opens a tar archive for reading it front to back, without seeking.
+    """
+    if compression == "zst" and "zst" not in tarfile.TarFile.OPEN_METH:
+        # tarfile supports zstd since python 3.14
+        try:
+            import zstandard  # noqa: PLC0415
+        except ImportError as e:
+            raise ValueError("zstd compressed archives require python 3.14 or the zstandard package") from e
+        return tarfile.open(fileobj=zstandard.ZstdDecompressor().stream_reader(archive), mode="r|")
+
+    # the compression is detected from the stream
+    return tarfile.open(fileobj=archive, mode="r|*")
+
+
+def extract_tar_stream(archive: BinaryIO, compression: str, destination: Path) -> VersionSize:
     """
-    Extracts the given archive to the directory
-    and deletes the source afterwards.
+    Extracts a tar archive while it is decompressed. The "data"
+    filter rejects absolute paths, members and links pointing outside
+    of the destination and special files.
+    """
+    with open_tar_stream(archive, compression) as tar:
+        tar.extractall(path=destination, filter="data")
+        sizes: dict[str, int] = {}
+        for member in tar.getmembers():
+            name = os.path.normpath(member.name)
+            if member.isreg():
+                sizes[name] = member.size
+            elif member.islnk():
+                sizes[name] = sizes.get(os.path.normpath(member.linkname), 0)
+    return listed_size(sizes)
+
+
+def listed_size(sizes: dict[str, int]) -> VersionSize:
+    """
+    Returns the size of the files of an archive by their path, counting them like `measure_dir`.
+    """
+    files = [size for name, size in sizes.items() if os.path.basename(name) not in METADATA_FILES]
+    return VersionSize(size=sum(files), files=len(files))
+
+
+def extract_archive(archive: BinaryIO, filename: str, destination: Path, workers: int = 1) -> VersionSize:
+    """
+    Extracts the uploaded archive straight into the directory,
+    without storing a copy of the archive first. Uploads which
+    are not an archive are stored as they are.
+    Supports zip and (gzip, xz or zstd compressed) tar archives.
 
     Args:
-        target_file (pathlib.Path): target archive
+        archive (BinaryIO): seekable file object of the upload
+        filename (str): name of the uploaded file
         destination: (pathlib.Path): destination of the extracted archive
+        workers (int): number of threads extracting large zip files
+
+    Returns:
+        VersionSize: the number of bytes and files written to the destination
     """
-    if target_file.suffix == ".zip":
+    if Path(filename).suffix == ".zip":
         # this is required to extract zip files created
         # on windows machines (https://stackoverflow.com/a/52091659/12356463)
         os.path.altsep = "\\"
-        with ZipFile(target_file, "r") as zipf:
-            zipf.extractall(path=destination)
-        target_file.unlink()  # remove the zip file
+        with ZipFile(archive, "r") as zipf:
+            members = zipf.infolist()
+            fd = _fileno(archive) if workers > 1 and len(members) >= PARALLEL_EXTRACT_MIN_MEMBERS else None
+            if fd is not None:
+                extract_zip_parallel(zipf, fd, destination, workers)
+            else:
+                # members are decompressed chunk by chunk into their target files
+                zipf.extractall(path=destination)
+            # members are counted by the path they were extracted to, a later member replaces an earlier one
+            sizes = {str(member_path(info, destination)): info.file_size for info in members if not info.is_dir()}
+            sizes.pop(str(destination), None)
+            return listed_size(sizes)
+
+    compression = tar_compression(filename)
+    if compression is not None:
+        return extract_tar_stream(archive, compression, destination)
+
+    with (destination / Path(filename).name).open("wb") as buffer:
+        shutil.copyfileobj(archive, buffer)
+        return listed_size({Path(filename).name: buffer.tell()})
+
+
+def remove_metadata(version_folder: Path) -> None:
+    """
+    Removes the files docat stores in a version from an extracted upload,
+    so they are neither mistaken for the ones of docat nor counted.
+    """
+    for name in METADATA_FILES:
+        (version_folder / name).unlink(missing_ok=True)
+
 
+# see renameat2(2)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 1 << 1
+
+
+def exchange_paths(first: Path, second: Path) -> bool:
+    """
+    Atomically exchange two paths with renameat2(RENAME_EXCHANGE).
 
-def remove_docs(project: str, version: str, upload_folder_path: Path):
+    Returns False if the platform or filesystem does not support it.
+    """
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        return False
+
+    if renameat2(AT_FDCWD, os.fsencode(first), AT_FDCWD, os.fsencode(second), RENAME_EXCHANGE) != 0:
+        error = ctypes.get_errno()
+        if error in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+            return False
+        raise OSError(error, os.strerror(error), str(first))
+    return True
+
+
+class VersionExistsError(FileExistsError):
+    """
+    Raised when a version was published by another upload since it was found to be missing.
+    """
+
+
+def publish_version(staging_path: Path, base_path: Path) -> Path | None:
+    """
+    Moves an extracted version from the staging folder into place.
+    An existing version is swapped out with a single rename, so it never
+    disappears while being replaced. Both paths need to be on the same filesystem.
+
+    Args:
+        staging_path (pathlib.Path): the extracted version
+        base_path (pathlib.Path): the final version folder
+
+    Returns:
+        pathlib.Path | None: the folder holding the replaced version, which still needs to be removed
+
+    Raises:
+        VersionExistsError: if a concurrent upload published the version first
+    """
+    base_path.parent.mkdir(parents=True, exist_ok=True)
+    if not base_path.exists():
+        try:
+            os.replace(staging_path, base_path)
+        except OSError as e:
+            if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                raise VersionExistsError(e.errno, "Version was published concurrently", str(base_path)) from e
+            raise
+        return None
+
+    if exchange_paths(staging_path, base_path):
+        return staging_path
+
+    # without renameat2 the version is missing for the time between two renames
+    replaced_path = staging_path.with_name(f"{staging_path.name}.replaced")
+    os.replace(base_path, replaced_path)
+    os.replace(staging_path, base_path)
+    return replaced_path
+
+
+def remove_docs(project: str, version: str, upload_folder_path: Path, trash: "Trash | None" = None):
     """
     Delete documentation
 
     Args:
         project (str): name of the project
         version (str): project version
+        trash (Trash | None): move the version into the trash instead of removing it right away
     """
     docs = upload_folder_path / project / version
     if docs.exists():
@@ -86,6 +373,8 @@ def remove_docs(project: str, version: str, upload_folder_path: Path):
         # rmtree can not remove a symlink
         if docs.is_symlink():
             docs.unlink()
+        elif trash is not None:
+            trash.put(docs)
         else:
             shutil.rmtree(docs)
 
@@ -94,15 +383,9 @@ def remove_docs(project: str, version: str, upload_folder_path: Path):
             if not link.resolve().exists():
                 link.unlink()
 
-        # remove size info
-        (upload_folder_path / project / ".size").unlink(missing_ok=True)
-
         # remove empty projects
         if not [d for d in docs.parent.iterdir() if d.is_dir()]:
             docs.parent.rmdir()
-            nginx_config = NGINX_CONFIG_PATH / f"{project}-doc.conf"
-            if nginx_config.exists():
-                nginx_config.unlink()
     else:
         return f"Could not find version '{docs}'"
 
@@ -162,85 +445,95 @@ def readable_size(bytes: int) -> str:
     return str(amount) + size_suffix
 
 
-@cache
-def get_dir_size(path: Path) -> int:
+def measure_dir(path: Path | str) -> VersionSize:
     """
-    Calculate the total size of a directory.
-
-    Results are cached (memoizing) by path.
+    Calculate the total size and number of files of a directory,
+    without following symlinks and without the stored size and manifest.
+    Files with more than one hard link are counted as linked to the blob store,
+    the compressed siblings written on upload are counted separately.
     """
-    total = 0
+    return _measure_dir(path, "", read_sidecars(path))
+
+
+def _measure_dir(path: Path | str, prefix: str, sidecar_paths: frozenset[str]) -> VersionSize:
+    size = 0
+    files = 0
+    linked = 0
+    sidecars = 0
     with os.scandir(path) as it:
         for entry in it:
-            if entry.is_symlink():
+            if entry.is_symlink() or entry.name in METADATA_FILES:
                 # skip symlinks
                 pass
             elif entry.is_file():
-                total += entry.stat().st_size
+                stat = entry.stat()
+                if prefix + entry.name in sidecar_paths:
+                    sidecars += stat.st_size
+                else:
+                    size += stat.st_size
+                    files += 1
+                if stat.st_nlink > 1:
+                    linked += stat.st_size
             elif entry.is_dir():
-                total += get_dir_size(entry.path)
-    return total
+                nested = _measure_dir(entry.path, f"{prefix}{entry.name}/", sidecar_paths)
+                size += nested.size
+                files += nested.files
+                linked += nested.linked
+                sidecars += nested.sidecars
+    return VersionSize(size=size, files=files, linked=linked, sidecars=sidecars)
 
 
-@cache
-def get_system_stats(upload_folder_path: Path) -> Stats:
+def version_signature(version_folder: Path | str) -> str:
     """
-    Return all docat statistics.
-
-    Results are cached (memoizing) by path.
+    Returns a signature of the folders of a version, which changes when a file is
+    added, removed or replaced anywhere in it, without a stat of every file.
     """
-    dirs = 0
-    versions = 0
-    size = 0
-    # Note: Not great nesting with the deep nesting
-    # but it needs to run fast, consider speed when refactoring!
-    with os.scandir(upload_folder_path) as root:
-        for f in root:
-            if f.is_dir():
-                dirs += 1
-                with os.scandir(f.path) as project:
-                    for v in project:
-                        if v.is_dir() and not v.is_symlink():
-                            size += get_dir_size(v.path)
-                            versions += 1
+    digest = hashlib.sha256()
+    for root, _, _ in os.walk(version_folder):
+        stat = os.stat(root)
+        digest.update(f"{os.path.relpath(root, version_folder)}:{stat.st_ino}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
 
-    return Stats(
-        n_projects=dirs,
-        n_versions=versions,
-        storage=readable_size(size),
-    )
 
-
-def get_all_projects(upload_folder_path: Path, include_hidden: bool) -> Projects:
+def write_version_size(version_folder: Path, version_size: VersionSize) -> None:
     """
-    Returns all projects in the upload folder.
+    Stores the size of a version next to its files, with the signature of the version it belongs to.
     """
-    projects: list[Project] = []
-
-    for project in sorted(upload_folder_path.iterdir()):
-        if not project.is_dir():
-            continue
+    size_path = version_folder / SIZE_FILE
+    # creating the file changes the folder, so it is created before the signature is taken
+    size_path.touch()
+    signature = version_signature(version_folder)
+    with size_path.open("w") as f:
+        json.dump({**dataclasses.asdict(version_size), "signature": signature}, f)
 
-        details = get_project_details(upload_folder_path, project.name, include_hidden)
 
-        if details is None:
-            continue
+def read_version_size(version_folder: Path, verify: bool = True) -> VersionSize:
+    """
+    Returns the stored size of a version, measuring and storing it when it
+    is missing or, with `verify`, when the version changed since it was stored.
+    """
+    try:
+        with (version_folder / SIZE_FILE).open() as f:
+            stored = json.load(f)
+        signature = stored.pop("signature", None)
+        if not verify or signature == version_signature(version_folder):
+            return VersionSize(**stored)
+    except (OSError, ValueError, TypeError, AttributeError):
+        pass
 
-        if len(details.versions) < 1:
-            continue
+    return measure_version(version_folder)
 
-        project_name = str(project.relative_to(upload_folder_path))
-        project_has_logo = (upload_folder_path / project / "logo").exists()
-        projects.append(
-            Project(
-                name=project_name,
-                logo=project_has_logo,
-                versions=details.versions,
-                storage=readable_size(get_dir_size(upload_folder_path / project)),
-            )
-        )
 
-    return Projects(projects=projects)
+def measure_version(version_folder: Path) -> VersionSize:
+    """
+    Measures a version and stores its size.
+    """
+    version_size = measure_dir(version_folder)
+    try:
+        write_version_size(version_folder, version_size)
+    except OSError:
+        logger.warning(f"Cannot store the size of {version_folder}")
+    return version_size
 
 
 def get_version_timestamp(version_folder: Path) -> datetime:
@@ -250,38 +543,78 @@ def get_version_timestamp(version_folder: Path) -> datetime:
     return datetime.fromtimestamp(version_folder.stat().st_ctime)
 
 
-def get_project_details(upload_folder_path: Path, project_name: str, include_hidden: bool) -> ProjectDetail | None:
+def scan_version(version_folder: Path, verify: bool = True, measure: bool = False) -> dict:
+    """
+    Returns the catalog entry of a single version folder.
+
+    Args:
+        version_folder (pathlib.Path): the version
+        verify (bool): measure the version again if it changed since its size was stored
+        measure (bool): always measure the version instead of reading its stored size
+    """
+    version_size = measure_version(version_folder) if measure else read_version_size(version_folder, verify)
+    return {
+        "timestamp": get_version_timestamp(version_folder).isoformat(),
+        "hidden": (version_folder / ".hidden").exists(),
+        "size": version_size.size,
+        "files": version_size.files,
+        "linked": version_size.linked,
+        "sidecars": version_size.sidecars,
+        "sort_key": version_key(version_folder.name),
+    }
+
+
+def scan_project(upload_folder_path: Path, project_name: str, measure: bool = False) -> dict | None:
     """
-    Returns all versions and tags for a project.
+    Returns the catalog entry of a project by walking its folder,
+    used to (re)build the catalog from the filesystem. Versions
+    which changed since their size was stored are measured again,
+    with `measure` all of them are.
     """
     docs_folder = upload_folder_path / project_name
 
-    if not docs_folder.exists():
+    if not docs_folder.is_dir():
         return None
 
-    tags = [x for x in docs_folder.iterdir() if x.is_dir() and x.is_symlink()]
-
-    def should_include(name: str) -> bool:
-        if include_hidden:
-            return True
-
-        return not (docs_folder / name / ".hidden").exists()
-
-    return ProjectDetail(
-        name=project_name,
-        storage=readable_size(get_dir_size(docs_folder)),
-        versions=sorted(
-            [
-                ProjectVersion(
-                    name=str(x.relative_to(docs_folder)),
-                    tags=[str(t.relative_to(docs_folder)) for t in tags if t.resolve() == x],
-                    timestamp=get_version_timestamp(x),
-                    hidden=(docs_folder / x.name / ".hidden").exists(),
-                )
-                for x in docs_folder.iterdir()
-                if x.is_dir() and not x.is_symlink() and should_include(x.name)
-            ],
-            key=lambda k: k.name,
-            reverse=True,
-        ),
-    )
+    version_names, tags = list_project(docs_folder)
+
+    logo = docs_folder / "logo"
+    return {
+        "logo": logo.exists(),
+        "logo_size": logo.stat().st_size if logo.exists() else 0,
+        "versions": {name: scan_version(docs_folder / name, measure=measure) for name in version_names},
+        "tags": tags,
+    }
+
+
+def list_project(docs_folder: Path) -> tuple[list[str], dict[str, str]]:
+    """
+    Returns the versions and the tags of a project folder in a single pass,
+    reading the target of every tag with one readlink.
+
+    Returns:
+        tuple[list[str], dict[str, str]]: the version names and the targets of the tags by their name
+    """
+    versions = []
+    tags = {}
+    with os.scandir(docs_folder) as it:
+        for entry in it:
+            if entry.is_symlink():
+                # skip dangling tags
+                if entry.is_dir():
+                    tags[entry.name] = Path(os.readlink(entry.path)).name
+            elif entry.is_dir():
+                versions.append(entry.name)
+    return versions, tags
+
+
+def resolve_tag(tags: dict[str, str], tag: str) -> str:
+    """
+    Follows a tag, which might point to another tag, to its version.
+    """
+    target = tags[tag]
+    seen = {tag}
+    while target in tags and target not in seen:
+        seen.add(target)
+        target = tags[target]
+    return target
@@ -0,0 +1,64 @@
+"""
+docat versions
+
+Ordering of version names. Versions following PEP 440 (which covers
+most of semver as well) are ordered by their meaning, so 1.10.0 comes
+after 1.9.0 and 2.0.0rc1 before 2.0.0. Other names are ordered
+naturally, numbers in them by their value.
+
+Sort keys only contain lists, ints and strings, so they can be stored
+in the catalog and compared after reading it back.
+"""
+
+import re
+
+# the version which is expected to be replaced by new uploads, even without a tag
+LATEST = "latest"
+
+# see https://peps.python.org/pep-0440/#appendix-b-parsing-version-strings-with-regular-expressions
+VERSION_PATTERN = re.compile(
+    r"""
+    v?
+    (?:(?P<epoch>[0-9]+)!)?
+    (?P<release>[0-9]+(?:\.[0-9]+)*)
+    (?P<pre>[-_.]?(?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre_n>[0-9]+)?)?
+    (?P<post>(?:-(?P<post_n1>[0-9]+))|(?:[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?))?
+    (?P<dev>[-_.]?dev[-_.]?(?P<dev_n>[0-9]+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+PRE_RELEASES = {"a": 0, "alpha": 0, "b": 1, "beta": 1, "c": 2, "pre": 2, "preview": 2, "rc": 2}
+
+
+def _natural_key(name: str) -> list:
+    return [[1, int(part), ""] if part.isdigit() else [0, 0, part] for part in re.split(r"(\d+)", name.lower()) if part]
+
+
+def version_key(name: str) -> list:
+    """
+    Returns the sort key of a version name, versions are ordered ascending by it.
+    """
+    match = VERSION_PATTERN.fullmatch(name.strip())
+    if match is None:
+        # names which are no version sort below all versions
+        return [0, _natural_key(name)]
+
+    release = [int(part) for part in match["release"].split(".")]
+    while len(release) > 1 and release[-1] == 0:
+        release.pop()
+
+    if match["pre"]:
+        pre = [PRE_RELEASES[match["pre_l"].lower()], int(match["pre_n"] or 0)]
+    elif match["dev"] and not match["post"]:
+        # 1.0.dev1 comes before 1.0a1
+        pre = [-1, 0]
+    else:
+        pre = [3, 0]
+
+    post = int(match["post_n1"] or match["post_n2"] or 0) if match["post"] else -1
+    dev = [0, int(match["dev_n"] or 0)] if match["dev"] else [1, 0]
+    local = _natural_key(match["local"]) if match["local"] else []
+
+    return [1, int(match["epoch"] or 0), release, pre, post, dev, local]
@@ -0,0 +1,129 @@
+"""
+docat watcher
+
+Documentation which is added, replaced or removed by hand is picked
+up by a background watcher, which rescans only the changed project
+and refreshes its entry in the catalog. Changes are reported by
+inotify through `watchfiles` if it is installed, otherwise the
+project folders are polled, which walks all folders of the versions.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+from pathlib import Path
+
+from docat.catalog import Catalog
+from docat.utils import version_signature
+
+logger = logging.getLogger(__name__)
+
+
+def project_of(upload_folder_path: Path, path: str) -> str | None:
+    """
+    Returns the project a changed path belongs to, None for paths outside of projects.
+    """
+    try:
+        parts = Path(path).relative_to(upload_folder_path).parts
+    except ValueError:
+        return None
+    return parts[0] if parts else None
+
+
+def snapshot(upload_folder_path: Path) -> dict[str, tuple]:
+    """
+    Returns a signature of every project which changes when one of its
+    versions, tags or its logo is added, removed or replaced, or when
+    a file is added, removed or replaced anywhere in one of its versions.
+    """
+    projects: dict[str, tuple] = {}
+    try:
+        with os.scandir(upload_folder_path) as it:
+            project_entries = [entry for entry in it if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return projects
+
+    for project in project_entries:
+        try:
+            with os.scandir(project.path) as it:
+                children = sorted(
+                    (
+                        entry.name,
+                        version_signature(entry.path)
+                        if entry.is_dir(follow_symlinks=False)
+                        else entry.stat(follow_symlinks=False).st_mtime_ns,
+                    )
+                    for entry in it
+                )
+        except OSError:
+            # removed while it was scanned, picked up with the next snapshot
+            continue
+        projects[project.name] = (project.stat(follow_symlinks=False).st_mtime_ns, tuple(children))
+    return projects
+
+
+class Watcher:
+    """
+    Background thread refreshing the catalog entries of projects
+    which changed on disk. Only one worker watches the upload
+    folder at a time, the others wait for its lock.
+    """
+
+    def __init__(self, catalog: Catalog, interval: float = 5.0):
+        self.catalog = catalog
+        self.upload_folder_path = catalog.upload_folder_path
+        self.interval = interval
+        self.lock_path = catalog.catalog_path.parent / ".watcher.lock"
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="docat-watcher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def refresh(self, projects: set[str]) -> None:
+        for project in sorted(projects):
+            try:
+                if self.catalog.refresh_project(project):
+                    logger.info(f"Refreshed {project} after it changed on disk")
+            except Exception:
+                logger.exception(f"Failed to refresh {project}")
+
+    def _run(self) -> None:
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock_path.open("a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    # another worker is already watching
+                    if self._stop.wait(self.interval):
+                        return
+
+            try:
+                self._watch()
+            except Exception:
+                logger.exception("Failed to watch the upload folder, polling it instead")
+                self._poll()
+
+    def _watch(self) -> None:
+        try:
+            from watchfiles import watch  # noqa: PLC0415
+        except ImportError:
+            self._poll()
+            return
+
+        for changes in watch(self.upload_folder_path, watch_filter=None, stop_event=self._stop):
+            self.refresh({project for _, path in changes if (project := project_of(self.upload_folder_path, path))})
+
+    def _poll(self) -> None:
+        projects = snapshot(self.upload_folder_path)
+        while not self._stop.wait(self.interval):
+            current = snapshot(self.upload_folder_path)
+            self.refresh({project for project in projects.keys() | current.keys() if projects.get(project) != current.get(project)})
+            projects = current
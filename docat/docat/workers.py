@@ -0,0 +1,70 @@
+"""
+docat workers
+
+Dedicated pool for blocking work like token hashing, archive
+extraction and file type detection, so it does not compete with
+the read-only endpoints for threads.
+"""
+
+import asyncio
+import functools
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class PoolSaturatedError(Exception):
+    """
+    Raised when the worker pool and its queue are full.
+    """
+
+
+class WorkerPool:
+    """
+    Thread pool with a bounded queue.
+
+    Threads are enough, the heavy parts (PBKDF2, zlib, file I/O)
+    release the GIL while they run.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="docat-worker")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of calls which are running or waiting for a thread.
+        """
+        return self._pending
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Runs a blocking function in the pool.
+
+        Raises:
+            PoolSaturatedError: if all workers are busy and the queue is full
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                raise PoolSaturatedError()
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release()
+            raise
+        # a cancelled caller does not stop the thread, so the slot is only released once the call is done
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future: Future | None = None) -> None:
+        with self._lock:
+            self._pending -= 1
@@ -1,11 +1,13 @@
+import io
 import tempfile
+import zipfile
 from pathlib import Path
 
 import pytest
 from fastapi.testclient import TestClient
-from tinydb import TinyDB
 
 import docat.app as docat
+from docat.models import Claim
 from docat.utils import create_symlink
 
 
@@ -18,7 +20,15 @@ def setup_docat_paths():
     temp_dir = tempfile.TemporaryDirectory()
     docat.DOCAT_STORAGE_PATH = Path(temp_dir.name)
     docat.DOCAT_DB_PATH = Path(temp_dir.name) / "db.json"
+    docat.DOCAT_CLAIMS_DB_PATH = Path(temp_dir.name) / "claims.db"
+    docat.DOCAT_CATALOG_PATH = Path(temp_dir.name) / "catalog.json"
     docat.DOCAT_UPLOAD_FOLDER = Path(temp_dir.name) / "doc"
+    docat.DOCAT_STAGING_FOLDER = Path(temp_dir.name) / "staging"
+    docat.DOCAT_TRASH_FOLDER = Path(temp_dir.name) / "trash"
+    docat.DOCAT_BLOBS_FOLDER = Path(temp_dir.name) / "blobs"
+    docat.DOCAT_SEARCH_DB_PATH = Path(temp_dir.name) / "search.db"
+    docat.DOCAT_SESSIONS_FOLDER = Path(temp_dir.name) / "sessions"
+    docat.DOCAT_NGINX_CONFIG_PATH = Path(temp_dir.name) / "locations.d"
 
     yield
 
@@ -27,18 +37,13 @@ def setup_docat_paths():
 
 @pytest.fixture
 def client():
-    docat.db = TinyDB(docat.DOCAT_DB_PATH)
-
     yield TestClient(docat.app)
 
-    docat.app.db = None
-
 
 @pytest.fixture
 def client_with_claimed_project(client):
-    table = docat.db.table("claims")
     token_hash_1234 = b"\xe0\x8cS\xa3)\xb4\xb5\xa5\xda\xc3K\x96\xf6).\xdd-\xacR\x8e3Q\x17\x87\xfb\x94\x0c-\xc2h\x1c\xf3"
-    table.insert({"name": "some-project", "token": token_hash_1234.hex(), "salt": ""})
+    docat.get_db().add(Claim(name="some-project", token=token_hash_1234.hex(), salt=""))
     yield client
 
 
@@ -54,3 +59,34 @@ def temp_project_version():
         return docat.DOCAT_UPLOAD_FOLDER
 
     yield __create
+
+
+@pytest.fixture
+def make_zip():
+    def __create(files):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zipf:
+            for name, content in files.items():
+                zipf.writestr(name, content)
+        archive.seek(0)
+        return archive
+
+    yield __create
+
+
+@pytest.fixture
+def upload(client, make_zip):
+    """
+    Uploads a version, an index.html without files, otherwise a zip file of the files.
+    """
+
+    def __upload(project, version, files=None, headers=None):
+        if files is None:
+            file = ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")
+        else:
+            file = ("docs.zip", make_zip(files), "application/zip")
+        response = client.post(f"/api/{project}/{version}", files={"file": file}, headers=headers)
+        assert response.status_code == 201
+        return response
+
+    yield __upload
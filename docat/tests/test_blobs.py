@@ -0,0 +1,89 @@
+import io
+import os
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.blobs import BlobStore, hash_file
+from docat.models import VersionSize
+from docat.utils import measure_dir
+
+
+def test_versions_share_identical_files(client_with_claimed_project):
+    with patch("docat.app.DOCAT_DEDUPLICATE", True):
+        for version in ["1.0.0", "2.0.0"]:
+            response = client_with_claimed_project.post(
+                f"/api/some-project/{version}", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+            )
+            assert response.status_code == 201
+
+    first = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html"
+    second = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0" / "index.html"
+    assert first.stat().st_ino == second.stat().st_ino
+    assert second.read_bytes() == b"<h1>Hello World</h1>"
+
+    response = client_with_claimed_project.get("/api/stats")
+    assert response.status_code == 200
+    assert response.json() == {
+        "n_projects": 1,
+        "n_versions": 2,
+        "storage": "40 bytes",
+        "sidecar_storage": "0 bytes",
+        "physical_storage": "20 bytes",
+    }
+
+
+def test_link_tree(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    for version in ["1.0.0", "2.0.0"]:
+        (tmp_path / version).mkdir()
+        (tmp_path / version / "index.html").write_bytes(b"<h1>Hello World</h1>")
+        (tmp_path / version / "empty.txt").touch()
+        (tmp_path / version / "link.html").symlink_to("index.html")
+        (tmp_path / version / ".manifest").write_text("{}")
+
+        version_size = store.link_tree(tmp_path / version, measure_dir(tmp_path / version))
+        assert version_size == VersionSize(size=20, files=2, linked=20)
+
+    blob = store.blob_path(hash_file(tmp_path / "1.0.0" / "index.html"))
+    assert blob.stat().st_nlink == 3
+    assert store.size() == 20
+    assert measure_dir(tmp_path / "2.0.0") == VersionSize(size=20, files=2, linked=20)
+    assert (tmp_path / "2.0.0" / ".manifest").stat().st_nlink == 1
+
+
+def test_collect_removes_unused_blobs(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    (tmp_path / "1.0.0").mkdir()
+    (tmp_path / "1.0.0" / "index.html").write_bytes(b"<h1>Hello World</h1>")
+    store.link_tree(tmp_path / "1.0.0", measure_dir(tmp_path / "1.0.0"))
+
+    assert store.collect() == 0
+    assert store.size() == 20
+
+    os.unlink(tmp_path / "1.0.0" / "index.html")
+
+    assert store.collect() == 20
+    assert store.size() == 0
+    assert list(store.blobs_path.glob("*/*")) == []
+
+
+def test_link_file_recreates_collected_blob(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    path = tmp_path / "index.html"
+    path.write_bytes(b"<h1>Hello World</h1>")
+    blob = store.blob_path(hash_file(path))
+
+    real_link = os.link
+    calls = []
+
+    def link_after_collect(src, dst):
+        calls.append((src, dst))
+        if len(calls) == 1:
+            # the blob exists, but is collected right after
+            raise FileExistsError()
+        return real_link(src, dst)
+
+    with patch("os.link", side_effect=link_after_collect):
+        assert store.link_file(path) == (True, 20)
+
+    assert blob.stat().st_ino == path.stat().st_ino
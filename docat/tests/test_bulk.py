@@ -0,0 +1,102 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+import docat.app as docat
+from docat.utils import calculate_token
+
+
+@pytest.fixture
+def bulk_upload(client, make_zip):
+    def __upload(uploads, files, **kwargs):
+        archive = make_zip({"docat.json": json.dumps({"uploads": uploads}), **files})
+        return client.post("/api/bulk", files={"file": ("docs.zip", archive, "application/zip")}, **kwargs)
+
+    yield __upload
+
+
+def test_bulk_upload(client, bulk_upload):
+    uploads = [
+        {"project": "some-project", "version": "1.0.0"},
+        {"project": "some-project", "version": "2.0.0"},
+        {"project": "other-project", "version": "1.0.0", "path": "packages/other/html"},
+    ]
+    files = {
+        "some-project/1.0.0/index.html": b"<h1>One</h1>",
+        "some-project/2.0.0/index.html": b"<h1>Two</h1>",
+        "packages/other/html/index.html": b"<h1>Other</h1>",
+    }
+
+    with patch.object(docat.Catalog, "update_versions", wraps=docat.get_catalog().update_versions) as update_mock:
+        response = bulk_upload(uploads, files)
+    assert response.status_code == 201
+    assert [(r["project"], r["version"], r["status"]) for r in response.json()["results"]] == [
+        ("some-project", "1.0.0", 201),
+        ("some-project", "2.0.0", 201),
+        ("other-project", "1.0.0", 201),
+    ]
+    assert len(update_mock.mock_calls) == 1
+
+    assert (docat.DOCAT_UPLOAD_FOLDER / "other-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>Other</h1>"
+    response = client.get("/api/projects/some-project")
+    assert [v["name"] for v in response.json()["versions"]] == ["2.0.0", "1.0.0"]
+    assert response.json()["storage"] == "24 bytes"
+    assert list(docat.DOCAT_STAGING_FOLDER.iterdir()) == []
+
+
+def test_bulk_upload_reports_every_version(client_with_claimed_project, bulk_upload):
+    client = client_with_claimed_project
+    response = client.post("/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")})
+    assert response.status_code == 201
+    assert client.put("/api/some-project/1.0.0/tags/latest").status_code == 201
+
+    uploads = [
+        {"project": "some-project", "version": "1.0.0"},
+        {"project": "some-project", "version": "latest"},
+        {"project": "new-project", "version": "1.0.0"},
+        {"project": "new-project", "version": "1.0.0"},
+        {"project": "new-project", "version": "2.0.0"},
+        {"project": "..", "version": "1.0.0"},
+        {"project": "api", "version": "1.0.0"},
+    ]
+    files = {
+        "some-project/1.0.0/index.html": b"<h1>Override</h1>",
+        "some-project/latest/index.html": b"<h1>Tag</h1>",
+        "new-project/1.0.0/index.html": b"<h1>New</h1>",
+        "api/1.0.0/index.html": b"<h1>Api</h1>",
+    }
+
+    response = bulk_upload(uploads, files)
+    assert response.status_code == 207
+    assert [r["status"] for r in response.json()["results"]] == [401, 409, 201, 409, 400, 400, 400]
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>Hello World</h1>"
+    assert (docat.DOCAT_UPLOAD_FOLDER / "new-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>New</h1>"
+
+
+def test_bulk_upload_verifies_each_token_once(client_with_claimed_project, bulk_upload):
+    client = client_with_claimed_project
+    for version in ["1.0.0", "2.0.0"]:
+        response = client.post(f"/api/some-project/{version}", files={"file": ("index.html", io.BytesIO(b"<h1>Hello</h1>"), "plain/text")})
+        assert response.status_code == 201
+    docat.token_cache.clear()
+
+    uploads = [{"project": "some-project", "version": "1.0.0"}, {"project": "some-project", "version": "2.0.0"}]
+    files = {"some-project/1.0.0/index.html": b"<h1>One</h1>", "some-project/2.0.0/index.html": b"<h1>Two</h1>"}
+    with patch("docat.app.calculate_token", wraps=calculate_token) as calculate_token_mock:
+        response = bulk_upload(uploads, files, data={"tokens": json.dumps({"some-project": "1234"})})
+    assert response.status_code == 201
+    assert len(calculate_token_mock.mock_calls) == 1
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0" / "index.html").read_bytes() == b"<h1>Two</h1>"
+
+
+def test_bulk_upload_without_manifest(client, make_zip, bulk_upload):
+    archive = make_zip({"some-project/1.0.0/index.html": b"<h1>Hello</h1>"})
+
+    response = client.post("/api/bulk", files={"file": ("docs.zip", archive, "application/zip")})
+    assert response.status_code == 400
+    assert response.json() == {"message": "docat.json is missing"}
+
+    response = bulk_upload([], {}, data={"tokens": "[]"})
+    assert response.status_code == 400
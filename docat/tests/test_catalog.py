@@ -0,0 +1,141 @@
+import io
+import json
+import multiprocessing
+from datetime import datetime
+from unittest.mock import patch
+
+import docat.app as docat
+
+
+@patch("docat.utils.get_version_timestamp", return_value=datetime(2000, 1, 1, 1, 1, 0))
+def test_catalog_is_built_from_existing_folder(_, client, temp_project_version):
+    """
+    Projects which existed before the catalog are picked up on the first read.
+    """
+    temp_project_version("project", "1.0")
+
+    response = client.get("/api/projects/project")
+    assert response.status_code == 200
+    assert response.json() == {
+        "name": "project",
+        "storage": "0 bytes",
+        "versions": [{"name": "1.0", "timestamp": "2000-01-01T01:01:00", "tags": ["latest"], "hidden": False}],
+    }
+    assert docat.DOCAT_CATALOG_PATH.exists()
+
+
+def test_listing_does_not_walk_upload_folder(client_with_claimed_project):
+    """
+    Once the catalog exists, listing projects only reads the catalog.
+    """
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+
+    with patch("docat.catalog.scan_project") as scan_project_mock, patch("docat.catalog.scan_version") as scan_version_mock:
+        response = client_with_claimed_project.get("/api/projects")
+        assert response.status_code == 200
+        assert [p["name"] for p in response.json()["projects"]] == ["some-project"]
+
+        response = client_with_claimed_project.get("/api/projects/some-project")
+        assert response.status_code == 200
+
+        assert scan_project_mock.mock_calls == []
+        assert scan_version_mock.mock_calls == []
+
+
+def test_catalog_follows_mutations(client_with_claimed_project):
+    """
+    Tag, hide, rename and delete are reflected in the catalog.
+    """
+    for version in ["1.0.0", "2.0.0"]:
+        response = client_with_claimed_project.post(
+            f"/api/some-project/{version}", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+        )
+        assert response.status_code == 201
+
+    assert client_with_claimed_project.put("/api/some-project/1.0.0/tags/stable").status_code == 201
+    assert client_with_claimed_project.post("/api/some-project/2.0.0/hide", headers={"Docat-Api-Key": "1234"}).status_code == 200
+    assert client_with_claimed_project.put("/api/some-project/rename/renamed", headers={"Docat-Api-Key": "1234"}).status_code == 200
+
+    catalog = docat.get_catalog()
+    details = catalog.get_project_details("renamed", include_hidden=True)
+    assert details is not None
+    assert [(v.name, v.tags, v.hidden) for v in details.versions] == [("2.0.0", [], True), ("1.0.0", ["stable"], False)]
+    assert catalog.get_project_details("some-project", include_hidden=True) is None
+
+    assert client_with_claimed_project.delete("/api/renamed/1.0.0", headers={"Docat-Api-Key": "1234"}).status_code == 200
+
+    details = catalog.get_project_details("renamed", include_hidden=True)
+    assert details is not None
+    assert [(v.name, v.tags) for v in details.versions] == [("2.0.0", [])]
+
+
+def test_rebuild_catalog(client_with_claimed_project, temp_project_version):
+    """
+    Versions added to the upload folder by hand show up after a rebuild.
+    """
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+
+    temp_project_version("manual-project", "1.0")
+    catalog = docat.get_catalog()
+    assert [p.name for p in catalog.get_all_projects(include_hidden=False).projects] == ["some-project"]
+
+    catalog.rebuild()
+    assert [p.name for p in catalog.get_all_projects(include_hidden=False).projects] == ["manual-project", "some-project"]
+
+
+def test_rebuild_measures_every_version(client, upload):
+    upload("some-project", "1.0.0")
+    size_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / ".size"
+    size_path.write_text(json.dumps({**json.loads(size_path.read_text()), "size": 1 << 20}))
+
+    catalog = docat.get_catalog()
+    catalog.rebuild()
+    assert client.get("/api/stats").json()["storage"] == "20 bytes"
+    assert json.loads(size_path.read_text())["size"] == 20
+
+
+def test_versions_are_ordered_by_version(client):
+    for version in ["1.9.0", "nightly", "2.0.0rc1", "1.10.0", "2.0.0"]:
+        response = client.post(
+            f"/api/some-project/{version}", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+        )
+        assert response.status_code == 201
+
+    with patch("docat.utils.version_key") as version_key_mock:
+        response = client.get("/api/projects/some-project")
+        assert version_key_mock.mock_calls == []
+
+    assert [v["name"] for v in response.json()["versions"]] == ["2.0.0", "2.0.0rc1", "1.10.0", "1.9.0", "nightly"]
+
+    response = client.get("/api/projects", params={"versions": 1})
+    assert [v["name"] for v in response.json()["projects"][0]["versions"]] == ["2.0.0"]
+
+
+def _upload_by_other_worker(version_folder):
+    version_folder.mkdir(parents=True)
+    (version_folder / "index.html").write_text("<h1>Hello World</h1>")
+    docat.get_catalog().update_version("some-project", version_folder.name)
+
+
+def test_catalog_changes_of_other_workers_are_visible(temp_project_version):
+    """
+    Readers drop their parsed catalog when another process writes it.
+    """
+    temp_project_version("some-project", "1.0.0")
+    catalog = docat.get_catalog()
+    assert list(catalog.read()["projects"]["some-project"]["versions"]) == ["1.0.0"]
+
+    worker = multiprocessing.get_context("fork").Process(
+        target=_upload_by_other_worker, args=(docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0",)
+    )
+    worker.start()
+    worker.join()
+    assert worker.exitcode == 0
+
+    assert list(catalog.read()["projects"]["some-project"]["versions"]) == ["2.0.0", "1.0.0"]
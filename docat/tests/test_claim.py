@@ -1,3 +1,15 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from tinydb import TinyDB
+
+import docat.app as docat
+from docat.claims import SqliteClaimStore, TinyDBClaimStore, TokenCache, open_claim_store
+from docat.models import Claim
+from docat.utils import calculate_token
+
+
 def test_successfully_claim_token(client):
     response = client.get("/api/some-project/claim")
     response_data = response.json()
@@ -12,3 +24,84 @@ def test_already_claimed(client):
     response_data = response.json()
     assert response.status_code == 409
     assert response_data["message"] == "Project some-project is already claimed!"
+
+
+def test_claims_are_migrated_from_tinydb(tmp_path):
+    TinyDB(tmp_path / "db.json").table("claims").insert({"name": "some-project", "token": "abcd", "salt": "ef"})
+
+    store = SqliteClaimStore(tmp_path / "claims.db")
+    store.migrate(tmp_path / "db.json")
+    assert store.get("some-project") == Claim(name="some-project", token="abcd", salt="ef")
+
+    # the migration only runs once
+    TinyDB(tmp_path / "db.json").table("claims").insert({"name": "another-project", "token": "abcd", "salt": "ef"})
+    store.migrate(tmp_path / "db.json")
+    assert store.get("another-project") is None
+
+
+def test_concurrent_claims_only_succeed_once(tmp_path):
+    store = SqliteClaimStore(tmp_path / "claims.db")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: store.add(Claim(name="some-project", token=str(i), salt="")), range(32)))
+
+    assert results.count(True) == 1
+
+
+def test_tinydb_claims_backend(tmp_path):
+    store = open_claim_store("tinydb", tmp_path / "claims.db", tmp_path / "db.json")
+    assert isinstance(store, TinyDBClaimStore)
+
+    assert store.add(Claim(name="some-project", token="abcd", salt="ef"))
+    assert not store.add(Claim(name="some-project", token="abcd", salt="ef"))
+
+    assert store.rename("some-project", "new-project-name")
+    assert store.get("some-project") is None
+    assert store.get("new-project-name") == Claim(name="new-project-name", token="abcd", salt="ef")
+
+    assert store.add(Claim(name="other-project", token="1234", salt=""))
+    assert not store.rename("other-project", "new-project-name")
+    assert store.get("other-project") is not None
+
+
+def test_verified_tokens_are_cached(client_with_claimed_project):
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+    docat.token_cache.clear()
+
+    with patch("docat.app.calculate_token", wraps=calculate_token) as calculate_token_mock:
+        for action in ["hide", "show", "hide"]:
+            response = client_with_claimed_project.post(f"/api/some-project/1.0.0/{action}", headers={"Docat-Api-Key": "1234"})
+            assert response.status_code == 200
+
+        assert len(calculate_token_mock.mock_calls) == 1
+
+        # invalid tokens are never cached
+        for _ in range(2):
+            response = client_with_claimed_project.delete("/api/some-project/1.0.0", headers={"Docat-Api-Key": "abcd"})
+            assert response.status_code == 401
+
+        assert len(calculate_token_mock.mock_calls) == 3
+
+    metrics_response = client_with_claimed_project.get("/api/metrics")
+    assert metrics_response.json()["token_cache_hits"] == 2
+    assert metrics_response.json()["token_cache_misses"] == 3
+
+
+def test_token_cache_expires_and_is_bounded():
+    claim = Claim(name="some-project", token="abcd", salt="")
+    cache = TokenCache(maxsize=1, ttl=0)
+
+    cache.add(claim, "1234")
+    assert not cache.contains(claim, "1234")
+
+    cache = TokenCache(maxsize=1, ttl=60)
+    cache.add(claim, "1234")
+    cache.add(claim, "5678")
+    assert cache.contains(claim, "5678")
+    assert not cache.contains(claim, "1234")
+
+    cache.invalidate("some-project")
+    assert not cache.contains(claim, "5678")
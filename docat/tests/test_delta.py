@@ -0,0 +1,179 @@
+import hashlib
+import json
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.delta import hash_version
+
+
+def make_manifest(files: dict[str, bytes], base: str | None = "1.0.0") -> dict:
+    return {
+        "base": base,
+        "files": [{"path": path, "sha256": hashlib.sha256(content).hexdigest(), "size": len(content)} for path, content in files.items()],
+    }
+
+
+BASE_FILES = {"index.html": b"<h1>Hello World</h1>", "static/style.css": b"body {}", "static/app.js": b"run()"}
+NEW_FILES = {"index.html": b"<h1>Hello Delta</h1>", "static/style.css": b"body {}", "js/app.js": b"run()"}
+
+
+def test_delta_upload(client, make_zip, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+    manifest = make_manifest(NEW_FILES)
+
+    response = client.post("/api/some-project/2.0.0/manifest", json=manifest)
+    assert response.status_code == 200
+    assert response.json() == {"missing": ["index.html"]}
+
+    response = client.post(
+        "/api/some-project/2.0.0/delta",
+        data={"manifest": json.dumps(manifest)},
+        files={"file": ("docs.zip", make_zip({"index.html": NEW_FILES["index.html"]}), "application/zip")},
+    )
+    assert response.status_code == 201
+    assert response.json() == {"message": "Documentation uploaded successfully"}
+
+    version_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0"
+    for path, content in NEW_FILES.items():
+        assert (version_path / path).read_bytes() == content
+    assert not (version_path / "static" / "app.js").exists()
+    assert json.loads((version_path / ".size").read_text())["size"] == sum(len(c) for c in NEW_FILES.values())
+
+    response = client.get("/api/projects/some-project")
+    assert [v["name"] for v in response.json()["versions"]] == ["2.0.0", "1.0.0"]
+
+
+def test_delta_upload_without_changes(client, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+    manifest = make_manifest(BASE_FILES)
+
+    response = client.post("/api/some-project/2.0.0/manifest", json=manifest)
+    assert response.json() == {"missing": []}
+
+    response = client.post("/api/some-project/2.0.0/delta", data={"manifest": json.dumps(manifest)})
+    assert response.status_code == 201
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0" / "static" / "app.js").read_bytes() == b"run()"
+
+
+def test_delta_upload_rejects_files_not_matching_the_manifest(client, make_zip, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+    manifest = make_manifest(NEW_FILES)
+
+    response = client.post(
+        "/api/some-project/2.0.0/delta",
+        data={"manifest": json.dumps(manifest)},
+        files={"file": ("docs.zip", make_zip({"index.html": b"<h1>Something else</h1>"}), "application/zip")},
+    )
+    assert response.status_code == 400
+    assert response.json() == {"message": "index.html does not match the manifest"}
+    assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0").exists()
+
+
+def test_delta_upload_rejects_missing_files(client, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+
+    response = client.post("/api/some-project/2.0.0/delta", data={"manifest": json.dumps(make_manifest(NEW_FILES))})
+    assert response.status_code == 400
+    assert response.json() == {"message": "index.html is missing"}
+    assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0").exists()
+
+
+def test_manifest_rejects_invalid_paths(client, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+
+    for path in ["../other-project/index.html", "/etc/passwd", ".size"]:
+        response = client.post("/api/some-project/2.0.0/manifest", json=make_manifest({path: b"content"}))
+        assert response.status_code == 400
+        assert response.json() == {"message": f"Invalid path {path}"}
+
+    response = client.post("/api/some-project/2.0.0/manifest", json=make_manifest({"index.html": b""}, base="../other-project"))
+    assert response.status_code == 400
+
+
+def test_manifest_with_unknown_base(client):
+    response = client.post("/api/some-project/2.0.0/manifest", json=make_manifest(NEW_FILES))
+    assert response.status_code == 404
+    assert response.json() == {"message": "Version 1.0.0 not found"}
+
+
+def test_delta_override_requires_token(client_with_claimed_project, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+    manifest = make_manifest(BASE_FILES)
+
+    response = client_with_claimed_project.post("/api/some-project/1.0.0/manifest", json=manifest)
+    assert response.status_code == 401
+
+    response = client_with_claimed_project.post("/api/some-project/1.0.0/delta", data={"manifest": json.dumps(manifest)})
+    assert response.status_code == 401
+
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0/delta", data={"manifest": json.dumps(manifest)}, headers={"Docat-Api-Key": "1234"}
+    )
+    assert response.status_code == 201
+
+
+def test_delta_upload_links_base_files_from_blob_store(client, upload):
+    with patch("docat.app.DOCAT_DEDUPLICATE", True):
+        # the files are hashed once for the manifest and linked by their hashes
+        with patch("docat.blobs.hash_file") as hash_file_mock:
+            upload("some-project", "1.0.0", BASE_FILES)
+        assert hash_file_mock.mock_calls == []
+        manifest = make_manifest(BASE_FILES)
+
+        # only the base version provides content, even if another project stored it
+        response = client.post("/api/other-project/1.0.0/manifest", json=make_manifest(BASE_FILES, base=None))
+        assert response.json() == {"missing": ["index.html", "static/style.css", "static/app.js"]}
+
+        response = client.post("/api/some-project/2.0.0/manifest", json=manifest)
+        assert response.json() == {"missing": []}
+
+        response = client.post("/api/some-project/2.0.0/delta", data={"manifest": json.dumps(manifest)})
+        assert response.status_code == 201
+
+    first = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html"
+    second = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0" / "index.html"
+    assert first.stat().st_ino == second.stat().st_ino
+
+
+def test_base_version_is_hashed_at_most_once(client, make_zip, upload):
+    base_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    with patch("docat.delta.hash_version", wraps=hash_version) as hash_version_mock:
+        upload("some-project", "1.0.0", BASE_FILES)
+        assert json.loads((base_path / ".manifest").read_text())["index.html"] == [hashlib.sha256(BASE_FILES["index.html"]).hexdigest(), 20]
+        manifest = make_manifest(NEW_FILES)
+        delta = {"file": ("docs.zip", make_zip({"index.html": NEW_FILES["index.html"]}), "application/zip")}
+
+        response = client.post("/api/some-project/2.0.0/manifest", json=manifest)
+        assert response.json() == {"missing": ["index.html"]}
+        response = client.post("/api/some-project/2.0.0/delta", data={"manifest": json.dumps(manifest)}, files=delta)
+        assert response.status_code == 201
+        assert base_path not in [call.args[0] for call in hash_version_mock.mock_calls]
+
+        # versions uploaded without a manifest are hashed for the first phase only
+        (base_path / ".manifest").unlink()
+        response = client.post("/api/some-project/3.0.0/manifest", json=manifest)
+        assert response.json() == {"missing": ["index.html"]}
+        response = client.post("/api/some-project/3.0.0/delta", data={"manifest": json.dumps(manifest)}, files=delta)
+        assert response.status_code == 201
+        assert [call.args[0] for call in hash_version_mock.mock_calls].count(base_path) == 1
+
+
+def test_delta_upload_rejects_wrong_sizes_of_base_files(client, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+    manifest = make_manifest(BASE_FILES)
+    manifest["files"][0]["size"] = 1 << 40
+
+    response = client.post("/api/some-project/2.0.0/delta", data={"manifest": json.dumps(manifest)})
+    assert response.status_code == 400
+    assert response.json() == {"message": "index.html does not match the manifest"}
+
+
+def test_delta_upload_to_claimed_project_requires_token(client_with_claimed_project, upload):
+    upload("some-project", "1.0.0", BASE_FILES)
+    manifest = make_manifest(BASE_FILES)
+
+    response = client_with_claimed_project.post("/api/some-project/2.0.0/manifest", json=manifest)
+    assert response.status_code == 401
+
+    response = client_with_claimed_project.post("/api/some-project/2.0.0/manifest", json=manifest, headers={"Docat-Api-Key": "1234"})
+    assert response.json() == {"missing": []}
@@ -0,0 +1,131 @@
+import gzip
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+import docat.app as docat
+from docat.files import IMMUTABLE, REVALIDATE, DocsFiles, FileCache, accepted_encodings
+from docat.utils import create_symlink
+
+PAGE = b"<h1>Hello World</h1>" * 100
+
+
+@pytest.fixture
+def docs_client(temp_project_version):
+    upload_folder = temp_project_version("some-project", "1.0.0")
+    (upload_folder / "some-project" / "1.0.0" / "index.html").write_bytes(PAGE)
+    (upload_folder / "some-project" / "1.0.0" / "index.html.gz").write_bytes(gzip.compress(PAGE))
+    docs = DocsFiles(upload_folder, docat.get_catalog().shared_generation, file_cache=FileCache(4096, 4096))
+    yield TestClient(Starlette(routes=[Mount("/doc", docs)]))
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br;q=0.5") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("gzip;q=0, br") == {"br"}
+    assert accepted_encodings("") == {""}
+
+
+def test_files_are_revalidated(docs_client):
+    response = docs_client.get("/doc/some-project/1.0.0/")
+    assert response.status_code == 200
+    assert response.content == PAGE
+    assert response.headers["cache-control"] == REVALIDATE
+
+
+def test_immutable_versions_are_cached_and_tags_revalidated(docs_client):
+    docs_client.app.routes[0].app.immutable_versions = True
+    latest_folder = docat.DOCAT_UPLOAD_FOLDER / "other-project" / "latest"
+    latest_folder.mkdir(parents=True)
+    (latest_folder / "index.html").write_bytes(PAGE)
+
+    response = docs_client.get("/doc/some-project/1.0.0/")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE
+
+    # tags and a version named latest are replaced by new uploads
+    for path in ["/doc/some-project/latest/index.html", "/doc/other-project/latest/index.html"]:
+        response = docs_client.get(path)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == REVALIDATE
+
+
+def test_precompressed_sibling_is_served(docs_client):
+    response = docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+    assert response.content == PAGE
+
+    identity = docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["content-length"] == str(len(PAGE))
+    assert identity.headers["etag"] != response.headers["etag"]
+
+
+def test_conditional_and_range_requests(docs_client):
+    response = docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "identity"})
+    etag = response.headers["etag"]
+    assert not etag.startswith("W/")
+
+    response = docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "identity", "Range": "bytes=0-3"})
+    assert response.status_code == 206
+    assert response.content == b"<h1>"
+
+
+def test_moved_tag_is_resolved_again_after_catalog_change(docs_client):
+    assert docs_client.get("/doc/some-project/latest/index.html", headers={"Accept-Encoding": "identity"}).content == PAGE
+
+    version_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0"
+    version_folder.mkdir()
+    (version_folder / "index.html").write_bytes(b"<h1>Version 2</h1>")
+    create_symlink(version_folder, docat.DOCAT_UPLOAD_FOLDER / "some-project" / "latest")
+    docat.get_catalog().shared_generation.increment()
+
+    assert docs_client.get("/doc/some-project/latest/index.html").content == b"<h1>Version 2</h1>"
+
+
+def test_missing_file(docs_client):
+    assert docs_client.get("/doc/some-project/1.0.0/missing.html").status_code == 404
+    assert docs_client.get("/doc/some-project/..%2F..%2Fcatalog.json").status_code == 404
+
+
+def test_small_files_are_served_from_memory(docs_client):
+    file_cache = docs_client.app.routes[0].app.file_cache
+    index_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html"
+
+    for _ in range(3):
+        response = docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "identity"})
+        assert response.content == PAGE
+        assert response.headers["content-length"] == str(len(PAGE))
+        assert response.headers["cache-control"] == REVALIDATE
+    assert (file_cache.hits, file_cache.misses, file_cache.size) == (2, 1, len(PAGE))
+
+    # a replaced file does not match the cached content
+    index_path.write_bytes(b"<h1>Replaced</h1>")
+    assert docs_client.get("/doc/some-project/1.0.0/index.html", headers={"Accept-Encoding": "identity"}).content == b"<h1>Replaced</h1>"
+
+    # changes of the documentation clear the cache
+    docat.get_catalog().shared_generation.increment()
+    docs_client.get("/doc/some-project/latest/index.html", headers={"Accept-Encoding": "identity"})
+    assert file_cache.size == len(b"<h1>Replaced</h1>")
+
+
+def test_file_cache_is_limited_by_size(tmp_path):
+    file_cache = FileCache(max_bytes=10, max_file_size=8)
+    for name, content in [("a", b"12345"), ("b", b"12345"), ("c", b"123456789")]:
+        (tmp_path / name).write_bytes(content)
+        stat_result = (tmp_path / name).stat()
+        file_cache.load((str(tmp_path / name), stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size))
+
+    assert file_cache.size == 10
+    assert [key[0] for key in file_cache._entries] == [str(tmp_path / "a"), str(tmp_path / "b")]
+
+    (tmp_path / "d").write_bytes(b"1")
+    stat_result = (tmp_path / "d").stat()
+    file_cache.load((str(tmp_path / "d"), stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size))
+    assert [key[0] for key in file_cache._entries] == [str(tmp_path / "b"), str(tmp_path / "d")]
@@ -0,0 +1,16 @@
+from docat.generation import SharedGeneration, open_generation
+
+
+def test_shared_generation_is_visible_to_other_mappings(tmp_path):
+    first = SharedGeneration(tmp_path / "catalog.generation")
+    second = SharedGeneration(tmp_path / "catalog.generation")
+    assert first.value() == second.value() == 0
+
+    assert first.increment() == 1
+    assert second.value() == 1
+    assert second.increment() == 2
+    assert first.value() == 2
+
+
+def test_open_generation_maps_a_file_once(tmp_path):
+    assert open_generation(tmp_path / "catalog.generation") is open_generation(tmp_path / "catalog.generation")
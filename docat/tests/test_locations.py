@@ -0,0 +1,76 @@
+import sys
+import time
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.locations import Reloader, render_locations
+
+
+def test_render_locations(tmp_path):
+    entry = {"versions": {"1.0.0": {}, "bad version;": {}}, "tags": {"stable": "1.0.0"}}
+    locations = render_locations("some-project", entry, tmp_path)
+
+    assert "location /doc/some-project/ {" in locations
+    assert f"    root {tmp_path};" in locations
+    assert "    location /doc/some-project/1.0.0/ {\n        expires 1m;\n    }" in locations
+    assert "    location /doc/some-project/stable/ {\n        expires 1m;\n    }" in locations
+    assert "bad version" not in locations
+
+
+def test_render_locations_of_immutable_versions(tmp_path):
+    entry = {"versions": {"1.0.0": {}, "latest": {}}, "tags": {"stable": "1.0.0"}}
+    locations = render_locations("some-project", entry, tmp_path, immutable_versions=True)
+
+    assert "    location /doc/some-project/1.0.0/ {\n        expires max;\n    }" in locations
+    assert "    location /doc/some-project/latest/ {\n        expires 1m;\n    }" in locations
+    assert "    location /doc/some-project/stable/ {\n        expires 1m;\n    }" in locations
+
+
+def test_locations_follow_changes(client_with_claimed_project, upload):
+    client = client_with_claimed_project
+    locations_path = docat.DOCAT_NGINX_CONFIG_PATH
+
+    with patch("docat.app.DOCAT_NGINX_LOCATIONS", True), patch.object(docat.nginx_reloader, "request") as request_mock:
+        upload("some-project", "1.0.0")
+        assert "location /doc/some-project/1.0.0/ {" in (locations_path / "some-project-doc.conf").read_text()
+        assert len(request_mock.mock_calls) == 1
+
+        assert client.put("/api/some-project/1.0.0/tags/stable").status_code == 201
+        assert "location /doc/some-project/stable/ {" in (locations_path / "some-project-doc.conf").read_text()
+        assert len(request_mock.mock_calls) == 2
+
+        # unchanged locations do not reload nginx
+        assert client.post("/api/some-project/1.0.0/hide", headers={"Docat-Api-Key": "1234"}).status_code == 200
+        assert len(request_mock.mock_calls) == 2
+
+        assert client.put("/api/some-project/rename/renamed", headers={"Docat-Api-Key": "1234"}).status_code == 200
+        assert not (locations_path / "some-project-doc.conf").exists()
+        assert "location /doc/renamed/1.0.0/ {" in (locations_path / "renamed-doc.conf").read_text()
+
+        assert client.delete("/api/renamed/1.0.0", headers={"Docat-Api-Key": "1234"}).status_code == 200
+        assert not (locations_path / "renamed-doc.conf").exists()
+        assert len(request_mock.mock_calls) == 5
+
+
+def test_locations_are_disabled_by_default(upload):
+    upload("some-project", "1.0.0")
+    assert not docat.DOCAT_NGINX_CONFIG_PATH.exists()
+
+
+def test_reloads_are_debounced(tmp_path):
+    reloads = tmp_path / "reloads"
+    reloader = Reloader(0.1, (sys.executable, "-c", f"open({str(reloads)!r}, 'a').write('reload\\n')"))
+    reloader.start()
+    try:
+        for _ in range(5):
+            reloader.request()
+            time.sleep(0.01)
+
+        deadline = time.monotonic() + 5
+        while not reloads.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+    finally:
+        reloader.stop()
+
+    assert reloads.read_text() == "reload\n"
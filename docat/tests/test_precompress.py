@@ -0,0 +1,71 @@
+import gzip
+import io
+import zipfile
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.models import VersionSize
+from docat.precompress import precompress_tree
+from docat.utils import measure_dir
+
+LARGE_HTML = b"<p>Hello World</p>" * 200
+
+
+def test_upload_writes_compressed_siblings(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zipf:
+        zipf.writestr("index.html", LARGE_HTML)
+        zipf.writestr("small.html", b"<h1>Hello</h1>")
+        zipf.writestr("logo.png", LARGE_HTML)
+    archive.seek(0)
+
+    with patch("docat.app.DOCAT_PRECOMPRESS", True):
+        response = client.post("/api/some-project/1.0.0", files={"file": ("docs.zip", archive, "application/zip")})
+        assert response.status_code == 201
+
+    version_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    assert gzip.decompress((version_path / "index.html.gz").read_bytes()) == LARGE_HTML
+    assert not (version_path / "small.html.gz").exists()
+    assert not (version_path / "logo.png.gz").exists()
+
+    sidecar_size = (version_path / "index.html.gz").stat().st_size
+    response = client.get("/api/stats")
+    assert response.json()["storage"] == "7 KB"
+    assert response.json()["sidecar_storage"] == f"{sidecar_size} bytes"
+
+
+def test_measure_dir_counts_siblings_separately(tmp_path):
+    (tmp_path / "index.html").write_bytes(LARGE_HTML)
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "search.js").write_bytes(LARGE_HTML)
+    (tmp_path / "archive.gz").write_bytes(b"not a sibling")
+
+    sidecars = precompress_tree(tmp_path, 1024, workers=2)
+
+    assert sidecars == (tmp_path / "index.html.gz").stat().st_size + (tmp_path / "nested" / "search.js.gz").stat().st_size
+    assert measure_dir(tmp_path) == VersionSize(size=2 * len(LARGE_HTML) + 13, files=3, sidecars=sidecars)
+
+
+def test_uploaded_compressed_files_are_kept_and_counted_as_documentation(client):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zipf:
+        zipf.writestr("index.html", LARGE_HTML)
+        zipf.writestr("data.json", LARGE_HTML)
+        zipf.writestr("data.json.gz", b"uploaded")
+    archive.seek(0)
+
+    with patch("docat.app.DOCAT_PRECOMPRESS", True):
+        response = client.post("/api/some-project/1.0.0", files={"file": ("docs.zip", archive, "application/zip")})
+        assert response.status_code == 201
+
+    version_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    assert (version_path / "data.json.gz").read_bytes() == b"uploaded"
+    sidecar_size = (version_path / "index.html.gz").stat().st_size
+    stats = client.get("/api/stats").json()
+    assert stats["sidecar_storage"] == f"{sidecar_size} bytes"
+
+    # a rebuild measures the version the same way as the upload
+    (version_path / ".size").unlink()
+    docat.get_catalog().rebuild()
+    assert client.get("/api/stats").json() == stats
+    assert measure_dir(version_path) == VersionSize(size=2 * len(LARGE_HTML) + 8, files=3, sidecars=sidecar_size)
@@ -1,13 +1,16 @@
 import io
+import os
 from datetime import datetime
 from unittest.mock import patch
 
 import httpx
+import pytest
 from fastapi.testclient import TestClient
 
 import docat.app as docat
+from docat.catalog import _sort_versions
 from docat.models import ProjectDetail, ProjectVersion
-from docat.utils import get_project_details
+from docat.utils import create_symlink
 
 client = TestClient(docat.app)
 
@@ -87,7 +90,7 @@ def test_get_project_details_with_hidden_versions(_, client_with_claimed_project
     assert create_response.status_code == 201
 
     # check detected before hiding
-    details = get_project_details(docat.DOCAT_UPLOAD_FOLDER, "some-project", include_hidden=True)
+    details = docat.get_catalog().get_project_details("some-project", include_hidden=True)
     assert details == ProjectDetail(
         name="some-project",
         storage="20 bytes",
@@ -100,7 +103,7 @@ def test_get_project_details_with_hidden_versions(_, client_with_claimed_project
     assert hide_response.json() == {"message": "Version 1.0.0 is now hidden"}
 
     # check hidden
-    details = get_project_details(docat.DOCAT_UPLOAD_FOLDER, "some-project", include_hidden=True)
+    details = docat.get_catalog().get_project_details("some-project", include_hidden=True)
     assert details == ProjectDetail(
         name="some-project",
         storage="20 bytes",
@@ -120,7 +123,7 @@ def test_project_details_without_hidden_versions(_, client_with_claimed_project)
     assert create_response.status_code == 201
 
     # check detected before hiding
-    details = get_project_details(docat.DOCAT_UPLOAD_FOLDER, "some-project", include_hidden=False)
+    details = docat.get_catalog().get_project_details("some-project", include_hidden=False)
     assert details == ProjectDetail(
         name="some-project",
         storage="20 bytes",
@@ -133,7 +136,7 @@ def test_project_details_without_hidden_versions(_, client_with_claimed_project)
     assert hide_response.json() == {"message": "Version 1.0.0 is now hidden"}
 
     # check hidden
-    details = get_project_details(docat.DOCAT_UPLOAD_FOLDER, "some-project", include_hidden=False)
+    details = docat.get_catalog().get_project_details("some-project", include_hidden=False)
     assert details == ProjectDetail(name="some-project", storage="20 bytes", versions=[])
 
 
@@ -252,3 +255,150 @@ def test_include_hidden_parameter_for_get_project_details(_, client_with_claimed
         "storage": "20 bytes",
         "versions": [{"name": "1.0.0", "timestamp": "2000-01-01T01:01:00", "tags": [], "hidden": True}],
     }
+
+
+def test_projects_are_not_modified_until_a_change(client_with_claimed_project):
+    create_response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert create_response.status_code == 201
+
+    for url in ["/api/projects", "/api/projects/some-project"]:
+        response = client_with_claimed_project.get(url)
+        assert response.status_code == 200
+        assert response.headers["Cache-Control"] == "no-cache"
+        etag = response.headers["ETag"]
+
+        with (
+            patch("docat.catalog.Catalog.get_all_projects") as projects_mock,
+            patch("docat.catalog.Catalog.get_project_details") as details_mock,
+        ):
+            response = client_with_claimed_project.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.headers["ETag"] == etag
+            assert response.content == b""
+            assert projects_mock.mock_calls == []
+            assert details_mock.mock_calls == []
+
+        hide_response = client_with_claimed_project.post("/api/some-project/1.0.0/hide", headers={"Docat-Api-Key": "1234"})
+        assert hide_response.status_code == 200
+
+        response = client_with_claimed_project.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+        show_response = client_with_claimed_project.post("/api/some-project/1.0.0/show", headers={"Docat-Api-Key": "1234"})
+        assert show_response.status_code == 200
+
+
+def test_missing_project_is_not_answered_as_not_modified(client):
+    response = client.get("/api/projects/i-do-not-exist", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+    assert response.json() == {"message": "Project i-do-not-exist does not exist"}
+
+
+def test_etag_changes_when_catalog_is_rebuilt(client):
+    create_response = client.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert create_response.status_code == 201
+
+    response = client.get("/api/projects")
+    etag = response.headers["ETag"]
+
+    docat.get_catalog().rebuild()
+
+    response = client.get("/api/projects", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_projects_are_paginated_and_filtered(client):
+    for project in ["alpha", "alpha-docs", "beta", "gamma"]:
+        for version in ["1.0.0", "2.0.0"]:
+            create_response = client.post(
+                f"/api/{project}/{version}", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+            )
+            assert create_response.status_code == 201
+
+    response = client.get("/api/projects")
+    assert "next_cursor" not in response.json()
+    assert [p["name"] for p in response.json()["projects"]] == ["alpha", "alpha-docs", "beta", "gamma"]
+
+    names = []
+    cursor = None
+    while True:
+        response = client.get("/api/projects", params={"limit": 3, "cursor": cursor} if cursor else {"limit": 3})
+        assert response.status_code == 200
+        names.append([p["name"] for p in response.json()["projects"]])
+        cursor = response.json().get("next_cursor")
+        if cursor is None:
+            break
+    assert names == [["alpha", "alpha-docs", "beta"], ["gamma"]]
+
+    response = client.get("/api/projects", params={"prefix": "alpha", "limit": 1})
+    assert [p["name"] for p in response.json()["projects"]] == ["alpha"]
+    response = client.get("/api/projects", params={"prefix": "alpha", "limit": 1, "cursor": response.json()["next_cursor"]})
+    assert [p["name"] for p in response.json()["projects"]] == ["alpha-docs"]
+    assert "next_cursor" not in response.json()
+
+    response = client.get("/api/projects", params={"search": "A-D"})
+    assert [p["name"] for p in response.json()["projects"]] == ["alpha-docs"]
+
+    response = client.get("/api/projects", params={"versions": 1})
+    assert [[v["name"] for v in p["versions"]] for p in response.json()["projects"]] == [["2.0.0"]] * 4
+
+    response = client.get("/api/projects", params={"versions": 0})
+    assert [p["versions"] for p in response.json()["projects"]] == [[]] * 4
+
+    response = client.get("/api/projects", params={"limit": 0})
+    assert response.status_code == 422
+
+
+def test_pagination_skips_projects_without_visible_versions(client_with_claimed_project):
+    for project in ["a-project", "some-project", "z-project"]:
+        create_response = client_with_claimed_project.post(
+            f"/api/{project}/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+        )
+        assert create_response.status_code == 201
+    hide_response = client_with_claimed_project.post("/api/some-project/1.0.0/hide", headers={"Docat-Api-Key": "1234"})
+    assert hide_response.status_code == 200
+
+    response = client_with_claimed_project.get("/api/projects", params={"limit": 1})
+    assert response.json()["next_cursor"] == "a-project"
+
+    response = client_with_claimed_project.get("/api/projects", params={"limit": 1, "cursor": "a-project"})
+    assert [p["name"] for p in response.json()["projects"]] == ["z-project"]
+    assert "next_cursor" not in response.json()
+
+
+@pytest.mark.parametrize(("n_versions", "n_tags"), [(30, 5), (300, 50)])
+def test_listing_cost_grows_linearly(n_versions, n_tags):
+    """
+    Every tag is read with a single readlink and the versions are sorted once,
+    independent of the number of versions.
+    """
+    docs_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project"
+    for i in range(n_versions):
+        (docs_folder / f"1.{i}.0").mkdir(parents=True)
+    for i in range(n_tags):
+        create_symlink(f"1.{i}.0", docs_folder / f"branch-{i}")
+
+    with (
+        patch("os.readlink", wraps=os.readlink) as readlink_mock,
+        patch("pathlib.Path.resolve", autospec=True) as resolve_mock,
+        patch("docat.catalog._sort_versions", wraps=_sort_versions) as sort_mock,
+    ):
+        docat.get_catalog().rebuild()
+
+        assert readlink_mock.call_count == n_tags
+        assert resolve_mock.call_count == 0
+        assert sort_mock.call_count == 1
+
+        details = docat.get_catalog().get_project_details("some-project", include_hidden=True)
+        assert sort_mock.call_count == 1
+
+    assert details is not None
+    assert len(details.versions) == n_versions
+    assert details.versions[-1].tags == ["branch-0"]
+    assert sum(len(v.tags) for v in details.versions) == n_tags
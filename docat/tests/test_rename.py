@@ -2,8 +2,6 @@ import io
 from pathlib import Path
 from unittest.mock import call, patch
 
-from tinydb import Query
-
 import docat.app as docat
 
 
@@ -35,6 +33,22 @@ def test_rename_fail_new_project_name_already_used(client_with_claimed_project):
         assert rename_mock.mock_calls == []
 
 
+def test_rename_fail_new_project_name_already_claimed(client_with_claimed_project):
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+    assert client_with_claimed_project.get("/api/other-project/claim").status_code == 201
+
+    # the claim outlives the deleted documentation of other-project
+    rename_response = client_with_claimed_project.put("/api/some-project/rename/other-project", headers={"Docat-Api-Key": "1234"})
+    assert rename_response.status_code == 409
+    assert rename_response.json() == {"message": "New project name other-project is already claimed"}
+
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project").exists()
+    assert docat.get_db().get("some-project") is not None
+
+
 def test_rename_not_authenticated(client_with_claimed_project):
     with patch("os.rename") as rename_mock:
         create_project_response = client_with_claimed_project.post(
@@ -66,12 +80,9 @@ def test_rename_success(client_with_claimed_project):
         new_path = docat.DOCAT_UPLOAD_FOLDER / Path("new-project-name")
         assert rename_mock.mock_calls == [call(old_path, new_path)]
 
-        Project = Query()
-        table = docat.db.table("claims")
-        claims_with_old_name = table.search(Project.name == "some-project")
-        assert len(claims_with_old_name) == 0
-        claims_with_new_name = table.search(Project.name == "new-project-name")
-        assert len(claims_with_new_name) == 1
+        db = docat.get_db()
+        assert db.get("some-project") is None
+        assert db.get("new-project-name") is not None
 
 
 def test_rename_rejects_forbidden_project_name(client_with_claimed_project):
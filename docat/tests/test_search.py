@@ -0,0 +1,96 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from docat.search import extract_text, match_query
+
+
+@pytest.fixture
+def search_enabled():
+    with patch("docat.app.DOCAT_SEARCH_INDEX", True):
+        yield
+
+
+def search(client, q, **params):
+    response = client.get("/api/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.usefixtures("search_enabled")
+def test_search_finds_pages_of_the_latest_version(client_with_claimed_project, upload):
+    client = client_with_claimed_project
+    upload("some-project", "1.0.0", {"index.html": "<title>Install</title><p>Installing the frobnicator</p>"})
+    upload("some-project", "2.0.0", {"index.html": "<title>Setup</title><p>Setting up the frobnicator</p>"})
+
+    result = search(client, "frobnicator")
+    assert result == {
+        "results": [
+            {"project": "some-project", "version": "2.0.0", "path": "index.html", "title": "Setup", "snippet": "Setting up the frobnicator"}
+        ]
+    }
+
+    # the latest tag decides which version is searched
+    response = client.put("/api/some-project/1.0.0/tags/latest")
+    assert response.status_code == 201
+    assert [r["version"] for r in search(client, "frobnicator")["results"]] == ["1.0.0"]
+
+    response = client.delete("/api/some-project/1.0.0", headers={"Docat-Api-Key": "1234"})
+    assert response.status_code == 200
+    assert [r["version"] for r in search(client, "frobnicator")["results"]] == ["2.0.0"]
+
+    response = client.put("/api/some-project/rename/other-project", headers={"Docat-Api-Key": "1234"})
+    assert response.status_code == 200
+    assert [r["project"] for r in search(client, "frobnicator")["results"]] == ["other-project"]
+
+    response = client.post("/api/other-project/2.0.0/hide", headers={"Docat-Api-Key": "1234"})
+    assert response.status_code == 200
+    assert search(client, "frobnicator") == {"results": []}
+
+
+@pytest.mark.usefixtures("search_enabled")
+def test_failing_search_index_does_not_fail_changes(client_with_claimed_project, upload):
+    client = client_with_claimed_project
+    upload("some-project", "1.0.0", {"index.html": "<p>frobnicator</p>"})
+    upload("some-project", "2.0.0", {"index.html": "<p>frobnicator</p>"})
+
+    with (
+        patch("docat.search.SearchIndex.remove", side_effect=sqlite3.OperationalError("database is locked")),
+        patch("docat.search.SearchIndex.rename_project", side_effect=sqlite3.OperationalError("database is locked")),
+    ):
+        response = client.delete("/api/some-project/1.0.0", headers={"Docat-Api-Key": "1234"})
+        assert response.status_code == 200
+        response = client.put("/api/some-project/rename/other-project", headers={"Docat-Api-Key": "1234"})
+        assert response.status_code == 200
+
+
+@pytest.mark.usefixtures("search_enabled")
+def test_search_ranks_and_paginates(client, upload):
+    upload("project-a", "1.0.0", {"index.html": "<p>widgets</p>", "guide/widgets.html": "<title>Widgets</title><p>More widgets</p>"})
+    upload("project-b", "1.0.0", {"index.html": "<script>var widgets</script><p>Nothing to see</p>"})
+
+    result = search(client, "widg", limit=1)
+    assert [(r["project"], r["path"]) for r in result["results"]] == [("project-a", "guide/widgets.html")]
+    assert result["next_offset"] == 1
+
+    result = search(client, "widg", limit=1, offset=1)
+    assert [(r["project"], r["path"]) for r in result["results"]] == [("project-a", "index.html")]
+    assert "next_offset" not in result
+
+
+def test_search_without_index(client, upload):
+    upload("some-project", "1.0.0", {"index.html": "<p>frobnicator</p>"})
+    assert search(client, "frobnicator") == {"results": []}
+
+
+def test_extract_text():
+    html = (
+        "<html><head><title>The  Title</title><style>p {}</style></head><body><p>Some&amp;text</p>\n<script>code()</script></body></html>"
+    )
+    assert extract_text(html) == ("The Title", "Some&text")
+
+
+def test_match_query():
+    assert match_query('"unbalanced AND') == '"unbalanced" "AND"*'
+    assert match_query("  ") is None
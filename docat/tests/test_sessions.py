@@ -0,0 +1,137 @@
+import fcntl
+import hashlib
+import io
+import os
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.sessions import UploadSessions
+
+
+def create_session(client, archive: bytes, project="some-project", version="1.0.0", **kwargs):
+    response = client.post(f"/api/{project}/{version}/uploads", json={"filename": "docs.zip", "size": len(archive), **kwargs})
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+def put_chunk(client, session_id: str, archive: bytes, start: int, end: int, **headers):
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(archive)}"
+    return client.put(f"/api/uploads/{session_id}", content=archive[start:end], headers=headers)
+
+
+def test_chunked_upload_is_resumed(client, make_zip):
+    archive = make_zip({"index.html": b"<h1>Hello World</h1>" * 100}).getvalue()
+    middle = len(archive) // 2
+    session_id = create_session(client, archive)
+
+    response = put_chunk(client, session_id, archive, 0, middle)
+    assert response.status_code == 200
+    assert response.json() == {"offset": middle}
+
+    # a chunk which was sent again is refused with the offset to continue at
+    response = put_chunk(client, session_id, archive, 0, middle)
+    assert response.status_code == 409
+    assert response.json() == {"offset": middle}
+
+    response = client.get(f"/api/uploads/{session_id}")
+    assert response.status_code == 200
+    assert response.json()["offset"] == middle
+
+    assert put_chunk(client, session_id, archive, middle, len(archive)).json() == {"offset": len(archive)}
+
+    response = client.post(f"/api/uploads/{session_id}/finalize")
+    assert response.status_code == 201
+    assert response.json() == {"message": "Documentation uploaded successfully"}
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>Hello World</h1>" * 100
+    assert client.get("/api/projects/some-project").json()["versions"][0]["name"] == "1.0.0"
+
+    assert client.get(f"/api/uploads/{session_id}").status_code == 404
+    assert list(docat.DOCAT_STAGING_FOLDER.iterdir()) == []
+
+
+def test_checksums_are_verified(client, make_zip):
+    archive = make_zip({"index.html": b"<h1>Hello World</h1>"}).getvalue()
+    session_id = create_session(client, archive, sha256="0" * 64)
+
+    response = put_chunk(client, session_id, archive, 0, len(archive), **{"Docat-Chunk-Sha256": "0" * 64})
+    assert response.status_code == 400
+    assert response.json() == {"message": "Chunk does not match its checksum"}
+    # the refused chunk was streamed to disk and is removed again
+    assert client.get(f"/api/uploads/{session_id}").json()["offset"] == 0
+
+    response = put_chunk(client, session_id, archive, 0, len(archive), **{"Docat-Chunk-Sha256": hashlib.sha256(archive).hexdigest()})
+    assert response.status_code == 200
+
+    response = client.post(f"/api/uploads/{session_id}/finalize")
+    assert response.status_code == 400
+    assert client.get(f"/api/uploads/{session_id}").status_code == 404
+    assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project").exists()
+
+
+def test_invalid_chunks(client, make_zip):
+    archive = make_zip({"index.html": b"<h1>Hello World</h1>"}).getvalue()
+    session_id = create_session(client, archive)
+
+    response = client.put(f"/api/uploads/{session_id}", content=archive[:10], headers={"Content-Range": "bytes 0-19/10"})
+    assert response.status_code == 400
+    response = client.put(f"/api/uploads/{session_id}", content=archive[:10], headers={"Content-Range": f"bytes 0-19/{len(archive)}"})
+    assert response.status_code == 400
+
+    response = client.post(f"/api/uploads/{session_id}/finalize")
+    assert response.status_code == 409
+    assert response.json() == {"message": f"Upload is incomplete, received 0 of {len(archive)} bytes"}
+
+    with patch("docat.app.DOCAT_UPLOAD_MAX_CHUNK_SIZE", 10):
+        response = put_chunk(client, session_id, archive, 0, 20)
+        assert response.status_code == 413
+        assert response.json() == {"message": "Chunks are limited to 10 bytes"}
+
+    assert client.get("/api/uploads/unknown").status_code == 404
+    assert put_chunk(client, "0" * 32, archive, 0, len(archive)).status_code == 404
+
+
+def test_chunks_of_a_session_are_written_one_at_a_time(client, make_zip):
+    archive = make_zip({"index.html": b"<h1>Hello World</h1>"}).getvalue()
+    session_id = create_session(client, archive)
+
+    with (docat.DOCAT_SESSIONS_FOLDER / f"{session_id}.part").open("r+b") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        response = put_chunk(client, session_id, archive, 0, len(archive))
+        assert response.status_code == 409
+        assert response.json() == {"offset": 0}
+
+    assert put_chunk(client, session_id, archive, 0, len(archive)).json() == {"offset": len(archive)}
+
+
+def test_claimed_version_needs_token(client_with_claimed_project, make_zip):
+    client = client_with_claimed_project
+    archive = make_zip({"index.html": b"<h1>Hello World</h1>"}).getvalue()
+    response = client.post("/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")})
+    assert response.status_code == 201
+
+    response = client.post("/api/some-project/1.0.0/uploads", json={"filename": "docs.zip", "size": len(archive)})
+    assert response.status_code == 401
+
+    response = client.post(
+        "/api/some-project/1.0.0/uploads", json={"filename": "docs.zip", "size": len(archive)}, headers={"Docat-Api-Key": "1234"}
+    )
+    assert response.status_code == 201
+    session_id = response.json()["id"]
+    assert put_chunk(client, session_id, archive, 0, len(archive)).status_code == 200
+
+    assert client.post(f"/api/uploads/{session_id}/finalize").status_code == 401
+    assert client.post(f"/api/uploads/{session_id}/finalize", headers={"Docat-Api-Key": "1234"}).status_code == 201
+
+
+def test_expired_sessions_are_collected(tmp_path):
+    trash = docat.get_trash()
+    sessions = UploadSessions(tmp_path / "sessions", ttl=60)
+    expired = sessions.create("some-project", "1.0.0", "docs.zip", 10, None)
+    active = sessions.create("some-project", "2.0.0", "docs.zip", 10, None)
+
+    for path in (tmp_path / "sessions").glob(f"{expired.id}.*"):
+        os.utime(path, (0, 0))
+
+    assert sessions.collect(trash) == 1
+    assert sessions.get(expired.id) is None
+    assert sessions.get(active.id) is not None
@@ -1,9 +1,13 @@
 import io
+import json
 from datetime import datetime
 from unittest.mock import patch
 
 import pytest
 
+import docat.app as docat
+from docat.utils import version_signature
+
 
 @patch("docat.utils.get_version_timestamp", return_value=datetime(2000, 1, 1, 1, 1, 0))
 @pytest.mark.parametrize(
@@ -30,4 +34,97 @@ def test_get_stats(_, project_config, n_projects, n_versions, storage, client_wi
     # get system stats
     hide_response = client_with_claimed_project.get("/api/stats")
     assert hide_response.status_code == 200
-    assert hide_response.json() == {"n_projects": n_projects, "n_versions": n_versions, "storage": storage}
+    assert hide_response.json() == {
+        "n_projects": n_projects,
+        "n_versions": n_versions,
+        "storage": storage,
+        "sidecar_storage": "0 bytes",
+        "physical_storage": storage,
+    }
+
+
+def test_stats_are_rolled_up_incrementally(client_with_claimed_project):
+    """
+    Make sure that stats follow uploads and deletes without walking the upload folder.
+    """
+    for version, content in [("1.0.0", b"<h1>Hello World</h1>"), ("2.0.0", b"<h1>Hello</h1>")]:
+        create_response = client_with_claimed_project.post(
+            f"/api/some-project/{version}", files={"file": ("index.html", io.BytesIO(content), "plain/text")}
+        )
+        assert create_response.status_code == 201
+
+    version_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    assert json.loads((version_folder / ".size").read_text()) == {
+        "size": 20,
+        "files": 1,
+        "linked": 0,
+        "sidecars": 0,
+        "signature": version_signature(version_folder),
+    }
+
+    with patch("docat.utils.measure_dir") as measure_dir_mock:
+        stats_response = client_with_claimed_project.get("/api/stats")
+        assert stats_response.json() == {
+            "n_projects": 1,
+            "n_versions": 2,
+            "storage": "34 bytes",
+            "sidecar_storage": "0 bytes",
+            "physical_storage": "34 bytes",
+        }
+
+        delete_response = client_with_claimed_project.delete("/api/some-project/2.0.0", headers={"Docat-Api-Key": "1234"})
+        assert delete_response.status_code == 200
+
+        rename_response = client_with_claimed_project.put("/api/some-project/rename/other-project", headers={"Docat-Api-Key": "1234"})
+        assert rename_response.status_code == 200
+
+        stats_response = client_with_claimed_project.get("/api/stats")
+        assert stats_response.json() == {
+            "n_projects": 1,
+            "n_versions": 1,
+            "storage": "20 bytes",
+            "sidecar_storage": "0 bytes",
+            "physical_storage": "20 bytes",
+        }
+
+        assert measure_dir_mock.mock_calls == []
+
+
+def test_stats_are_not_modified_until_a_change(client_with_claimed_project):
+    for version in ["1.0.0", "2.0.0"]:
+        create_response = client_with_claimed_project.post(
+            f"/api/some-project/{version}", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+        )
+        assert create_response.status_code == 201
+
+        response = client_with_claimed_project.get("/api/stats")
+        etag = response.headers["ETag"]
+
+        response = client_with_claimed_project.get("/api/stats", headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert response.status_code == 304
+
+    delete_response = client_with_claimed_project.delete("/api/some-project/2.0.0", headers={"Docat-Api-Key": "1234"})
+    assert delete_response.status_code == 200
+
+    response = client_with_claimed_project.get("/api/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["n_versions"] == 1
+
+
+def test_uploaded_size_matches_a_rebuild(client, upload):
+    upload(
+        "some-project",
+        "1.0.0",
+        {
+            "index.html": b"<h1>Hello World</h1>",
+            "./index.html": b"<h1>Hello</h1>",
+            ".manifest": b"{}",
+            "nested/.size": b"{}",
+            ".sidecars": b"[]",
+        },
+    )
+    uploaded = client.get("/api/stats").json()
+    assert uploaded["storage"] == "14 bytes"
+
+    docat.get_catalog().rebuild()
+    assert client.get("/api/stats").json() == uploaded
@@ -0,0 +1,109 @@
+import io
+import os
+import threading
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.trash import Reaper, Trash, remove_tree
+from docat.utils import remove_docs
+
+
+def test_delete_moves_version_into_trash(client_with_claimed_project):
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+
+    with patch("shutil.rmtree") as rmtree_mock:
+        response = client_with_claimed_project.delete("/api/some-project/1.0.0", headers={"Docat-Api-Key": "1234"})
+        assert response.status_code == 200
+        assert rmtree_mock.mock_calls == []
+
+    assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project").exists()
+
+    metrics_response = client_with_claimed_project.get("/api/metrics")
+    assert metrics_response.status_code == 200
+    assert metrics_response.json()["trash_queue_depth"] == 1
+
+
+def test_override_moves_previous_version_into_trash(client_with_claimed_project):
+    for _ in range(2):
+        response = client_with_claimed_project.post(
+            "/api/some-project/1.0.0",
+            files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")},
+            headers={"Docat-Api-Key": "1234"},
+        )
+        assert response.status_code == 201
+
+    assert docat.get_trash().depth() == 1
+
+
+def test_empty_trash(temp_project_version):
+    docs = temp_project_version("project", "1.0")
+    (docs / "project" / "1.0" / "nested").mkdir()
+    (docs / "project" / "1.0" / "nested" / "page.html").touch()
+    trash = docat.get_trash()
+
+    remove_docs("project", "1.0", docs, trash)
+    assert trash.depth() == 1
+
+    trash.empty(0, threading.Event())
+    assert trash.depth() == 0
+
+
+def test_remove_tree_stops_when_throttled(tmp_path):
+    for i in range(10):
+        (tmp_path / f"{i}.html").touch()
+
+    stop = threading.Event()
+    stop.set()
+
+    # one file per second would require waiting, which is interrupted by stop
+    assert not remove_tree(tmp_path, 1, stop)
+    assert tmp_path.exists()
+
+    assert remove_tree(tmp_path, 0, threading.Event())
+    assert not tmp_path.exists()
+
+
+def test_reaper_empties_trash(tmp_path):
+    (tmp_path / "version").mkdir()
+    (tmp_path / "version" / "index.html").touch()
+    trash = Trash(tmp_path / "trash")
+    trash.put(tmp_path / "version")
+
+    reaper = Reaper(trash, 0, interval=0.01)
+    reaper.start()
+    try:
+        for _ in range(100):
+            if trash.depth() == 0:
+                break
+            threading.Event().wait(0.01)
+    finally:
+        reaper.stop()
+
+    assert trash.depth() == 0
+
+
+def test_reaper_trashes_abandoned_staging_folders_on_startup(tmp_path):
+    staging_path = tmp_path / "staging"
+    for name in ["abandoned", "extracting"]:
+        (staging_path / name).mkdir(parents=True)
+        (staging_path / name / "index.html").touch()
+    os.utime(staging_path / "abandoned", (0, 0))
+    trash = Trash(tmp_path / "trash")
+
+    # the first pass runs right away, not after the interval
+    reaper = Reaper(trash, 0, interval=60, staging_path=staging_path, staging_ttl=3600)
+    reaper.start()
+    try:
+        for _ in range(100):
+            if not (staging_path / "abandoned").exists():
+                break
+            threading.Event().wait(0.01)
+    finally:
+        reaper.stop()
+
+    assert [path.name for path in staging_path.iterdir()] == ["extracting"]
+    assert trash.collect(staging_path, 3600) == 0
+    assert trash.collect(tmp_path / "missing", 3600) == 0
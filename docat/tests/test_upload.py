@@ -1,7 +1,11 @@
 import io
+import os
+import tarfile
 from pathlib import Path
 from unittest.mock import call, patch
 
+import pytest
+
 import docat.app as docat
 
 
@@ -24,14 +28,73 @@ def test_successfully_override(client_with_claimed_project):
 
         response = client_with_claimed_project.post(
             "/api/some-project/1.0.0",
-            files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")},
+            files={"file": ("index.html", io.BytesIO(b"<h1>Hello Override</h1>"), "plain/text")},
             headers={"Docat-Api-Key": "1234"},
         )
         response_data = response.json()
 
         assert response.status_code == 201
         assert response_data["message"] == "Documentation uploaded successfully"
-        assert remove_mock.mock_calls == [call("some-project", "1.0.0", docat.DOCAT_UPLOAD_FOLDER)]
+        assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>Hello Override</h1>"
+        # the previous version is swapped out instead of removed up front
+        assert remove_mock.mock_calls == []
+        assert list(docat.DOCAT_STAGING_FOLDER.iterdir()) == []
+
+
+def test_override_without_renameat2(client_with_claimed_project):
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+
+    with patch("docat.utils.exchange_paths", return_value=False):
+        response = client_with_claimed_project.post(
+            "/api/some-project/1.0.0",
+            files={"file": ("index.html", io.BytesIO(b"<h1>Hello Override</h1>"), "plain/text")},
+            headers={"Docat-Api-Key": "1234"},
+        )
+        assert response.status_code == 201
+
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>Hello Override</h1>"
+    assert list(docat.DOCAT_STAGING_FOLDER.iterdir()) == []
+
+
+def test_concurrent_first_upload_conflicts(client):
+    version_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    replace = os.replace
+
+    def upload_in_between(source, destination):
+        # another upload publishes the version after it was found to be missing
+        if destination == version_path and not version_path.exists():
+            version_path.mkdir(parents=True)
+            (version_path / "index.html").write_bytes(b"<h1>Other upload</h1>")
+        replace(source, destination)
+
+    with patch("os.replace", side_effect=upload_in_between):
+        response = client.post("/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")})
+    assert response.status_code == 409
+    assert response.json() == {"message": "Version was uploaded by another request at the same time."}
+
+    assert (version_path / "index.html").read_bytes() == b"<h1>Other upload</h1>"
+    assert list(docat.DOCAT_STAGING_FOLDER.iterdir()) == []
+
+
+def test_failed_override_keeps_previous_version(client_with_claimed_project):
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")}
+    )
+    assert response.status_code == 201
+
+    response = client_with_claimed_project.post(
+        "/api/some-project/1.0.0",
+        files={"file": ("docs.zip", io.BytesIO(b"not a zip file"), "application/zip")},
+        headers={"Docat-Api-Key": "1234"},
+    )
+    assert response.status_code == 400
+    assert response.json() == {"message": "Cannot extract zip file."}
+
+    assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html").read_bytes() == b"<h1>Hello World</h1>"
+    assert list(docat.DOCAT_STAGING_FOLDER.iterdir()) == []
 
 
 def test_tags_are_not_overwritten_without_api_key(client_with_claimed_project):
@@ -185,3 +248,67 @@ def test_upload_issues_warning_missing_index_file(client_with_claimed_project):
     assert response_data["message"] == "Documentation uploaded successfully, but no index.html found at root of archive."
     assert (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "some-other-file.html").exists()
     assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0" / "index.html").exists()
+
+
+def _tar_archive(compression, members):
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode=f"w:{compression}") as tar:
+        for name, content in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    archive.seek(0)
+    return archive
+
+
+@pytest.mark.parametrize(("filename", "compression"), [("docs.tar.gz", "gz"), ("docs.tgz", "gz"), ("docs.tar.xz", "xz"), ("docs.tar", "")])
+def test_successfully_upload_tar_archive(client, filename, compression):
+    archive = _tar_archive(compression, [("index.html", b"<h1>Hello World</h1>"), ("static/style.css", b"body {}")])
+
+    response = client.post("/api/some-project/1.0.0", files={"file": (filename, archive, "application/octet-stream")})
+
+    assert response.status_code == 201
+    assert response.json() == {"message": "Documentation uploaded successfully"}
+    version_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    assert (version_path / "index.html").read_bytes() == b"<h1>Hello World</h1>"
+    assert (version_path / "static" / "style.css").read_bytes() == b"body {}"
+    assert not (version_path / filename).exists()
+
+
+def _zstd_tar_archive(members):
+    if "zst" in tarfile.TarFile.OPEN_METH:
+        return _tar_archive("zst", members)
+    zstandard = pytest.importorskip("zstandard", reason="zstd needs python 3.14 or the zstandard package")
+    return io.BytesIO(zstandard.ZstdCompressor().compress(_tar_archive("", members).getvalue()))
+
+
+@pytest.mark.parametrize("filename", ["docs.tar.zst", "docs.tzst"])
+def test_successfully_upload_zstd_tar_archive(client, filename):
+    archive = _zstd_tar_archive([("index.html", b"<h1>Hello World</h1>"), ("static/style.css", b"body {}")])
+
+    response = client.post("/api/some-project/1.0.0", files={"file": (filename, archive, "application/octet-stream")})
+
+    assert response.status_code == 201
+    version_path = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    assert (version_path / "index.html").read_bytes() == b"<h1>Hello World</h1>"
+    assert (version_path / "static" / "style.css").read_bytes() == b"body {}"
+
+
+def test_zstd_tar_archive_without_zstd_support(client):
+    open_meth = {name: method for name, method in tarfile.TarFile.OPEN_METH.items() if name != "zst"}
+    with patch.object(tarfile.TarFile, "OPEN_METH", open_meth), patch.dict("sys.modules", {"zstandard": None}):
+        response = client.post("/api/some-project/1.0.0", files={"file": ("docs.tar.zst", io.BytesIO(b"zstd"), "application/octet-stream")})
+
+    assert response.status_code == 400
+    assert response.json() == {"message": "Cannot extract zip file."}
+    assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0").exists()
+
+
+def test_upload_tar_archive_rejects_paths_outside_version(client):
+    archive = _tar_archive("gz", [("index.html", b"<h1>Hello World</h1>"), ("../../escaped.html", b"<h1>Escaped</h1>")])
+
+    response = client.post("/api/some-project/1.0.0", files={"file": ("docs.tar.gz", archive, "application/octet-stream")})
+
+    assert response.status_code == 400
+    assert not (docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0").exists()
+    assert not list(docat.DOCAT_STORAGE_PATH.rglob("escaped.html"))
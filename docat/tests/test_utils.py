@@ -1,8 +1,14 @@
+import io
+import tempfile
+import warnings
 from pathlib import Path
 from unittest.mock import MagicMock, patch
+from zipfile import ZIP_DEFLATED, ZipFile
 
 import docat.app as docat
-from docat.utils import create_symlink, extract_archive, get_dir_size, remove_docs
+from docat.models import VersionSize
+from docat.utils import _extract_members, create_symlink, extract_archive, measure_dir, remove_docs
+from docat.versions import version_key
 
 
 def test_symlink_creation():
@@ -56,17 +62,32 @@ def test_symlink_creation_do_not_overwrite_destination():
 
 
 def test_archive_artifact():
-    target_file = Path("/some/zipfile.zip")
-    destination = "/tmp/null"
-    with patch.object(Path, "unlink") as mock_unlink, patch("docat.utils.ZipFile") as mock_zip:
+    archive = io.BytesIO()
+    destination = Path("/tmp/null")
+    with patch("docat.utils.ZipFile") as mock_zip:
         mock_zip_open = MagicMock()
         mock_zip.return_value.__enter__.return_value.extractall = mock_zip_open
 
-        extract_archive(target_file, destination)
+        extract_archive(archive, "zipfile.zip", destination)
 
-        mock_zip.assert_called_once_with(target_file, "r")
-        mock_zip_open.assert_called_once()
-        mock_unlink.assert_called_once()
+        mock_zip.assert_called_once_with(archive, "r")
+        mock_zip_open.assert_called_once_with(path=destination)
+
+
+def test_archive_extracted_without_copy(tmp_path):
+    """
+    The archive is read from the upload and only its members
+    are written to the destination.
+    """
+    archive = io.BytesIO()
+    with ZipFile(archive, "w", compression=ZIP_DEFLATED) as zipf:
+        zipf.writestr("index.html", "<h1>Hello World</h1>" * 100)
+        zipf.writestr("static/style.css", "body {}")
+
+    version_size = extract_archive(archive, "docs.zip", tmp_path)
+
+    assert version_size == VersionSize(size=2007, files=2)
+    assert sorted(str(p.relative_to(tmp_path)) for p in tmp_path.rglob("*") if p.is_file()) == ["index.html", "static/style.css"]
 
 
 def test_remove_version(temp_project_version):
@@ -94,4 +115,85 @@ def test_broken_symlinks_in_projects(temp_project_version):
 
     create_symlink(docs / project / "broken", docs / project / "latest")
 
-    get_dir_size(docs / project)
+    assert measure_dir(docs / project).files == 1
+
+
+def test_archive_extracted_in_parallel(tmp_path):
+    """
+    Extracting with multiple threads creates the same tree,
+    including members with windows path separators.
+    """
+    archive_path = tmp_path / "docs.zip"
+    with ZipFile(archive_path, "w", compression=ZIP_DEFLATED) as zipf:
+        zipf.writestr("index.html", "<h1>Hello World</h1>")
+        zipf.writestr("windows\\page.html", "<h1>Windows</h1>")
+        zipf.writestr("empty/", "")
+        for i in range(100):
+            zipf.writestr(f"pages/{i % 7}/page{i}.html", f"<h1>Page {i}</h1>")
+
+    destination = tmp_path / "docs"
+    destination.mkdir()
+    with archive_path.open("rb") as archive, patch.object(ZipFile, "extractall") as extractall_mock:
+        version_size = extract_archive(archive, "docs.zip", destination, workers=4)
+        assert extractall_mock.mock_calls == []
+
+    assert version_size.files == 102
+    assert (destination / "index.html").read_text() == "<h1>Hello World</h1>"
+    assert (destination / "windows" / "page.html").read_text() == "<h1>Windows</h1>"
+    assert (destination / "empty").is_dir()
+    assert (destination / "pages" / "3" / "page52.html").read_text() == "<h1>Page 52</h1>"
+    assert len([p for p in destination.rglob("*") if p.is_file()]) == 102
+
+
+def test_duplicate_members_extracted_in_parallel_keep_the_last(tmp_path):
+    archive_path = tmp_path / "docs.zip"
+    with ZipFile(archive_path, "w") as zipf, warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for i in range(100):
+            zipf.writestr("index.html", f"<h1>Version {i}</h1>")
+
+    destination = tmp_path / "docs"
+    destination.mkdir()
+    with archive_path.open("rb") as archive, patch("docat.utils._extract_members", wraps=_extract_members) as extract_mock:
+        extract_archive(archive, "docs.zip", destination, workers=4)
+
+    assert sum(len(c.args[1]) for c in extract_mock.mock_calls) == 1
+    assert (destination / "index.html").read_text() == "<h1>Version 99</h1>"
+
+
+def test_in_memory_upload_is_extracted_sequentially(tmp_path):
+    archive = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    with ZipFile(archive, "w") as zipf:
+        for i in range(100):
+            zipf.writestr(f"page{i}.html", f"<h1>Page {i}</h1>")
+    archive.seek(0)
+
+    with patch("docat.utils.extract_zip_parallel") as parallel_mock:
+        version_size = extract_archive(archive, "docs.zip", tmp_path, workers=4)
+
+    assert parallel_mock.mock_calls == []
+    assert not archive._rolled
+    assert version_size.files == 100
+
+
+def test_version_key():
+    versions = [
+        "main",
+        "nightly-9",
+        "nightly-10",
+        "1.0",
+        "v1.2",
+        "1.9.0",
+        "1.10.0",
+        "2.0.0.dev1",
+        "2.0.0a1",
+        "2.0.0-beta.2",
+        "2.0.0rc1",
+        "2.0.0",
+    ]
+    versions += ["2.0.0.post1", "1!0.1"]
+
+    for shuffled in [list(reversed(versions)), sorted(versions)]:
+        assert sorted(shuffled, key=version_key) == versions
+
+    assert version_key("1.0") == version_key("1.0.0")
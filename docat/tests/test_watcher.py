@@ -0,0 +1,104 @@
+import shutil
+import time
+from unittest.mock import patch
+
+import docat.app as docat
+from docat.utils import create_symlink
+from docat.watcher import Watcher, project_of, snapshot
+
+
+def version_names(client, project):
+    response = client.get(f"/api/projects/{project}")
+    if response.status_code == 404:
+        return None
+    return [version["name"] for version in response.json()["versions"]]
+
+
+def test_refresh_project_picks_up_changes_by_hand(client, upload):
+    upload("some-project", "1.0.0")
+    catalog = docat.get_catalog()
+
+    version_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0"
+    version_folder.mkdir()
+    (version_folder / "index.html").write_text("<h1>Hello World</h1>")
+    assert version_names(client, "some-project") == ["1.0.0"]
+
+    assert catalog.refresh_project("some-project")
+    assert version_names(client, "some-project") == ["2.0.0", "1.0.0"]
+    assert catalog.read()["n_versions"] == 2
+
+    shutil.rmtree(docat.DOCAT_UPLOAD_FOLDER / "some-project")
+    assert catalog.refresh_project("some-project")
+    assert version_names(client, "some-project") is None
+    assert catalog.read()["n_versions"] == 0
+
+
+def test_refresh_project_measures_changed_versions(client, upload):
+    upload("some-project", "1.0.0", {"index.html": b"<h1>Hello World</h1>", "static/style.css": b"body {}"})
+    catalog = docat.get_catalog()
+    assert client.get("/api/stats").json()["storage"] == "27 bytes"
+
+    version_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "1.0.0"
+    (version_folder / "manual.pdf").write_bytes(b"0" * 2048)
+    assert catalog.refresh_project("some-project")
+    assert client.get("/api/stats").json()["storage"] == "2 KB"
+
+    # files added below the root of the version are picked up as well
+    (version_folder / "static" / "manual.pdf").write_bytes(b"0" * 2048)
+    assert catalog.refresh_project("some-project")
+    assert client.get("/api/stats").json()["storage"] == "4 KB"
+    assert not catalog.refresh_project("some-project")
+
+
+def test_refresh_unchanged_project_keeps_catalog(upload):
+    upload("some-project", "1.0.0")
+    catalog = docat.get_catalog()
+    generation = catalog.generation()
+
+    assert not catalog.refresh_project("some-project")
+    assert not catalog.refresh_project("unknown-project")
+    assert catalog.generation() == generation
+
+
+def test_project_of():
+    upload_folder = docat.DOCAT_UPLOAD_FOLDER
+    assert project_of(upload_folder, str(upload_folder / "some-project" / "1.0.0" / "index.html")) == "some-project"
+    assert project_of(upload_folder, str(upload_folder)) is None
+    assert project_of(upload_folder, str(docat.DOCAT_STAGING_FOLDER / "upload")) is None
+
+
+def test_snapshot_changes_with_versions_and_tags(upload):
+    upload("some-project", "1.0.0", {"index.html": b"<h1>Hello World</h1>", "static/style.css": b"body {}"})
+    before = snapshot(docat.DOCAT_UPLOAD_FOLDER)
+    assert list(before) == ["some-project"]
+
+    project_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project"
+    create_symlink(project_folder / "1.0.0", project_folder / "stable")
+    after = snapshot(docat.DOCAT_UPLOAD_FOLDER)
+    assert after["some-project"] != before["some-project"]
+
+    (project_folder / "1.0.0" / "static" / "app.js").write_text("run()")
+    assert snapshot(docat.DOCAT_UPLOAD_FOLDER)["some-project"] != after["some-project"]
+
+
+def test_polling_watcher_refreshes_changed_project(client, upload):
+    upload("some-project", "1.0.0")
+    upload("other-project", "1.0.0")
+    watcher = Watcher(docat.get_catalog(), interval=0.01)
+
+    with patch("docat.watcher.Watcher._watch", Watcher._poll), patch.object(watcher, "refresh", wraps=watcher.refresh) as refresh_mock:
+        watcher.start()
+        try:
+            time.sleep(0.05)
+            version_folder = docat.DOCAT_UPLOAD_FOLDER / "some-project" / "2.0.0"
+            version_folder.mkdir()
+            (version_folder / "index.html").write_text("<h1>Hello World</h1>")
+
+            deadline = time.monotonic() + 5
+            while version_names(client, "some-project") != ["2.0.0", "1.0.0"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.stop()
+
+    assert version_names(client, "some-project") == ["2.0.0", "1.0.0"]
+    assert all(call.args[0] <= {"some-project"} for call in refresh_mock.mock_calls)
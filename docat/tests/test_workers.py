@@ -0,0 +1,84 @@
+import asyncio
+import io
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from docat.workers import PoolSaturatedError, WorkerPool
+
+
+def test_upload_runs_in_worker_pool(client):
+    threads = []
+
+    def record_thread(project, version):
+        threads.append((project, version, threading.current_thread().name))
+
+    with patch("docat.catalog.Catalog.update_version", side_effect=record_thread):
+        response = client.post("/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")})
+        assert response.status_code == 201
+
+    assert len(threads) == 1
+    assert threads[0][2].startswith("docat-worker")
+
+
+def test_saturated_worker_pool_rejects_requests(client):
+    pool = WorkerPool(1, 0)
+    pool._pending = 1
+
+    with patch("docat.app.worker_pool", pool):
+        response = client.post("/api/some-project/1.0.0", files={"file": ("index.html", io.BytesIO(b"<h1>Hello World</h1>"), "plain/text")})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        assert response.json() == {"message": "Too many requests, please try again later."}
+
+        # reads are not affected by a saturated pool
+        response = client.get("/api/projects")
+        assert response.status_code == 200
+
+
+def test_worker_pool_queue_is_bounded():
+    pool = WorkerPool(1, 1)
+    release = threading.Event()
+
+    async def run():
+        first = asyncio.ensure_future(pool.run(release.wait))
+        second = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0)
+        assert pool.pending == 2
+
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(release.wait)
+
+        release.set()
+        await asyncio.gather(first, second)
+        assert pool.pending == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_call_holds_its_slot_until_done():
+    pool = WorkerPool(1, 0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        started.set()
+        release.wait()
+
+    async def run():
+        call = asyncio.ensure_future(pool.run(work))
+        await asyncio.to_thread(started.wait)
+        call.cancel()
+        await asyncio.sleep(0)
+
+        # the thread is still running, so the pool stays saturated
+        assert pool.pending == 1
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(work)
+
+        release.set()
+        await asyncio.to_thread(pool._executor.shutdown)
+        assert pool.pending == 0
+
+    asyncio.run(run())